@@ -0,0 +1,47 @@
+"""
+测量在新的解释器中导入教务系统模块的耗时，以及是否加载了验证码识别模型
+
+只输出结果，不做断言。运行方式（在仓库根目录）::
+
+    PYTHONPATH=src python benchmarks/import_time.py --rounds 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import xtu_ems.ems.ems
+import xtu_ems.ems.handler.get_student_courses
+print(time.perf_counter() - start)
+print(int('ddddocr' in sys.modules), int('onnxruntime' in sys.modules))
+"""
+
+
+def measure() -> tuple[float, str]:
+    """在新的解释器中导入一次，返回耗时（秒）与ddddocr、onnxruntime是否被导入"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    out = subprocess.run([sys.executable, '-c', _SCRIPT], capture_output=True, text=True, env=env, check=True)
+    cost, loaded = out.stdout.strip().splitlines()
+    return float(cost), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5, help='重复导入的次数')
+    args = parser.parse_args()
+
+    costs = []
+    for _ in range(args.rounds):
+        cost, loaded = measure()
+        costs.append(cost)
+    print(f'导入耗时: 中位数 {statistics.median(costs) * 1000:.0f} ms, '
+          f'最小 {min(costs) * 1000:.0f} ms, 最大 {max(costs) * 1000:.0f} ms ({args.rounds} 次)')
+    print(f'导入了ddddocr: {loaded[0] == "1"}, 导入了onnxruntime: {loaded[2] == "1"}')
+
+
+if __name__ == '__main__':
+    main()
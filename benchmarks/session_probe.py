@@ -0,0 +1,70 @@
+"""
+对比验证session时完整解析页面与只读取标题的开销
+
+每次验证读取的字节数、实际传输的字节数（包括为复用连接读完的剩余内容）与CPU时间，只输出结果，不做断言。
+
+运行方式（在仓库根目录）::
+
+    PYTHONPATH=src python benchmarks/session_probe.py --padding 500 --rounds 200
+"""
+import argparse
+import os
+import time
+
+from xtu_ems.ems.config import XTUEMSConfig
+from xtu_ems.ems.handler.valid_session import SessionValidator, TitleProbe, PROBE_CHUNK_SIZE
+
+PAGES = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'pages')
+
+
+def load_page(name: str, padding: int) -> bytes:
+    """读取测试页面，并在表格中填充内容，模拟真实页面标题之后的大量内容"""
+    with open(os.path.join(PAGES, name), 'rb') as f:
+        content = f.read()
+    rows = '<tr><td>通知</td><td>2024-09-01</td></tr>'.encode() * padding
+    return content.replace(b'</table>', rows + b'</table>')
+
+
+def probe(content: bytes) -> TitleProbe:
+    title_probe = TitleProbe(limit=XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_PROBE_BYTES)
+    for i in range(0, len(content), PROBE_CHUNK_SIZE):
+        if title_probe.feed(content[i:i + PROBE_CHUNK_SIZE]):
+            break
+    return title_probe
+
+
+def cpu_per_round(func, rounds: int) -> float:
+    start = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--page', default='session_valid.html', help='tests/pages中的页面')
+    parser.add_argument('--padding', type=int, default=500, help='填充的表格行数')
+    parser.add_argument('--rounds', type=int, default=200, help='每种方式重复的次数')
+    args = parser.parse_args()
+
+    content = load_page(args.page, args.padding)
+    validator = SessionValidator()
+    text = content.decode('utf-8')
+
+    full_cpu = cpu_per_round(lambda: validator.extract(text), args.rounds)
+    probe_cpu = cpu_per_round(lambda: probe(content), args.rounds)
+    result = probe(content)
+    drained = SessionValidator._can_drain(str(len(content)), result)
+    transferred = len(content) if drained else result.size
+
+    print(f'页面: {args.page}, {len(content)} 字节')
+    print(f'完整解析: 读取 {len(content)} 字节, {full_cpu * 1e6:.0f} us/次')
+    print(f'只读取标题: 读取 {result.size} 字节, {probe_cpu * 1e6:.0f} us/次')
+    print(f'只读取标题时传输: {transferred} 字节 '
+          f'({"读完剩余内容并复用连接" if drained else "关闭连接"}, '
+          f'XTU_EMS_SESSION_VALIDATOR_DRAIN_BYTES={XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_DRAIN_BYTES})')
+    print(f'结果一致: {validator.extract(text) == validator._is_valid(result.title)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Body, Header
+import asyncio
+import hashlib
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Optional
+
+from fastapi import APIRouter, Body, Header, Query, Request
 from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.params import Param
 from pydantic import BaseModel
 
+from plat.config import CACHE_CONFIG, REPOSITORY_CONFIG
+from plat.repository.d_basic import BoundedKVRepository
 from plat.service import account_service, course_service, info_service, score_service, exam_service, rank_service, \
     today_classroom_service, tomorrow_classroom_service, calendar_service, minor_score_service
 from plat.service.acc_service import ExpiredAccountException, BannedAccountException
-from plat.service.entity import Account
+from plat.service.entity import TaskEntity
 from plat.service.info_service import IService
 from xtu_ems.ems.ems import InvalidAccountException, InvalidCaptchaException, UninitializedPasswordException
 from xtu_ems.ems.model import TeachingCalendar, CourseList, ExamInfoList
@@ -73,112 +83,284 @@ async def login(username: str = Body(description="学号"), password: str = Body
         return fail(message=f'服务器超时，请稍后')
 
 
-async def do_gets(service: IService[any], token: str):
-    """获取信息"""
+async def authenticate(token: str) -> str | CommonResponse:
+    """
+    验证用户凭证
+    Args:
+        token: 用户凭证
+
+    Returns:
+        学号，验证失败时返回失败响应
+    """
     try:
-        account: Account = await account_service.auth_with_token(token)
+        student_id = await account_service.auth_student_id(token)
     except ExpiredAccountException as e:
         return fail(message=f"账户 {e.username} 已过期")
-    if account and account.token == token:
-        data = await service.get_info(account.student_id)
-        return success(data)
-    else:
-        return invalid_authority()
+    except BannedAccountException as e:
+        return fail(message=f"账户 {e.username} 已被封禁")
+    return student_id or invalid_authority()
+
+
+def make_etag(*versions: str) -> str:
+    """根据数据版本生成ETag，同一份数据在不同进程中得到相同的ETag"""
+    return '"' + hashlib.blake2b('\x00'.join(versions).encode(), digest_size=12).hexdigest() + '"'
+
+
+def record_version(service: IService, student_id: str, record: Optional[TaskEntity]) -> str:
+    """缓存记录的版本，由数据类型、学号与更新时间决定"""
+    update_time = record.update_time.timestamp() if record and record.update_time else 0
+    return f'{type(service.handler).__name__}:{student_id}:{update_time}'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """判断客户端缓存的数据是否仍然有效，优先使用If-None-Match"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified.timestamp()) <= since.timestamp()
+    return False
+
+
+def conditional_response(request: Request, etag: str, last_modified: Optional[datetime],
+                         build: Callable[[], Response], vary: str = 'token') -> Response:
+    """
+    带缓存校验的响应，客户端缓存有效时直接返回304，不需要序列化数据
+    Args:
+        request: 请求
+        etag: 数据的ETag
+        last_modified: 数据的更新时间
+        build: 构造完整响应的函数
+        vary: 影响响应内容的请求头
+    """
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if vary:
+        headers['Vary'] = vary
+    if last_modified:
+        headers['Last-Modified'] = formatdate(last_modified.timestamp(), usegmt=True)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response = build()
+    response.headers.update(headers)
+    return response
+
+
+async def do_cached_gets(service: IService[any], token: str, request: Request):
+    """
+    获取信息，支持ETag与Last-Modified缓存校验
+    Args:
+        service: 信息服务
+        token: 用户凭证
+        request: 请求
+    """
+    student_id = await authenticate(token)
+    if isinstance(student_id, CommonResponse):
+        return student_id
+    record = await service.get_record(student_id)
+    if record is None or record.update_time is None:
+        # 还没有数据，不需要缓存
+        return success(record.data if record else None)
+    return conditional_response(request, make_etag(record_version(service, student_id, record)), record.update_time,
+                                lambda: JSONResponse(jsonable_encoder(success(record.data))))
 
 
 @app.get("/courses")
-async def get_courses(token: str = Header(description="用户凭证")):
+async def get_courses(request: Request, token: str = Header(description="用户凭证")):
     """获取课表"""
-    info = await do_gets(course_service, token)
-    return info
+    return await do_cached_gets(course_service, token, request)
 
 
 @app.get("/info")
-async def get_info(token: str = Header(description="用户凭证")):
+async def get_info(request: Request, token: str = Header(description="用户凭证")):
     """获取用户信息"""
-    return await do_gets(info_service, token)
+    return await do_cached_gets(info_service, token, request)
 
 
 @app.get("/scores")
-async def get_score(token: str = Header(description="用户凭证")):
+async def get_score(request: Request, token: str = Header(description="用户凭证")):
     """获取成绩"""
-    return await do_gets(score_service, token)
+    return await do_cached_gets(score_service, token, request)
 
 
 @app.get("/minor/scores")
-async def get_score_by_term(token: str = Header(description="用户凭证")):
+async def get_score_by_term(request: Request, token: str = Header(description="用户凭证")):
     """获取指定学期成绩"""
-    return await do_gets(minor_score_service, token)
+    return await do_cached_gets(minor_score_service, token, request)
 
 
 @app.get("/exams")
-async def get_exam(token: str = Header(description="用户凭证")):
+async def get_exam(request: Request, token: str = Header(description="用户凭证")):
     """获取考试"""
-    return await do_gets(exam_service, token)
+    return await do_cached_gets(exam_service, token, request)
 
 
 @app.get("/rank")
-async def get_rank(token: str = Header(description="用户凭证")):
+async def get_rank(request: Request, token: str = Header(description="用户凭证")):
     """获取排名"""
 
-    return await do_gets(rank_service, token)
+    return await do_cached_gets(rank_service, token, request)
 
 
 @app.get("/classroom/today")
-async def get_today_classroom(token: str = Header(description="用户凭证")):
+async def get_today_classroom(request: Request, token: str = Header(description="用户凭证")):
     """获取今天教室"""
-    return await do_gets(today_classroom_service, token)
+    return await do_cached_gets(today_classroom_service, token, request)
 
 
 @app.get("/classroom/tomorrow")
-async def get_tomorrow_classroom(token: str = Header(description="用户凭证")):
+async def get_tomorrow_classroom(request: Request, token: str = Header(description="用户凭证")):
     """获取明天教室"""
-    return await do_gets(tomorrow_classroom_service, token)
+    return await do_cached_gets(tomorrow_classroom_service, token, request)
 
 
 @app.get("/calendar")
-async def get_calendar(token: str = Header(description="用户凭证")):
+async def get_calendar(request: Request, token: str = Header(description="用户凭证")):
     """获取校历"""
-    return await do_gets(calendar_service, token)
+    return await do_cached_gets(calendar_service, token, request)
+
+
+bundle_services: dict[str, IService] = {
+    "info": info_service,
+    "courses": course_service,
+    "scores": score_service,
+    "minor_scores": minor_score_service,
+    "exams": exam_service,
+    "rank": rank_service,
+    "calendar": calendar_service,
+    "classroom_today": today_classroom_service,
+    "classroom_tomorrow": tomorrow_classroom_service,
+}
+"""聚合接口可以获取的数据"""
+
+DEFAULT_BUNDLE = "info,courses,exams,calendar,classroom_today"
+"""聚合接口默认获取的数据，即首页需要的数据"""
+
+
+@app.get("/bundle")
+async def get_bundle(request: Request,
+                     token: str = Header(description="用户凭证"),
+                     sections: str = Query(default=DEFAULT_BUNDLE,
+                                           description=f"需要获取的数据，以逗号分隔，可选: {', '.join(bundle_services)}"),
+                     meta: bool = Query(default=False, description="是否返回每项数据的更新时间与更新状态")):
+    """聚合获取多项数据，只验证一次用户凭证，并发获取各项数据"""
+    names = list(dict.fromkeys(name.strip() for name in sections.split(',') if name.strip()))
+    unknown = [name for name in names if name not in bundle_services]
+    if unknown:
+        return fail(message=f"未知的数据: {','.join(unknown)}")
+    student_id = await authenticate(token)
+    if isinstance(student_id, CommonResponse):
+        return student_id
+    records = await asyncio.gather(*[bundle_services[name].get_record(student_id) for name in names])
+    versions = [record_version(bundle_services[name], student_id, record) for name, record in zip(names, records)]
+    if meta:
+        updating = {name: bundle_services[name].is_updating(student_id) for name in names}
+        versions += [f'{name}:{updating[name]}' for name in names]
+    update_times = [record.update_time for record in records if record and record.update_time]
+
+    def build():
+        if not meta:
+            data = {name: record.data if record else None for name, record in zip(names, records)}
+        else:
+            data = {name: {
+                'data': record.data if record else None,
+                'update_time': record.update_time if record else None,
+                'updating': updating[name]
+            } for name, record in zip(names, records)}
+        return JSONResponse(jsonable_encoder(success(data)))
+
+    return conditional_response(request, make_etag(*versions), max(update_times, default=None), build)
+
+
+ics_cache: BoundedKVRepository[tuple[str, str], tuple[str, bytes]] = BoundedKVRepository(
+    max_entries=REPOSITORY_CONFIG.CACHE_MAX_ENTRIES,
+    max_bytes=REPOSITORY_CONFIG.CACHE_MAX_BYTES,
+    sizer=lambda value: len(value[1]))
+"""渲染好的ics，键为类型与学号，值为数据版本与内容；数据版本变化后重新渲染"""
+
+
+async def render_ics(kind: str, student_id: str, etag: str, render: Callable[[], str]) -> bytes:
+    """
+    获取渲染好的ics，缓存的版本与数据版本一致时直接返回缓存
+    Args:
+        kind: ics类型
+        student_id: 学号
+        etag: 数据版本
+        render: 渲染ics的函数
+    """
+    cached = await ics_cache.async_get_item((kind, student_id))
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+    content = render().encode()
+    await ics_cache.async_set_item((kind, student_id), (etag, content))
+    return content
+
+
+def ics_response(request: Request, kind: str, etag: str, last_modified: datetime, content: Optional[bytes]):
+    """ics响应，content为空时表示客户端缓存有效"""
+    return conditional_response(request, etag, last_modified,
+                                lambda: Response(
+                                    content=content,
+                                    media_type="text/calendar",
+                                    headers={
+                                        "Content-Disposition": f"attachment; filename={kind}.ics"
+                                    }
+                                ), vary=None)
+
+
+def render_courses_ics(courses: CourseList, teaching_calendar: TeachingCalendar) -> str:
+    events = ics_utils["Course"].convert_courses_to_events(courses.courses, teaching_calendar.start)
+    calendar = BaseCalendar()
+    calendar.events = events
+    return calendar.to_ical().replace('\n', '\r\n')
+
+
+def render_exams_ics(exams: ExamInfoList) -> str:
+    events = ics_utils["Exam"].convert_exams_to_events(exams)
+    calendar = BaseCalendar()
+    calendar.events = events
+    return calendar.to_ical()
 
 
 @app.get("/courses.ics")
-async def get_courses_ics(token: str = Param(description="用户凭证")):
-    """获取课表ics"""
-    teaching_calendar = (await do_gets(calendar_service, token)).data
-    courses = (await do_gets(course_service, token)).data
+async def get_courses_ics(request: Request, token: str = Param(description="用户凭证")):
+    """获取课表ics，课表与校历都没有更新时使用缓存的ics"""
+    student_id = await authenticate(token)
+    if isinstance(student_id, CommonResponse):
+        return student_id
+    calendar_record, courses_record = await asyncio.gather(
+        calendar_service.get_record(student_id, CACHE_CONFIG.ICS_FRESH_WAIT),
+        course_service.get_record(student_id, CACHE_CONFIG.ICS_FRESH_WAIT))
+    teaching_calendar = calendar_record.data if calendar_record else None
+    courses = courses_record.data if courses_record else None
     if not teaching_calendar or not isinstance(teaching_calendar, TeachingCalendar):
         return fail(message="获取校历失败")
-    base_date = teaching_calendar.start
     if not courses or not isinstance(courses, CourseList):
         return fail(message="获取课表失败")
-    events = ics_utils["Course"].convert_courses_to_events(courses.courses, base_date)
-    calendar = BaseCalendar()
-    calendar.events = events
-    ics = calendar.to_ical().replace('\n', '\r\n')
-    return Response(
-        content=ics,
-        media_type="text/calendar",
-        headers={
-            "Content-Disposition": "attachment; filename=courses.ics"
-        }
-    )
+    etag = make_etag(record_version(calendar_service, student_id, calendar_record),
+                     record_version(course_service, student_id, courses_record))
+    last_modified = max(calendar_record.update_time, courses_record.update_time)
+    content = None if is_not_modified(request, etag, last_modified) else \
+        await render_ics('courses', student_id, etag, lambda: render_courses_ics(courses, teaching_calendar))
+    return ics_response(request, 'courses', etag, last_modified, content)
 
 
 @app.get("/exams.ics")
-async def get_exams_ics(token: str = Param(description="用户凭证")):
-    """获取考试ics"""
-    exams = (await do_gets(exam_service, token)).data
+async def get_exams_ics(request: Request, token: str = Param(description="用户凭证")):
+    """获取考试ics，考试没有更新时使用缓存的ics"""
+    student_id = await authenticate(token)
+    if isinstance(student_id, CommonResponse):
+        return student_id
+    record = await exam_service.get_record(student_id, CACHE_CONFIG.ICS_FRESH_WAIT)
+    exams = record.data if record else None
     if not exams or not isinstance(exams, ExamInfoList):
         return fail(message="获取考试失败")
-    events = ics_utils["Exam"].convert_exams_to_events(exams)
-    calendar = BaseCalendar()
-    calendar.events = events
-    ics = calendar.to_ical()
-    return Response(
-        content=ics,
-        media_type="text/calendar",
-        headers={
-            "Content-Disposition": "attachment; filename=exams.ics"
-        }
-    )
+    etag = make_etag(record_version(exam_service, student_id, record))
+    content = None if is_not_modified(request, etag, record.update_time) else \
+        await render_ics('exams', student_id, etag, lambda: render_exams_ics(exams))
+    return ics_response(request, 'exams', etag, record.update_time, content)
@@ -4,12 +4,16 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from pydantic_settings import BaseSettings
 
-from plat.service import account_service
+from plat.service import account_service, database, redis_client
+from xtu_ems.ems.config import CaptchaConfig
+from xtu_ems.ems.connection import connection_pool
+from xtu_ems.util.captcha import ocr_executor
+from xtu_ems.util.executor import html_executor, pdf_executor
 
 
 class RefreshConfiguration(BaseSettings):
     """后台任务配置"""
-    REFRESH_INTERVAL: int = 20 * 60  # 20min
+    REFRESH_INTERVAL: int = 20 * 60  # 20min，保活调度与账户存储库同步的间隔
 
 
 RefreshConfig = RefreshConfiguration()
@@ -19,7 +23,20 @@ background_task = []
 
 @asynccontextmanager
 async def session_refresher_in_background(app: FastAPI):
-    """后台任务，用于刷新session, 返回任务对象"""
+    """后台任务，用于刷新session与预取登陆凭据；服务关闭时释放教务系统连接池与各个执行器，并提交持久化存储"""
     task = asyncio.create_task(account_service.refresh_session(RefreshConfig.REFRESH_INTERVAL))
     background_task.append(task)
+    if CaptchaConfig.XTU_EMS_OCR_PREWARM:
+        # 在后台加载验证码识别模型，避免第一次登陆时才加载
+        background_task.append(asyncio.create_task(ocr_executor.warm_up()))
+    account_service.ems.ticket_pool.start()
     yield
+    await account_service.ems.ticket_pool.stop()
+    await connection_pool.close()
+    ocr_executor.shutdown()
+    html_executor.shutdown()
+    pdf_executor.shutdown()
+    if database is not None:
+        await database.close()
+    if redis_client is not None:
+        await redis_client.aclose()
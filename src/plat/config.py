@@ -54,5 +54,125 @@ class CacheConfig(BaseSettings):
     TOMORROW_CLASSROOM_SUBMIT: timedelta = DEFAULT_SUBMIT
     """明天教室提交时间间隔"""
 
+    FIRST_RESULT_WAIT: float = 3000
+    """还没有数据时，请求最多等待第一次更新的毫秒数，为0时直接返回空数据"""
+
+    STALE_WHILE_REVALIDATE: bool = True
+    """数据过期正在更新时，是否直接返回旧数据；关闭时会等待更新完成（最多FIRST_RESULT_WAIT毫秒）"""
+
+    ICS_FRESH_WAIT: float = 3000
+    """导出ics时，数据正在更新则最多等待的毫秒数"""
+
 
 CACHE_CONFIG = CacheConfig()
+
+
+class KeepAliveConfig(BaseSettings):
+    """会话保活配置"""
+
+    KEEP_ALIVE_CONCURRENCY: int = 16
+    """同时进行保活的账户数量"""
+
+    KEEP_ALIVE_RATE: float = 20.
+    """每秒最多发送的保活请求数，为0时不限速"""
+
+    KEEP_ALIVE_BURST: int = 20
+    """保活请求允许的突发数量"""
+
+    KEEP_ALIVE_MAX_RETRY: int = 3
+    """单个账户保活请求异常时的最大重试次数"""
+
+    KEEP_ALIVE_RETRY_BACKOFF: float = 1.
+    """保活请求异常后第一次重试前等待的秒数，之后每次重试翻倍"""
+
+    KEEP_ALIVE_RETRY_DELAY: timedelta = timedelta(minutes=1)
+    """保活请求重试后仍然异常（如教务系统无法访问）时，账户不会被标记为过期，而是在该时间内随机重新调度"""
+
+    SESSION_EXPIRE: timedelta = timedelta(minutes=30)
+    """教务系统session的过期时间"""
+
+    SESSION_REFRESH_AHEAD: timedelta = timedelta(minutes=10)
+    """在session过期前多久进行保活"""
+
+    SESSION_SYNC_JITTER: timedelta = timedelta(minutes=5)
+    """从存储库恢复的账户的保活时间随机推迟的最大值，避免重启后所有账户同时保活；应小于SESSION_REFRESH_AHEAD"""
+
+    KEEP_ALIVE_TICK: float = 5.
+    """保活调度器的最长休眠时间（秒）"""
+
+    AUTO_RELOGIN: bool = True
+    """更新数据时发现会话失效，是否使用保存的密码自动重新登陆并重试"""
+
+    KEEP_ALIVE_LEADER_TTL: timedelta = timedelta(minutes=2)
+    """保活租约的有效期，多个进程共享Redis时只有持有租约的进程进行保活，每次调度时续约；应大于单轮保活的耗时"""
+
+    RELOGIN_LOCK_TTL: timedelta = timedelta(seconds=30)
+    """重新登陆锁的有效期，多个进程共享Redis时同一个学生同时只有一个进程重新登陆；应大于一次登陆的耗时"""
+
+    RELOGIN_LOCK_POLL: float = .2
+    """等待其他进程重新登陆时检查锁的间隔（秒）"""
+
+
+KEEP_ALIVE_CONFIG = KeepAliveConfig()
+
+
+class RepositoryConfig(BaseSettings):
+    """存储配置"""
+
+    REPOSITORY_BACKEND: str = "memory"
+    """存储后端，memory为进程内存储，sqlite为SQLite持久化存储，redis为Redis共享存储（需要安装redis）"""
+
+    SQLITE_PATH: str = "data/gonggong.db"
+    """SQLite数据库文件路径"""
+
+    SQLITE_BATCH_SIZE: int = 256
+    """SQLite待写入的数据达到该数量时立即提交"""
+
+    SQLITE_FLUSH_INTERVAL: float = .05
+    """SQLite写入缓冲的最长时间（秒）"""
+
+    REDIS_URL: str = "redis://localhost:6379/0"
+    """Redis连接地址"""
+
+    REDIS_MAX_CONNECTIONS: int = 64
+    """Redis连接池的最大连接数"""
+
+    REDIS_PREFIX: str = "gonggong"
+    """Redis键的前缀，多个部署共用一个Redis时用于区分"""
+
+    CACHE_TTL_FACTOR: float = 2.
+    """缓存数据的保留时间为数据更新间隔的倍数，超出更新间隔的旧数据在这段时间内仍然可以返回给用户"""
+
+    CACHE_MAX_ENTRIES: int = 20000
+    """进程内存储中每类缓存数据最多保存的学生数，超出时淘汰最近最少使用的数据，为0时不限制"""
+
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    """进程内存储中每类缓存数据最多占用的内存（按序列化后的大小估算），为0时不限制"""
+
+
+REPOSITORY_CONFIG = RepositoryConfig()
+
+
+class TokenConfig(BaseSettings):
+    """用户凭证配置"""
+
+    SIGNED_TOKEN: bool = False
+    """是否签发带签名的token，验证时不需要查询存储库；吊销或过期的token通过共享存储同步到其他进程，最多延迟TOKEN_REVOCATION_SYNC秒"""
+
+    TOKEN_SECRET: str = ""
+    """token的签名密钥，为空时每次启动随机生成，重启后之前签发的token全部失效"""
+
+    TOKEN_REVOCATION_BITS: int = 1 << 20
+    """吊销过滤器的位数"""
+
+    TOKEN_REVOCATION_HASHES: int = 4
+    """吊销过滤器的哈希函数数量"""
+
+    TOKEN_REVOCATION_SYNC: float = 5.
+    """从共享存储同步其他进程吊销的token的间隔（秒）"""
+
+    TOKEN_REVOCATION_RETAIN: timedelta = timedelta(hours=1)
+    """共享存储中吊销记录的保留时间，之后由按照账户状态重建的吊销过滤器覆盖；应大于保活调度与存储库同步的间隔"""
+
+
+TOKEN_CONFIG = TokenConfig()
@@ -1,5 +1,10 @@
+import pickle
+import sys
+import time
 from abc import abstractmethod
-from typing import TypeVar, Generic
+from collections import OrderedDict
+from datetime import timedelta
+from typing import TypeVar, Generic, Callable, Any
 
 _KEY = TypeVar('_KEY')
 _VAL = TypeVar('_VAL')
@@ -33,6 +38,10 @@ class KVRepository(Generic[_KEY, _VAL]):
         """异步获取键值"""
         pass
 
+    async def async_get_items(self, keys: list[_KEY]) -> list:
+        """异步批量获取键值，默认逐个获取，网络存储可以重写为一次请求"""
+        return [await self.async_get_item(key) for key in keys]
+
     @abstractmethod
     async def async_set_item(self, key: _KEY, value: _VAL):
         """异步设置键值"""
@@ -43,6 +52,11 @@ class KVRepository(Generic[_KEY, _VAL]):
         """异步删除键值"""
         pass
 
+    async def async_del_items(self, keys: list[_KEY]):
+        """异步批量删除键值，默认逐个删除，网络存储可以重写为一次请求"""
+        for key in keys:
+            await self.async_del_item(key)
+
     @abstractmethod
     def __len__(self):
         """异步获取键值"""
@@ -84,3 +98,136 @@ class SimpleKVRepository(KVRepository[_KEY, _VAL]):
 
     def __len__(self):
         return len(self.data)
+
+
+def _serialized_size(value: Any) -> int:
+    """使用序列化后的长度近似对象占用的内存，无法序列化时使用对象本身的大小"""
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def estimate_size(value: Any) -> int:
+    """
+    估算对象占用的内存
+
+    缓存的实体只在数据更新后序列化估算一次，结果记录在实体上，
+    只修改提交时间等字段的写入不会再次序列化整个课表或成绩单
+    """
+    from plat.service.entity import TimedEntity
+    if isinstance(value, TimedEntity):
+        if getattr(value, 'data_size', None) is None:
+            value.data_size = _serialized_size(value.data)
+        return value.data_size
+    return _serialized_size(value)
+
+
+class CacheStatistics:
+    """有界存储的命中与淘汰统计"""
+
+    def __init__(self):
+        self.hits = 0
+        """命中次数"""
+        self.misses = 0
+        """未命中次数，包括读到已过期数据的次数"""
+        self.evictions = 0
+        """因为超出容量被淘汰的数量"""
+        self.expirations = 0
+        """因为过期被清除的数量"""
+
+    def snapshot(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+class BoundedKVRepository(SimpleKVRepository[_KEY, _VAL]):
+    """
+    有容量上限的进程内存储仓库
+
+    - 超出数量或内存上限时，淘汰最近最少使用的数据
+    - 数据写入后超过`ttl`没有再次写入即视为过期，读取时清除
+    - 单个超出内存上限的数据仍然会保留，只淘汰其他数据
+    """
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0, ttl: timedelta = None,
+                 sizer: Callable[[Any], int] = estimate_size):
+        """
+        Args:
+            max_entries: 最多保存的数据数量，为0时不限制
+            max_bytes: 最多占用的内存（字节），为0时不限制
+            ttl: 数据的过期时间，为空时不过期
+            sizer: 估算数据大小的函数
+        """
+        super().__init__()
+        self.data: OrderedDict[_KEY, _VAL] = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl.total_seconds() if ttl else None
+        self.sizer = sizer
+        self.size = 0
+        """当前数据占用的内存估计值"""
+        self._meta: dict[_KEY, tuple[float, int]] = {}
+        """数据的过期时间与大小"""
+        self.statistics = CacheStatistics()
+
+    def _remove(self, key: _KEY):
+        del self.data[key]
+        _, size = self._meta.pop(key)
+        self.size -= size
+
+    def _is_expired(self, key: _KEY, now: float) -> bool:
+        expire_at, _ = self._meta[key]
+        return expire_at <= now
+
+    async def async_get_item(self, key: _KEY):
+        if key not in self.data:
+            self.statistics.misses += 1
+            return None
+        if self._is_expired(key, time.monotonic()):
+            self._remove(key)
+            self.statistics.expirations += 1
+            self.statistics.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.statistics.hits += 1
+        return self.data[key]
+
+    async def async_set_item(self, key: _KEY, value: _VAL):
+        if key in self.data:
+            self._remove(key)
+        size = self.sizer(value) if self.max_bytes else 0
+        expire_at = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        self.data[key] = value
+        self._meta[key] = (expire_at, size)
+        self.size += size
+        self._evict()
+
+    async def async_del_item(self, key: _KEY):
+        """异步删除键值"""
+        if key in self.data:
+            self._remove(key)
+
+    def _evict(self):
+        """从最近最少使用的数据开始淘汰，直到不超出容量"""
+        now = time.monotonic()
+        while self._is_full() and len(self.data) > 1:
+            key = next(iter(self.data))
+            if self._is_expired(key, now):
+                self.statistics.expirations += 1
+            else:
+                self.statistics.evictions += 1
+            self._remove(key)
+
+    def _is_full(self) -> bool:
+        return (0 < self.max_entries < len(self.data)) or (0 < self.max_bytes < self.size)
+
+    def __aiter__(self):
+        """遍历未过期的键，遍历时不受读写的影响"""
+        now = time.monotonic()
+        self._iterator = iter([key for key in self.data if not self._is_expired(key, now)])
+        return self
@@ -0,0 +1,174 @@
+"""基于Redis的共享键值存储，多个进程或节点可以共享同一份数据"""
+import uuid
+from datetime import timedelta
+from typing import Optional, Callable
+
+from redis.asyncio import Redis, ConnectionPool
+from redis.asyncio.client import Pipeline
+from redis.exceptions import WatchError
+
+from plat.config import REPOSITORY_CONFIG
+from plat.repository.d_basic import KVRepository, _KEY, _VAL
+from plat.repository.serializer import dumps, loads
+from plat.service.lease import Lease
+
+
+def create_client(url: str = None, max_connections: int = None) -> Redis:
+    """
+    创建使用连接池的Redis客户端，所有存储库共享同一个客户端
+    Args:
+        url: Redis连接地址
+        max_connections: 连接池的最大连接数
+    """
+    pool = ConnectionPool.from_url(url or REPOSITORY_CONFIG.REDIS_URL,
+                                   max_connections=max_connections or REPOSITORY_CONFIG.REDIS_MAX_CONNECTIONS)
+    return Redis(connection_pool=pool)
+
+
+class RedisKVRepository(KVRepository[_KEY, _VAL]):
+    """
+    Redis键值存储仓库
+
+    - 每个存储库使用独立的命名空间，值保存在`{prefix}:{namespace}:{key}`中
+    - 命名空间中的键同时记录在一个集合中，用于统计数量与遍历；写入与删除时使用流水线，只需要一次往返
+    - 设置了过期时间的存储库，值会被Redis自动淘汰，集合中残留的键在读取不到值时清理
+    - 值使用只包含数据的格式序列化，读取时不会执行代码，其他能写入Redis的客户端无法借此在服务中执行代码
+    """
+
+    def __init__(self, client: Redis, namespace: str, ttl: Optional[timedelta] = None, prefix: str = None):
+        """
+        Args:
+            client: Redis客户端
+            namespace: 命名空间
+            ttl: 值的过期时间，为空时不过期
+            prefix: 键的前缀
+        """
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.prefix = f'{prefix or REPOSITORY_CONFIG.REDIS_PREFIX}:{namespace}:'
+        self.keys_name = f'{prefix or REPOSITORY_CONFIG.REDIS_PREFIX}:{namespace}'
+        self._size = 0
+        """最近一次得到的键数量"""
+
+    def _name(self, key: _KEY) -> str:
+        return self.prefix + str(key)
+
+    async def async_get_item(self, key: _KEY):
+        data = await self.client.get(self._name(key))
+        return loads(data) if data is not None else None
+
+    async def async_get_items(self, keys: list[_KEY]) -> list:
+        """使用MGET一次获取多个键值"""
+        if not keys:
+            return []
+        return [loads(data) if data is not None else None
+                for data in await self.client.mget([self._name(key) for key in keys])]
+
+    async def async_set_item(self, key: _KEY, value: _VAL):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self._name(key), dumps(value), ex=self.ttl)
+            pipe.sadd(self.keys_name, str(key))
+            pipe.scard(self.keys_name)
+            *_, self._size = await pipe.execute()
+
+    async def async_del_item(self, key: _KEY):
+        """异步删除键值"""
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(self._name(key))
+            pipe.srem(self.keys_name, str(key))
+            pipe.scard(self.keys_name)
+            *_, self._size = await pipe.execute()
+
+    async def async_del_items(self, keys: list[_KEY]):
+        """使用一次流水线删除多个键值"""
+        if not keys:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(*[self._name(key) for key in keys])
+            pipe.srem(self.keys_name, *[str(key) for key in keys])
+            pipe.scard(self.keys_name)
+            *_, self._size = await pipe.execute()
+
+    async def async_len(self) -> int:
+        """从Redis获取键的数量"""
+        self._size = await self.client.scard(self.keys_name)
+        return self._size
+
+    def __aiter__(self):
+        return self._scan()
+
+    async def _scan(self):
+        """遍历命名空间中的键，清理已经过期的键"""
+        async for batch in self._scan_batches():
+            if self.ttl is None:
+                for key in batch:
+                    yield key
+                continue
+            values = await self.client.mget([self._name(key) for key in batch])
+            expired = [key for key, value in zip(batch, values) if value is None]
+            if expired:
+                await self.client.srem(self.keys_name, *expired)
+            for key, value in zip(batch, values):
+                if value is not None:
+                    yield key
+
+    async def _scan_batches(self, count: int = 500):
+        cursor = 0
+        while True:
+            cursor, keys = await self.client.sscan(self.keys_name, cursor, count=count)
+            if keys:
+                yield [k.decode() if isinstance(k, bytes) else k for k in keys]
+            if cursor == 0:
+                break
+
+    def __len__(self):
+        """最近一次写入、删除或调用`async_len`时得到的键数量"""
+        return self._size
+
+
+class RedisLease(Lease):
+    """
+    基于Redis的租约，共享同一个Redis的进程中只有一个可以持有同名的租约
+
+    - 使用`SET NX PX`获得租约，值为持有者的随机标识，持有者进程退出后租约自然过期
+    - 续约与释放时使用WATCH确认租约仍然由自己持有，不会延长或删除其他进程的租约
+    """
+
+    def __init__(self, client: Redis, prefix: str = None, owner: str = None):
+        """
+        Args:
+            client: Redis客户端
+            prefix: 键的前缀
+            owner: 持有者标识，默认随机生成
+        """
+        self.client = client
+        self.prefix = f'{prefix or REPOSITORY_CONFIG.REDIS_PREFIX}:lease:'
+        self.owner = owner or uuid.uuid4().hex
+
+    async def acquire(self, name: str, ttl: timedelta) -> bool:
+        key = self.prefix + name
+        px = max(int(ttl.total_seconds() * 1000), 1)
+        if await self.client.set(key, self.owner, nx=True, px=px):
+            return True
+        return await self._if_owner(key, lambda pipe: pipe.pexpire(key, px))
+
+    async def release(self, name: str):
+        key = self.prefix + name
+        await self._if_owner(key, lambda pipe: pipe.delete(key))
+
+    async def _if_owner(self, key: str, command: Callable[[Pipeline], object]) -> bool:
+        """租约仍然由自己持有时在事务中执行命令，返回是否执行"""
+        async with self.client.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                owner = await pipe.get(key)
+                if owner is None or (owner.decode() if isinstance(owner, bytes) else owner) != self.owner:
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                command(pipe)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
@@ -0,0 +1,182 @@
+"""基于SQLite的持久化键值存储"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from plat.config import REPOSITORY_CONFIG
+from plat.repository.d_basic import KVRepository, _KEY, _VAL
+from plat.repository.serializer import dumps, loads
+
+logger = logging.getLogger('repository.sqlite')
+
+_TABLE_NAME = re.compile(r'^\w+$')
+
+
+class SQLiteDatabase:
+    """
+    SQLite数据库，多个存储库共享同一个数据库文件与连接
+
+    - 使用WAL模式，读写互不阻塞
+    - 所有数据库操作都在一个专用线程中执行，不会阻塞事件循环，并且按提交顺序执行
+    - 写入先放入待写入缓冲区，凑满一批或者等待一小段时间后在一个事务中全部提交，读取时优先读取缓冲区
+    """
+
+    def __init__(self, path: str = None, batch_size: int = None, flush_interval: float = None):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 待写入的数据达到该数量时立即提交
+            flush_interval: 写入缓冲的最长时间（秒）
+        """
+        self.path = path or REPOSITORY_CONFIG.SQLITE_PATH
+        self.batch_size = batch_size or REPOSITORY_CONFIG.SQLITE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else REPOSITORY_CONFIG.SQLITE_FLUSH_INTERVAL
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plat-sqlite')
+        self._pending: dict[tuple[str, str], Optional[bytes]] = {}
+        """待写入的数据，值为None表示删除"""
+        self._flush_handle = None
+        self._flush_soon = False
+        self._flush_tasks: set[asyncio.Task] = set()
+
+    def create_table(self, table: str) -> list[str]:
+        """
+        创建数据表，在启动时同步调用
+        Returns:
+            表中已有的键
+        """
+        if not _TABLE_NAME.match(table):
+            raise ValueError(f"无效的表名: {table}")
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" '
+                           f'(key TEXT PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID')
+        return [row[0] for row in self._conn.execute(f'SELECT key FROM "{table}"')]
+
+    def _select(self, table: str, key: str) -> Optional[bytes]:
+        row = self._conn.execute(f'SELECT value FROM "{table}" WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write(self, batch: dict[tuple[str, str], Optional[bytes]]):
+        """在一个事务中写入一批数据"""
+        self._conn.execute('BEGIN')
+        try:
+            for (table, key), value in batch.items():
+                if value is None:
+                    self._conn.execute(f'DELETE FROM "{table}" WHERE key = ?', (key,))
+                else:
+                    self._conn.execute(f'INSERT OR REPLACE INTO "{table}" (key, value) VALUES (?, ?)', (key, value))
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    async def get(self, table: str, key: str) -> Optional[bytes]:
+        """读取数据，优先读取待写入的数据"""
+        if (table, key) in self._pending:
+            return self._pending[(table, key)]
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._select, table, key)
+
+    def put(self, table: str, key: str, value: Optional[bytes]):
+        """写入数据，值为None时删除；同一个键在提交前的多次写入只会提交最后一次"""
+        self._pending[(table, key)] = value
+        loop = asyncio.get_running_loop()
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_interval, self._start_flush)
+            self._flush_soon = False
+        if len(self._pending) >= self.batch_size and not self._flush_soon:
+            # 待写入的数据足够多，不再等待，在下一轮事件循环中提交
+            self._flush_handle.cancel()
+            self._flush_handle = loop.call_soon(self._start_flush)
+            self._flush_soon = True
+
+    def _start_flush(self):
+        self._flush_handle = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """将待写入的数据提交到数据库"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # 交换缓冲区与提交写入之间没有等待，之后提交的读取一定在写入之后执行
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+            logger.debug(f'提交了 {len(batch)} 条写入')
+        except Exception:
+            logger.error(f'提交 {len(batch)} 条写入失败，稍后重试', exc_info=True)
+            # 放回缓冲区，期间的新写入优先
+            self._pending = {**batch, **self._pending}
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    async def close(self):
+        """提交所有数据并关闭数据库"""
+        await self.flush()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+class SQLiteKVRepository(KVRepository[_KEY, _VAL]):
+    """
+    SQLite键值存储仓库
+
+    键保存在内存中，用于快速判断键是否存在、统计数量与遍历；值序列化后保存在数据库中。
+    注意每次读取都会得到一个新的对象，修改读取到的对象后需要重新写入。
+    """
+
+    def __init__(self, database: SQLiteDatabase, table: str):
+        """
+        Args:
+            database: 数据库
+            table: 表名
+        """
+        self.database = database
+        self.table = table
+        self._keys: set[str] = set(database.create_table(table))
+        self._iterator = None
+
+    async def close(self):
+        await self.database.flush()
+
+    async def async_get_item(self, key: _KEY):
+        if key not in self._keys:
+            return None
+        data = await self.database.get(self.table, key)
+        return loads(data) if data is not None else None
+
+    async def async_set_item(self, key: _KEY, value: _VAL):
+        self._keys.add(key)
+        self.database.put(self.table, key, dumps(value))
+
+    async def async_del_item(self, key: _KEY):
+        """异步删除键值"""
+        if key in self._keys:
+            self._keys.discard(key)
+            self.database.put(self.table, key, None)
+
+    def __aiter__(self):
+        self._iterator = iter(list(self._keys))
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    def __len__(self):
+        return len(self._keys)
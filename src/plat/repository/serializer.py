@@ -0,0 +1,132 @@
+"""存储库的值序列化工具"""
+import importlib
+import json
+import zlib
+from datetime import datetime, date
+from enum import Enum
+
+from pydantic import BaseModel, ValidationError
+
+_RAW = b'\x02'
+_COMPRESSED = b'\x03'
+
+COMPRESS_THRESHOLD = 1024
+"""序列化后超过该字节数时进行压缩"""
+
+ALLOWED_MODULES = ('plat.', 'xtu_ems.')
+"""反序列化时允许还原的类型所在的包，其他类型一律拒绝"""
+
+
+class SerializationError(ValueError):
+    """值无法序列化或反序列化"""
+    pass
+
+
+def _path(cls: type) -> str:
+    return f'{cls.__module__}:{cls.__qualname__}'
+
+
+def _resolve(path: str, base: type) -> type:
+    """根据类型路径找到类型，只允许还原白名单包中`base`的子类"""
+    module, _, name = path.partition(':')
+    if not module.startswith(ALLOWED_MODULES):
+        raise SerializationError(f'不允许反序列化的类型: {path}')
+    cls = importlib.import_module(module)
+    for part in name.split('.'):
+        cls = getattr(cls, part, None)
+    if not isinstance(cls, type) or not issubclass(cls, base):
+        raise SerializationError(f'不允许反序列化的类型: {path}')
+    return cls
+
+
+def _encode(value):
+    """将值转换为可以JSON序列化的结构，非JSON原生类型带有类型标记"""
+    from plat.service.entity import TimedEntity
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Enum):
+        return {'__enum__': _path(type(value)), 'value': _encode(value.value)}
+    if isinstance(value, BaseModel):
+        ret = {'__model__': _path(type(value)),
+               'fields': {name: _encode(getattr(value, name)) for name in type(value).model_fields}}
+        private = {k: _encode(v) for k, v in (value.__pydantic_private__ or {}).items() if v is not None}
+        if private:
+            ret['private'] = private
+        return ret
+    if isinstance(value, TimedEntity):
+        return {'__entity__': _path(type(value)), 'fields': {k: _encode(v) for k, v in value.__dict__.items()}}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_encode(v) for v in value]
+        return items if isinstance(value, list) else {'__tuple__' if isinstance(value, tuple) else '__set__': items}
+    if isinstance(value, dict):
+        return {'__dict__': [[_encode(k), _encode(v)] for k, v in value.items()]}
+    raise SerializationError(f'无法序列化的类型: {type(value)!r}')
+
+
+def _decode(value):
+    """还原`_encode`得到的结构"""
+    from plat.service.entity import TimedEntity
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if '__model__' in value:
+        cls = _resolve(value['__model__'], BaseModel)
+        # 只保留模型中仍然存在的字段，新增的字段使用默认值
+        fields = {k: _decode(v) for k, v in value['fields'].items() if k in cls.model_fields}
+        try:
+            obj = cls.model_validate(fields)
+        except ValidationError:
+            # 部分模型的默认值本身不符合声明的类型（如成绩单的学分），保存时的值是可信的，直接构造
+            obj = cls.model_construct(**fields)
+        for k, v in value.get('private', {}).items():
+            if k in cls.__private_attributes__:
+                setattr(obj, k, _decode(v))
+        return obj
+    if '__entity__' in value:
+        obj = _resolve(value['__entity__'], TimedEntity)()
+        obj.__dict__.update({k: _decode(v) for k, v in value['fields'].items()})
+        return obj
+    if '__enum__' in value:
+        return _resolve(value['__enum__'], Enum)(_decode(value['value']))
+    if '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+    if '__date__' in value:
+        return date.fromisoformat(value['__date__'])
+    if '__tuple__' in value:
+        return tuple(_decode(v) for v in value['__tuple__'])
+    if '__set__' in value:
+        return {_decode(v) for v in value['__set__']}
+    if '__dict__' in value:
+        return {_decode(k): _decode(v) for k, v in value['__dict__']}
+    raise SerializationError(f'无法识别的数据: {list(value)}')
+
+
+def dumps(value) -> bytes:
+    """
+    序列化
+
+    只保存数据：pydantic模型保存字段（包括私有属性，如账户的token）与类型名，读取时重新构造，
+    后来新增的字段使用默认值；不会像pickle一样在读取时执行任意代码，可以安全地保存在共享存储中。
+    较大的值（如成绩单、课表）会使用zlib压缩，第一个字节标记是否压缩。
+    """
+    data = json.dumps(_encode(value), ensure_ascii=False, separators=(',', ':')).encode()
+    if len(data) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return _COMPRESSED + compressed
+    return _RAW + data
+
+
+def loads(data: bytes):
+    """反序列化"""
+    flag, data = data[:1], data[1:]
+    if flag == _COMPRESSED:
+        data = zlib.decompress(data)
+    elif flag != _RAW:
+        raise SerializationError('不支持的数据格式')
+    return _decode(json.loads(data))
@@ -1,7 +1,11 @@
-from plat.config import CACHE_CONFIG
-from plat.repository.d_basic import SimpleKVRepository
+from datetime import timedelta
+
+from plat.config import CACHE_CONFIG, REPOSITORY_CONFIG
+from plat.repository.d_basic import SimpleKVRepository, KVRepository, BoundedKVRepository
+from plat.repository.d_sqlite import SQLiteDatabase, SQLiteKVRepository
 from plat.service.acc_service import AccountService
 from plat.service.info_service import PersonalInfoService, PublicInfoService
+from plat.service.lease import Lease
 from xtu_ems.ems.handler.get_classroom_status import TodayClassroomStatusGetter, TomorrowClassroomStatusGetter
 from xtu_ems.ems.handler.get_student_courses import StudentCourseGetter
 from xtu_ems.ems.handler.get_student_exam import StudentExamGetter
@@ -10,59 +14,131 @@ from xtu_ems.ems.handler.get_students_transcript import StudentTranscriptGetter,
     StudentTranscriptGetterForAcademicMinor
 from xtu_ems.ems.handler.get_teaching_calendar import TeachingCalendarGetter
 
-account_repository = SimpleKVRepository()
+database = SQLiteDatabase() if REPOSITORY_CONFIG.REPOSITORY_BACKEND == 'sqlite' else None
+"""持久化数据库，使用其他存储时为None"""
+
+redis_client = None
+"""Redis客户端，使用其他存储时为None"""
+if REPOSITORY_CONFIG.REPOSITORY_BACKEND == 'redis':
+    # redis是可选依赖，只在使用Redis存储时导入
+    from plat.repository.d_redis import create_client
+
+    redis_client = create_client()
+
+
+def create_lease() -> Lease:
+    """根据配置的存储后端创建租约，使用Redis时多个进程之间互斥"""
+    if redis_client is not None:
+        from plat.repository.d_redis import RedisLease
+        return RedisLease(redis_client)
+    return Lease()
+
+
+def create_repository(name: str, ttl: timedelta = None) -> KVRepository:
+    """
+    根据配置的存储后端创建存储库
+    Args:
+        name: 存储库名称
+        ttl: 缓存数据的更新间隔，数据会在更新间隔的`CACHE_TTL_FACTOR`倍后淘汰；为空时表示不是缓存，数据不会被淘汰
+    """
+    if database is not None:
+        return SQLiteKVRepository(database, name)
+    ttl = ttl * REPOSITORY_CONFIG.CACHE_TTL_FACTOR if ttl else None
+    if redis_client is not None:
+        from plat.repository.d_redis import RedisKVRepository
+        return RedisKVRepository(redis_client, name, ttl=ttl)
+    if ttl is not None:
+        return BoundedKVRepository(max_entries=REPOSITORY_CONFIG.CACHE_MAX_ENTRIES,
+                                   max_bytes=REPOSITORY_CONFIG.CACHE_MAX_BYTES,
+                                   ttl=ttl)
+    return SimpleKVRepository()
+
+
+account_repository = create_repository('account')
+
+account_service = AccountService(account_repository=account_repository,
+                                 token_repository=create_repository('token'),
+                                 lease=create_lease(),
+                                 revocation_repository=create_repository('revocation'))
 
 info_service = PersonalInfoService(handler=StudentInfoGetter(),
                                    update_expire=CACHE_CONFIG.PERSONAL_INFO_UPDATE,
                                    submit_expire=CACHE_CONFIG.PERSONAL_INFO_SUBMIT,
-                                   account_repository=account_repository
+                                   account_repository=account_repository,
+                                   relogin=account_service.relogin,
+                                   revoke=account_service.revoke,
+                                   local_cache=create_repository('info', CACHE_CONFIG.PERSONAL_INFO_UPDATE)
                                    )
 
 score_service = PersonalInfoService(handler=StudentTranscriptGetter(),
                                     update_expire=CACHE_CONFIG.SCORE_UPDATE,
                                     submit_expire=CACHE_CONFIG.SCORE_SUBMIT,
-                                    account_repository=account_repository
+                                    account_repository=account_repository,
+                                    relogin=account_service.relogin,
+                                    revoke=account_service.revoke,
+                                    local_cache=create_repository('score', CACHE_CONFIG.SCORE_UPDATE)
                                     )
 
 minor_score_service = PersonalInfoService(handler=StudentTranscriptGetterForAcademicMinor(),
                                           update_expire=CACHE_CONFIG.MINOR_SCORE_UPDATE,
                                           submit_expire=CACHE_CONFIG.MINOR_SCORE_SUBMIT,
-                                          account_repository=account_repository
+                                          account_repository=account_repository,
+                                          relogin=account_service.relogin,
+                                          revoke=account_service.revoke,
+                                          local_cache=create_repository('minor_score', CACHE_CONFIG.MINOR_SCORE_UPDATE)
                                           )
 
 course_service = PersonalInfoService(handler=StudentCourseGetter(),
                                      update_expire=CACHE_CONFIG.COURSE_UPDATE,
                                      submit_expire=CACHE_CONFIG.COURSE_SUBMIT,
-                                     account_repository=account_repository
+                                     account_repository=account_repository,
+                                     relogin=account_service.relogin,
+                                     revoke=account_service.revoke,
+                                     local_cache=create_repository('course', CACHE_CONFIG.COURSE_UPDATE)
                                      )
 
 exam_service = PersonalInfoService(handler=StudentExamGetter(),
                                    update_expire=CACHE_CONFIG.EXAM_UPDATE,
                                    submit_expire=CACHE_CONFIG.EXAM_SUBMIT,
-                                   account_repository=account_repository
+                                   account_repository=account_repository,
+                                   relogin=account_service.relogin,
+                                   revoke=account_service.revoke,
+                                   local_cache=create_repository('exam', CACHE_CONFIG.EXAM_UPDATE)
                                    )
 
 rank_service = PersonalInfoService(handler=StudentRankGetter(),
                                    update_expire=CACHE_CONFIG.RANK_UPDATE,
                                    submit_expire=CACHE_CONFIG.RANK_SUBMIT,
-                                   account_repository=account_repository
+                                   account_repository=account_repository,
+                                   relogin=account_service.relogin,
+                                   revoke=account_service.revoke,
+                                   local_cache=create_repository('rank', CACHE_CONFIG.RANK_UPDATE)
                                    )
 
 calendar_service = PublicInfoService(handler=TeachingCalendarGetter(),
                                      update_expire=CACHE_CONFIG.CALENDAR_UPDATE,
                                      submit_expire=CACHE_CONFIG.CALENDAR_SUBMIT,
-                                     account_repository=account_repository
+                                     account_repository=account_repository,
+                                     relogin=account_service.relogin,
+                                     revoke=account_service.revoke,
+                                     local_cache=create_repository('calendar', CACHE_CONFIG.CALENDAR_UPDATE)
                                      )
 
 today_classroom_service = PublicInfoService(handler=TodayClassroomStatusGetter(),
                                             update_expire=CACHE_CONFIG.TODAY_CLASSROOM_UPDATE,
                                             submit_expire=CACHE_CONFIG.TODAY_CLASSROOM_SUBMIT,
-                                            account_repository=account_repository
+                                            account_repository=account_repository,
+                                            relogin=account_service.relogin,
+                                            revoke=account_service.revoke,
+                                            local_cache=create_repository('today_classroom',
+                                                                          CACHE_CONFIG.TODAY_CLASSROOM_UPDATE)
                                             )
 tomorrow_classroom_service = PublicInfoService(handler=TomorrowClassroomStatusGetter(),
                                                update_expire=CACHE_CONFIG.TOMORROW_CLASSROOM_UPDATE,
                                                submit_expire=CACHE_CONFIG.TOMORROW_CLASSROOM_SUBMIT,
-                                               account_repository=account_repository
+                                               account_repository=account_repository,
+                                               relogin=account_service.relogin,
+                                               revoke=account_service.revoke,
+                                               local_cache=create_repository('tomorrow_classroom',
+                                                                             CACHE_CONFIG.TOMORROW_CLASSROOM_UPDATE)
                                                )
-
-account_service = AccountService(account_repository=account_repository)
@@ -1,15 +1,27 @@
 import asyncio
 import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
 
+from plat.config import KEEP_ALIVE_CONFIG, TOKEN_CONFIG
 from plat.repository.d_basic import KVRepository, SimpleKVRepository
 from plat.service.entity import Account, AccountStatus
+from plat.service.lease import Lease
+from plat.service.limiter import TokenBucket
+from plat.service.scheduler import SessionScheduler
+from plat.service.token import TokenSigner, BloomFilter, revoked_accounts, revocation_key
 from xtu_ems.ems.account import AuthenticationAccount
-from xtu_ems.ems.ems import QZEducationalManageSystem, InvalidAccountException
+from xtu_ems.ems.ems import QZEducationalManageSystem, InvalidAccountException, UninitializedPasswordException
 from xtu_ems.ems.handler.valid_session import SessionValidator
 from xtu_ems.ems.session import Session
+from xtu_ems.ems.ticket import LoginTicketPool
 
 logger = logging.getLogger('task.refresh')
 
+KEEP_ALIVE_LEASE = 'keep-alive'
+"""保活租约的名称"""
+
 
 class ExpiredAccountException(Exception):
     """账户已过期"""
@@ -25,20 +37,80 @@ class BannedAccountException(Exception):
         self.username = username
 
 
+class RefreshStatistics:
+    """单轮session保活的统计信息"""
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        """开始时的账户总数"""
+        self.skipped = 0
+        """已失效而跳过的账户数"""
+        self.recently_alive = 0
+        """最近的数据请求已确认会话有效而跳过的账户数"""
+        self.refreshed = 0
+        """保活成功的账户数"""
+        self.expired = 0
+        """会话已失效被标记为过期的账户数"""
+        self.failed = 0
+        """保活请求异常，稍后重试的账户数"""
+        self.start_time = time.monotonic()
+        self.elapsed = 0.
+        """本轮耗时（秒）"""
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.start_time
+
+    def snapshot(self) -> dict:
+        return {
+            'total': self.total,
+            'skipped': self.skipped,
+            'recently_alive': self.recently_alive,
+            'refreshed': self.refreshed,
+            'expired': self.expired,
+            'failed': self.failed,
+            'elapsed': round(self.elapsed, 3)
+        }
+
+
 class AccountService:
-    ems = QZEducationalManageSystem()
+    ems = QZEducationalManageSystem(ticket_pool=LoginTicketPool())
     session_validator = SessionValidator()
 
     def __init__(self, account_repository: KVRepository[str, Account],
-                 token_repository: KVRepository[str, Account] = SimpleKVRepository()):
+                 token_repository: KVRepository[str, str] = None,
+                 concurrency: int = None,
+                 rate_limiter: TokenBucket = None,
+                 scheduler: SessionScheduler = None,
+                 signer: TokenSigner = None,
+                 revoked: BloomFilter = None,
+                 lease: Lease = None,
+                 revocation_repository: KVRepository[str, datetime] = None):
         """
         账户服务类
         Args:
             account_repository: 账户存储库
-            token_repository: token存储库
+            token_repository: token索引，保存token对应的学号
+            concurrency: 同时保活的账户数量
+            rate_limiter: 保活请求的限流器
+            scheduler: session保活调度器
+            signer: token签名器，为空时按照配置决定是否签发带签名的token
+            revoked: 吊销的token与失效账户的token，这些带签名的token需要查询存储库验证
+            lease: 多进程之间的租约，用于选出唯一进行保活的进程，以及避免多个进程同时重新登陆同一个学生
+            revocation_repository: 吊销记录，保存吊销的键与吊销时间，多进程共享存储时用于同步吊销过滤器
         """
         self.account_repository = account_repository
-        self.token_repository = token_repository
+        self.token_repository = token_repository if token_repository is not None else SimpleKVRepository()
+        self.concurrency = concurrency or KEEP_ALIVE_CONFIG.KEEP_ALIVE_CONCURRENCY
+        self.rate_limiter = rate_limiter or TokenBucket(rate=KEEP_ALIVE_CONFIG.KEEP_ALIVE_RATE,
+                                                        capacity=KEEP_ALIVE_CONFIG.KEEP_ALIVE_BURST)
+        self.scheduler = scheduler or SessionScheduler()
+        self.signer = signer or (TokenSigner() if TOKEN_CONFIG.SIGNED_TOKEN else None)
+        self.revoked = revoked if revoked is not None else revoked_accounts
+        self.lease = lease or Lease()
+        self.revocation_repository = revocation_repository if revocation_repository is not None \
+            else SimpleKVRepository()
+        self._refresh_lock = asyncio.Lock()
+        self._relogin_tasks: dict[str, asyncio.Task] = {}
 
     async def login(self, username: str, password: str):
         """
@@ -67,19 +139,91 @@ class AccountService:
             authed_account.password = password
             authed_account.session = session.session_id
             authed_account.status = AccountStatus.NORMAL
+            authed_account.last_alive_time = datetime.now()
+            await self._clear_revocation(authed_account)
         else:
             # 若本地没有账户，创建新账户
             authed_account = Account(student_id=username,
                                      password=password,
                                      session=session.session_id,
-                                     status=AccountStatus.NORMAL)
+                                     status=AccountStatus.NORMAL,
+                                     last_alive_time=datetime.now())
+            authed_account.refresh_token(self._new_token(authed_account))
         # 保存更新后的账户信息
         authed_account = await self.save_account_with_uni_token(authed_account)
+        self.scheduler.schedule(authed_account.student_id, authed_account.last_alive_time)
         return authed_account
 
+    async def relogin(self, student_id: str, expired_session: str = None) -> Optional[Account]:
+        """
+        使用保存的密码重新登陆，同一个学生同时只会进行一次登陆，并发的调用会等待同一个结果；
+        多个进程之间通过租约加锁，其他进程正在登陆时等待其完成，再按照存储库中的账户判断是否还需要登陆
+
+        Args:
+            student_id: 学号
+            expired_session: 调用方发现失效的session，如果账户的session已经被更新，则不需要重新登陆
+
+        Returns:
+            重新登陆后的账户信息，登陆失败时返回None
+        """
+        task = self._relogin_tasks.get(student_id)
+        if task is None:
+            task = asyncio.create_task(self._relogin(student_id, expired_session))
+            self._relogin_tasks[student_id] = task
+            task.add_done_callback(lambda _: self._relogin_tasks.pop(student_id, None))
+        return await asyncio.shield(task)
+
+    async def _relogin(self, student_id: str, expired_session: str = None) -> Optional[Account]:
+        name = f'relogin:{student_id}'
+        while not await self.lease.acquire(name, KEEP_ALIVE_CONFIG.RELOGIN_LOCK_TTL):
+            await asyncio.sleep(KEEP_ALIVE_CONFIG.RELOGIN_LOCK_POLL)
+        try:
+            return await self._relogin_locked(student_id, expired_session)
+        finally:
+            await self.lease.release(name)
+
+    async def _relogin_locked(self, student_id: str, expired_session: str = None) -> Optional[Account]:
+        account: Account = await self.account_repository.async_get_item(student_id)
+        if not account or account.status == AccountStatus.BANNED:
+            return None
+        if expired_session and account.session != expired_session and account.is_valid():
+            # 其他请求已经重新登陆过了
+            return account
+        logger.info(f"账户 {student_id} 的session已失效，正在重新登陆")
+        try:
+            session = await self.ems.async_login(AuthenticationAccount(username=student_id,
+                                                                       password=account.password))
+        except (InvalidAccountException, UninitializedPasswordException):
+            logger.warning(f"账户 {student_id} 的密码已失效，无法重新登陆")
+            await self.expire_account(student_id)
+            return None
+        except Exception:
+            logger.error(f"账户 {student_id} 重新登陆时异常", exc_info=True)
+            return None
+        account.session = session.session_id
+        account.status = AccountStatus.NORMAL
+        account.last_login_time = account.last_alive_time = datetime.now()
+        await self._clear_revocation(account)
+        account = await self.save_account_with_uni_token(account)
+        self.scheduler.schedule(student_id, account.last_alive_time)
+        return account
+
+    def _new_token(self, account: Account) -> Optional[str]:
+        """为账户签发新的token，没有开启签名时返回None，由账户随机生成"""
+        if self.signer is None:
+            return None
+        return self.signer.sign(account.student_id, account.token_generation)
+
+    def _is_signed(self, account: Account) -> bool:
+        """账户的token是否是本服务签发的带签名的token"""
+        return self.signer is not None and self.signer.verify(account.token) is not None
+
     async def save_account_with_uni_token(self, account: Account):
         """
-        刷新唯一的token来保存用户
+        保存用户，并在token索引中记录用户的token
+
+        token由随机数生成，不需要检查是否与其他用户冲突；重新登陆时保留原来的token，客户端不需要重新获取。
+        带签名的token可以直接验证，不需要记录在索引中
 
         Args:
             account: 用户信息
@@ -87,36 +231,79 @@ class AccountService:
         Returns:
             用户信息
         """
-        # 将之前的token删除
-        old_token = account.token
-        if old_token:
-            await self.token_repository.async_del_item(old_token)
-        # 创建新的token，保证token的唯一性
-        while await self.token_repository.async_get_item(account.token):
-            account.refresh_token()
-        await self.token_repository.async_set_item(account.token, account)
+        if not self._is_signed(account):
+            await self.token_repository.async_set_item(account.token, account.student_id)
         await self.account_repository.async_set_item(account.student_id, account)
         return account
 
+    async def revoke_tokens(self, student_ids: Iterable[str]) -> int:
+        """
+        批量吊销用户的token，吊销后用户需要重新登陆获取新的token
+
+        Args:
+            student_ids: 学号
+
+        Returns:
+            吊销的token数量
+        """
+        student_ids = list(student_ids)
+        accounts: list[Account] = await self.account_repository.async_get_items(student_ids)
+        revoked = []
+        for account in filter(None, accounts):
+            revoked.append(account.token)
+            await self.revoke(account.student_id, account.token_generation)
+            account.token_generation += 1
+            account.refresh_token(self._new_token(account))
+            await self.save_account_with_uni_token(account)
+        await self.token_repository.async_del_items(revoked)
+        return len(revoked)
+
     async def auth_with_token(self, token: str):
         """
-        用token验证用户
+        用token验证用户，token索引中只保存学号，以账户存储库中的账户为准
         Args:
             token: 用户凭证
 
         Returns:
             验证通过的用户信息
         """
-        account: Account = await self.token_repository.async_get_item(token)
-        if account and account.token == token:
-            if account.status == AccountStatus.EXPIRED:
-                raise ExpiredAccountException(account.student_id)
-            elif account.status == AccountStatus.BANNED:
-                raise BannedAccountException(account.student_id)
-            elif account.status == AccountStatus.NORMAL:
-                return account
-        else:
+        student_id = await self.token_repository.async_get_item(token)
+        if student_id is None:
+            claims = self.signer.verify(token) if self.signer is not None else None
+            if claims is None:
+                return None
+            student_id, _ = claims
+        if isinstance(student_id, Account):
+            # 兼容旧版本在token存储库中保存的账户副本
+            student_id = student_id.student_id
+        account: Account = await self.account_repository.async_get_item(student_id)
+        if account is None or account.token != token:
             return None
+        if account.status == AccountStatus.NORMAL:
+            return account
+        elif account.status == AccountStatus.EXPIRED:
+            raise ExpiredAccountException(account.student_id)
+        elif account.status == AccountStatus.BANNED:
+            raise BannedAccountException(account.student_id)
+        return None
+
+    async def auth_student_id(self, token: str) -> Optional[str]:
+        """
+        用token验证用户，只返回学号
+
+        带签名的token只需要验证签名；token在吊销过滤器中时，回退到`auth_with_token`查询存储库验证
+        Args:
+            token: 用户凭证
+
+        Returns:
+            验证通过的学号
+        """
+        if self.signer is not None:
+            claims = self.signer.verify(token)
+            if claims is not None and revocation_key(*claims) not in self.revoked:
+                return claims[0]
+        account = await self.auth_with_token(token)
+        return account.student_id if account else None
 
     async def expire_account(self, username: str):
         """
@@ -128,58 +315,227 @@ class AccountService:
         Returns:
             过期的用户信息
         """
+        self.scheduler.remove(username)
         account: Account = await self.account_repository.async_get_item(username)
         if account:
             account.status = AccountStatus.EXPIRED
+            await self.revoke(username, account.token_generation)
             await self.account_repository.async_set_item(username, account)
             return account
         else:
             return None
 
-    async def refresh_task(self):
-        logger.info(f"一共有 {len(self.account_repository)} 个账户需要刷新")
-        valid_account_count = 0
-        async for student_id in self.account_repository:
-            account: Account = await self.account_repository.async_get_item(student_id)
-            if account.is_valid():
-                result = await self.refresh_single_session(account)
-                if not result:
-                    logger.warning(f"账户 {account.student_id} 刷新session失败")
-                    await self.expire_account(account.student_id)
-                else:
-                    logger.debug(f"账户 {account.student_id} 刷新session成功")
-                    valid_account_count += 1
-                await asyncio.sleep(.5)
-        logger.info(f"已刷新 {valid_account_count}/{len(self.account_repository)} 个账户")
+    async def revoke(self, student_id: str, generation: int):
+        """
+        吊销账户某一代的token，加入本进程的吊销过滤器，并写入共享的吊销记录，其他进程同步后也会回退到查询存储库验证
+        Args:
+            student_id: 学号
+            generation: token的代数
+        """
+        key = revocation_key(student_id, generation)
+        self.revoked.add(key)
+        await self.revocation_repository.async_set_item(key, datetime.now())
+
+    async def _clear_revocation(self, account: Account):
+        """账户重新登陆后删除当前代的吊销记录；已经同步到过滤器中的记录在下一次重建时清除"""
+        await self.revocation_repository.async_del_item(revocation_key(account.student_id, account.token_generation))
 
-    async def refresh_session(self, interval: int):
+    async def sync_revocations(self) -> int:
         """
-        刷新session
+        将共享吊销记录中其他进程吊销的token加入本进程的吊销过滤器，并删除超过保留时间的记录
+
+        Returns:
+            加入过滤器的记录数量
+        """
+        keys = [key async for key in self.revocation_repository]
+        revoked_times: list[datetime] = await self.revocation_repository.async_get_items(keys)
+        deadline = datetime.now() - TOKEN_CONFIG.TOKEN_REVOCATION_RETAIN
+        count, stale = 0, []
+        for key, revoked_time in zip(keys, revoked_times):
+            if revoked_time is None:
+                continue
+            if revoked_time < deadline:
+                stale.append(key)
+            else:
+                self.revoked.add(key)
+                count += 1
+        await self.revocation_repository.async_del_items(stale)
+        return count
+
+    async def refresh_task(self, student_ids: Iterable[str] = None) -> RefreshStatistics | None:
         """
+        对账户进行一轮session保活
+
+        - 不指定账户时对所有账户保活
+        - 保活成功的账户会按照本次确认有效的时间重新调度
+        - 由`concurrency`个worker并发保活，请求速率受`rate_limiter`限制
+        - 同一时间只会进行一轮保活，上一轮未结束时直接跳过
+        Args:
+            student_ids: 需要保活的学号
+
+        Returns:
+            本轮的统计信息，跳过时返回None
+        """
+        if self._refresh_lock.locked():
+            logger.warning("上一轮session保活尚未结束，跳过本轮")
+            return None
+        async with self._refresh_lock:
+            if student_ids is None:
+                # 先取出所有账户，避免保活过程中有新账户登陆导致迭代失败
+                student_ids = [student_id async for student_id in self.account_repository]
+            student_ids = list(student_ids)
+            stats = RefreshStatistics(total=len(student_ids))
+            student_ids = iter(student_ids)
+            logger.info(f"一共有 {stats.total} 个账户需要刷新")
 
+            async def worker():
+                for student_id in student_ids:
+                    await self._refresh_account(student_id, stats)
+
+            await asyncio.gather(*[worker() for _ in range(min(self.concurrency, max(stats.total, 1)))])
+            stats.finish()
+            logger.info(f"已刷新 {stats.refreshed}/{stats.total} 个账户，统计: {stats.snapshot()}")
+            logger.info(f"验证码识别统计: {self.ems.captcha_stats.snapshot()}")
+            return stats
+
+    async def _refresh_account(self, student_id: str, stats: RefreshStatistics):
+        """保活单个账户，并记录到统计信息中"""
+        account: Account = await self.account_repository.async_get_item(student_id)
+        if not account or not account.is_valid():
+            stats.skipped += 1
+            return
+        if self.scheduler.is_fresh(account.last_alive_time):
+            # 最近的数据请求已经确认会话有效，不需要额外的保活请求
+            self.scheduler.schedule(student_id, account.last_alive_time)
+            stats.recently_alive += 1
+            return
+        alive = await self.refresh_single_session(account)
+        if alive:
+            logger.debug(f"账户 {account.student_id} 刷新session成功")
+            account.last_alive_time = datetime.now()
+            await self.account_repository.async_set_item(student_id, account)
+            self.scheduler.schedule(student_id, account.last_alive_time)
+            stats.refreshed += 1
+        elif alive is None:
+            # 请求异常无法判断会话是否有效（如教务系统暂时无法访问），不标记过期，稍后重新保活
+            logger.warning(f"账户 {account.student_id} 保活请求异常，稍后重试")
+            self.scheduler.schedule(student_id, account.last_alive_time or datetime.min,
+                                    jitter=KEEP_ALIVE_CONFIG.KEEP_ALIVE_RETRY_DELAY)
+            stats.failed += 1
+        else:
+            logger.warning(f"账户 {account.student_id} 的session已失效")
+            await self.expire_account(account.student_id)
+            stats.expired += 1
+
+    async def sync_schedule(self) -> int:
+        """
+        将存储库中有效但还没有被调度的账户加入调度器，
+        按照最后一次确认有效的时间（没有时使用当前时间）计算保活时间，并随机推迟以免同时保活；
+        同时按照存储库中的状态重建吊销过滤器，只保留失效账户与被吊销的旧代token
+
+        Returns:
+            新加入调度的账户数量
+        """
+        count = 0
+        self.revoked.start_rebuild()
+        try:
+            student_ids = [student_id async for student_id in self.account_repository]
+            accounts: list[Account] = await self.account_repository.async_get_items(student_ids)
+        except Exception:
+            self.revoked.cancel_rebuild()
+            raise
+        revoked = []
+        for student_id, account in zip(student_ids, accounts):
+            if not account:
+                continue
+            revoked += [revocation_key(student_id, generation) for generation in range(account.token_generation)]
+            if not account.is_valid():
+                revoked.append(revocation_key(student_id, account.token_generation))
+            elif student_id not in self.scheduler:
+                self.scheduler.schedule(student_id, account.last_alive_time or datetime.now(),
+                                        jitter=KEEP_ALIVE_CONFIG.SESSION_SYNC_JITTER)
+                count += 1
+        self.revoked.finish_rebuild(revoked)
+        return count
+
+    async def _is_leader(self) -> bool:
+        """获得或者续约保活租约，多进程部署时只有持有租约的进程进行保活"""
+        try:
+            return await self.lease.acquire(KEEP_ALIVE_LEASE, KEEP_ALIVE_CONFIG.KEEP_ALIVE_LEADER_TTL)
+        except Exception:
+            logger.error('获取保活租约时异常', exc_info=True)
+            return False
+
+    async def refresh_session(self, interval: int):
+        """
+        按照调度器保活session，只对即将过期的账户发起保活请求
+
+        每个进程都会定期同步调度与吊销过滤器，每隔`TOKEN_REVOCATION_SYNC`秒同步其他进程的吊销记录，
+        但只有持有保活租约的进程发起保活请求，
+        多个进程共享存储时保活请求不会随进程数量成倍增加；持有租约的进程退出后，其他进程在租约过期后接替
+
+        Args:
+            interval: 与存储库同步调度的时间间隔（秒），用于发现没有经过登陆加入的账户
+        """
+        last_sync = last_revocation_sync = None
+        leading = False
         while True:
-            logger.info('开始刷新session')
-            asyncio.create_task(self.refresh_task())
-            await asyncio.sleep(interval)
+            if last_sync is None or time.monotonic() - last_sync >= interval:
+                count = await self.sync_schedule()
+                last_sync = time.monotonic()
+                logger.info(f'同步保活调度，新增 {count} 个账户，共 {len(self.scheduler)} 个账户')
+            if last_revocation_sync is None or \
+                    time.monotonic() - last_revocation_sync >= TOKEN_CONFIG.TOKEN_REVOCATION_SYNC:
+                try:
+                    await self.sync_revocations()
+                except Exception:
+                    logger.error('同步吊销记录时异常', exc_info=True)
+                last_revocation_sync = time.monotonic()
+            is_leader = await self._is_leader()
+            if is_leader != leading:
+                logger.info('获得保活租约，开始保活' if is_leader else '保活租约由其他进程持有，停止保活')
+                leading = is_leader
+            due = self.scheduler.pop_due() if leading else None
+            if due:
+                retry = True
+                try:
+                    # 返回None表示有其他保活正在进行
+                    retry = await self.refresh_task(due) is None
+                except Exception:
+                    logger.error('刷新session时异常', exc_info=True)
+                finally:
+                    if retry:
+                        # 稍后重试没有完成保活的账户，避免取出的账户从调度中丢失
+                        retry_at = datetime.now() + timedelta(seconds=KEEP_ALIVE_CONFIG.KEEP_ALIVE_TICK)
+                        for student_id in due:
+                            if student_id not in self.scheduler:
+                                self.scheduler.schedule_at(student_id, retry_at)
+            next_due = self.scheduler.next_due()
+            wait = KEEP_ALIVE_CONFIG.KEEP_ALIVE_TICK
+            if next_due is not None:
+                wait = min(max((next_due - datetime.now()).total_seconds(), 0), wait)
+            await asyncio.sleep(wait)
 
-    async def refresh_single_session(self, account: Account, max_retry=3) -> bool:
+    async def refresh_single_session(self, account: Account, max_retry: int = None) -> Optional[bool]:
         """
-        刷新单个session
+        刷新单个session，请求异常时按指数退避重试
         Args:
             account: 账号信息
             max_retry: 最大重试次数
 
         Returns:
-            bool: 是否刷新成功
+            会话是否有效；重试后请求仍然异常，无法判断时返回None
         """
+        max_retry = max_retry if max_retry is not None else KEEP_ALIVE_CONFIG.KEEP_ALIVE_MAX_RETRY
         retry = 0
-        while retry <= max_retry:
+        while True:
             try:
-                validation = await self.session_validator.async_handler(Session(session_id=account.session))
-                return validation
-            except Exception as e:
+                await self.rate_limiter.acquire()
+                return await self.session_validator.async_handler(Session(session_id=account.session))
+            except Exception:
+                if retry >= max_retry:
+                    logger.error(f'账户 {account.student_id} 保活时异常，已重试 {retry} 次', exc_info=True)
+                    return None
                 retry += 1
-                logger.warning(f'账户 {account.student_id} 刷新session失败 [{retry} / {max_retry}]')
-                logger.error("账号保活时异常", exc_info=True)
-
-        return False
+                logger.warning(f'账户 {account.student_id} 保活时异常，重试 [{retry} / {max_retry}]')
+                await asyncio.sleep(KEEP_ALIVE_CONFIG.KEEP_ALIVE_RETRY_BACKOFF * 2 ** (retry - 1))
@@ -12,10 +12,14 @@ class TimedEntity:
         self.data = data
         self.create_time = datetime.now()
         self.update_time = None
+        self.data_size = None
+        """数据的估算大小，数据更新后清空，写入有界存储时重新估算"""
 
     def update(self, key, value):
         self.__dict__[key] = value
         self.update_time = datetime.now()
+        if key == 'data':
+            self.data_size = None
 
 
 class TaskEntity(TimedEntity):
@@ -59,6 +63,10 @@ class Account(BaseModel):
     """账户状态"""
     last_login_time: datetime = datetime.now()
     """最后一次登陆时间"""
+    last_alive_time: datetime = None
+    """最后一次确认session有效的时间"""
+    token_generation: int = 0
+    """token的代数，每次吊销token时加一"""
 
     @property
     def token(self):
@@ -71,7 +79,7 @@ class Account(BaseModel):
         """判断用户是否有效"""
         return self.status == AccountStatus.NORMAL
 
-    def refresh_token(self):
-        """刷新用户凭证"""
-        self._token = str(uuid.uuid4())
+    def refresh_token(self, token: str = None):
+        """刷新用户凭证，没有指定新的凭证时随机生成"""
+        self._token = token or str(uuid.uuid4())
         return self.token
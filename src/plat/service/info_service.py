@@ -3,10 +3,11 @@ from abc import abstractmethod
 from datetime import timedelta
 from typing import TypeVar, Generic, Optional
 
+from plat.config import CACHE_CONFIG
 from plat.repository.d_basic import KVRepository, SimpleKVRepository
 from plat.repository.d_cache import CacheRepository
 from plat.service.entity import TaskEntity
-from plat.service.task import UpdateTask, PersonalUpdateTask
+from plat.service.task import UpdateTask, PersonalUpdateTask, Relogin, Revoke
 from plat.service.validator import TaskValidator
 from xtu_ems.ems.handler import Handler
 
@@ -15,16 +16,80 @@ D = TypeVar('D')
 
 class IService(Generic[D]):
     @abstractmethod
-    async def get_info(self, student_id: str) -> Optional[D]:
+    async def get_info(self, student_id: str, wait: float = None) -> Optional[D]:
         pass
 
+    @abstractmethod
+    async def get_record(self, student_id: str, wait: float = None) -> Optional[TaskEntity]:
+        """获取信息的缓存记录，包含数据与更新时间"""
+        pass
+
+    def is_updating(self, student_id: str) -> bool:
+        """信息是否正在更新"""
+        return False
+
 
 class PersonalInfoService(IService[D]):
     """个人信息服务"""
 
-    async def get_info(self, key: str) -> Optional[D]:
+    async def get_info(self, key: str, wait: float = None) -> Optional[D]:
+        """
+        获取信息，规则见`get_record`
+        Args:
+            key: 学号
+            wait: 数据正在更新时最多等待的毫秒数
+
+        Returns:
+            信息，等待超时仍然没有数据时返回None
+        """
+        task = await self.get_record(key, wait)
+        return task.data if task else None
+
+    async def get_record(self, key: str, wait: float = None) -> Optional[TaskEntity]:
+        """
+        获取信息的缓存记录
+
+        - 还没有数据时（如新用户第一次请求），最多等待`first_wait`毫秒，等待第一次更新完成
+        - 已经有数据时直接返回缓存的数据；如果关闭了`stale_while_revalidate`，数据正在更新时会等待更新完成
+        Args:
+            key: 学号
+            wait: 数据正在更新时最多等待的毫秒数，为0时直接返回当前数据，为空时按照上面的规则决定
+
+        Returns:
+            缓存记录，还没有记录时返回None
+        """
         task: TaskEntity = await self.storage.async_get_item(key)
-        return task.data
+        if wait is None:
+            has_data = task is not None and task.update_time is not None
+            wait = 0 if has_data and self.stale_while_revalidate else self.first_wait
+        if wait > 0 and await self.wait_refresh(key, wait):
+            task = await self.storage.local_cache.async_get_item(key)
+        return task
+
+    def is_updating(self, key: str) -> bool:
+        return key in self.inflight
+
+    async def wait_refresh(self, key: str, wait: float) -> bool:
+        """
+        等待正在进行的更新完成
+        Args:
+            key: 更新内容的key
+            wait: 最多等待的毫秒数
+
+        Returns:
+            是否等到了更新完成，没有正在进行的更新时返回False
+        """
+        task = self.inflight.get(key)
+        if task is None:
+            return False
+        try:
+            await asyncio.wait_for(asyncio.shield(task), wait / 1000)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except Exception:
+            # 更新任务的异常由任务自己处理，这里只关心是否结束
+            return True
 
     def generate_task(self, key: str,
                       storage: KVRepository[str, TaskEntity]):
@@ -37,7 +102,7 @@ class PersonalInfoService(IService[D]):
         Returns:
             返回一个更新任务
         """
-        return PersonalUpdateTask(key, self.handler, storage, self.account_repository)
+        return PersonalUpdateTask(key, self.handler, storage, self.account_repository, self.relogin, self.revoke)
 
     def get_refresher(self):
         """
@@ -45,11 +110,16 @@ class PersonalInfoService(IService[D]):
         """
 
         async def on_refresh(key: str, value: TaskEntity, repo: KVRepository[str, TaskEntity]):
+            if key in self.inflight:
+                # 同一份数据已经在更新中，并发的请求共享同一个更新任务
+                return value
             task = self.generate_task(key=key, storage=repo)
             if not value:
                 value = TaskEntity()
             value.on_submit_task()
             task = asyncio.create_task(task())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
             await repo.async_set_item(key, value)
             self.background_tasks.add(task)
             task.add_done_callback(self.background_tasks.discard)
@@ -66,13 +136,38 @@ class PersonalInfoService(IService[D]):
     def __init__(self, handler: Handler,
                  update_expire: timedelta,
                  submit_expire: timedelta,
-                 account_repository: KVRepository):
+                 account_repository: KVRepository,
+                 relogin: Relogin = None,
+                 first_wait: float = None,
+                 stale_while_revalidate: bool = None,
+                 local_cache: KVRepository[str, TaskEntity] = None,
+                 revoke: Revoke = None):
+        """
+        Args:
+            handler: 获取数据的处理器
+            update_expire: 数据的有效期
+            submit_expire: 提交更新任务的最小间隔
+            account_repository: 账户存储库
+            relogin: 会话失效时重新登陆的函数
+            first_wait: 还没有数据时最多等待第一次更新的毫秒数
+            stale_while_revalidate: 数据正在更新时是否直接返回旧数据
+            local_cache: 数据的本地存储，默认为进程内存储
+            revoke: 更新时发现账户过期，吊销token的函数
+        """
         self.validator = TaskValidator(update_expire=update_expire,
                                        submit_expire=submit_expire)
         self.handler = handler
         self.account_repository = account_repository
+        self.relogin = relogin
+        self.revoke = revoke
+        self.first_wait = first_wait if first_wait is not None else CACHE_CONFIG.FIRST_RESULT_WAIT
+        self.stale_while_revalidate = stale_while_revalidate if stale_while_revalidate is not None \
+            else CACHE_CONFIG.STALE_WHILE_REVALIDATE
         self.background_tasks = set()
-        self.storage: [str, TaskEntity] = CacheRepository(local_cache=SimpleKVRepository[str, TaskEntity](),
+        self.inflight: dict[str, asyncio.Task] = {}
+        """正在进行的更新任务"""
+        local_cache = local_cache if local_cache is not None else SimpleKVRepository[str, TaskEntity]()
+        self.storage: [str, TaskEntity] = CacheRepository(local_cache=local_cache,
                                                           validator=self.validator,
                                                           on_write_back=self.get_updater(),
                                                           on_refresh=self.get_refresher())
@@ -81,9 +176,14 @@ class PersonalInfoService(IService[D]):
 class PublicInfoService(PersonalInfoService[D]):
     """公共信息服务"""
 
-    async def get_info(self, student_id: str = None) -> Optional[D]:
-        task: TaskEntity = await self.storage.async_get_item(self.name)
-        return task.data
+    async def get_info(self, student_id: str = None, wait: float = None) -> Optional[D]:
+        return await super().get_info(self.name, wait)
+
+    async def get_record(self, student_id: str = None, wait: float = None) -> Optional[TaskEntity]:
+        return await super().get_record(self.name, wait)
+
+    def is_updating(self, student_id: str = None) -> bool:
+        return super().is_updating(self.name)
 
     async def get_public_info(self) -> Optional[D]:
         return await self.get_info()
@@ -99,13 +199,19 @@ class PublicInfoService(PersonalInfoService[D]):
         Returns:
             返回一个更新任务
         """
-        return UpdateTask(key, self.handler, storage, self.account_repository)
+        return UpdateTask(key, self.handler, storage, self.account_repository, self.relogin, self.revoke)
 
     def __init__(self,
                  handler: Handler,
                  update_expire: timedelta,
                  submit_expire: timedelta,
                  account_repository: KVRepository,
-                 name: str = "data"):
-        super().__init__(handler, update_expire, submit_expire, account_repository)
+                 name: str = "data",
+                 relogin: Relogin = None,
+                 first_wait: float = None,
+                 stale_while_revalidate: bool = None,
+                 local_cache: KVRepository[str, TaskEntity] = None,
+                 revoke: Revoke = None):
+        super().__init__(handler, update_expire, submit_expire, account_repository, relogin,
+                         first_wait, stale_while_revalidate, local_cache, revoke)
         self.name = name
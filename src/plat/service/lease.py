@@ -0,0 +1,27 @@
+"""租约，多个进程共享存储时用于保证同一项工作只由一个进程进行"""
+from datetime import timedelta
+
+
+class Lease:
+    """
+    租约
+
+    同一个名称的租约同一时间只有一个持有者，持有者需要在租约过期前续约，进程退出后租约自动过期。
+    默认实现只用于单进程部署，总是可以获得租约；多个进程共享Redis时使用`RedisLease`
+    """
+
+    async def acquire(self, name: str, ttl: timedelta) -> bool:
+        """
+        获得租约，已经持有时续约
+        Args:
+            name: 租约名称
+            ttl: 租约的有效期
+
+        Returns:
+            是否持有租约
+        """
+        return True
+
+    async def release(self, name: str):
+        """释放持有的租约，没有持有时不做任何事"""
+        pass
@@ -0,0 +1,40 @@
+"""限流工具"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+
+    令牌以固定速率放入桶中，桶满时多余的令牌被丢弃；每次请求前需要取得令牌，令牌不足时等待。
+    等待者按照到达顺序依次取得令牌。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate: 每秒放入的令牌数，为0时不限速
+            capacity: 桶的容量，即允许的突发请求数
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        """取得令牌，令牌不足时等待"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
@@ -0,0 +1,106 @@
+"""session保活调度器"""
+import heapq
+import itertools
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from plat.config import KEEP_ALIVE_CONFIG
+
+
+class SessionScheduler:
+    """
+    session过期调度器
+
+    按照每个账户最后一次确认session有效的时间计算保活时间，使用小根堆按保活时间排序，
+    每次只取出即将过期的账户进行保活，使保活请求随时间均匀分布，而不是每隔一段时间集中扫描所有账户。
+
+    重复调度同一个账户时，旧的记录不会立即从堆中删除，而是在取出时根据最新的保活时间丢弃。
+    """
+
+    def __init__(self, expire: timedelta = None, ahead: timedelta = None):
+        """
+        Args:
+            expire: session的过期时间
+            ahead: 在过期前多久进行保活
+        """
+        self.expire = expire or KEEP_ALIVE_CONFIG.SESSION_EXPIRE
+        self.ahead = ahead or KEEP_ALIVE_CONFIG.SESSION_REFRESH_AHEAD
+        self._heap: list[tuple[datetime, int, str]] = []
+        self._due: dict[str, datetime] = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, student_id: str):
+        return student_id in self._due
+
+    def is_fresh(self, alive_time: Optional[datetime], now: datetime = None) -> bool:
+        """会话最近是否被确认有效，还没有到需要保活的时间"""
+        return alive_time is not None and alive_time + self.expire - self.ahead > (now or datetime.now())
+
+    def schedule(self, student_id: str, alive_time: datetime = None, jitter: timedelta = None) -> datetime:
+        """
+        根据最后一次确认session有效的时间调度账户
+        Args:
+            student_id: 学号
+            alive_time: 最后一次确认session有效的时间，默认为当前时间
+            jitter: 随机推迟的最大时间，已经过了保活时间的账户从当前时间开始推迟，用于打散同时加入的大量账户
+
+        Returns:
+            下一次保活的时间
+        """
+        now = datetime.now()
+        due = (alive_time or now) + self.expire - self.ahead
+        if jitter:
+            due = max(due, now) + jitter * random.random()
+        return self.schedule_at(student_id, due)
+
+    def schedule_at(self, student_id: str, due: datetime) -> datetime:
+        """
+        指定账户的保活时间
+        Args:
+            student_id: 学号
+            due: 保活时间
+
+        Returns:
+            保活时间
+        """
+        self._due[student_id] = due
+        heapq.heappush(self._heap, (due, next(self._counter), student_id))
+        return due
+
+    def remove(self, student_id: str):
+        """取消账户的调度"""
+        self._due.pop(student_id, None)
+
+    def _discard_stale(self):
+        """丢弃堆顶已被重新调度或取消的记录"""
+        while self._heap:
+            due, _, student_id = self._heap[0]
+            if self._due.get(student_id) == due:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[datetime]:
+        """最近一次需要保活的时间，没有账户时返回None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime = None) -> list[str]:
+        """
+        取出所有到达保活时间的账户，取出的账户需要在保活成功后重新调度
+        Args:
+            now: 当前时间
+
+        Returns:
+            需要保活的学号列表，按保活时间排序
+        """
+        now = now or datetime.now()
+        ret = []
+        while (due := self.next_due()) is not None and due <= now:
+            _, _, student_id = heapq.heappop(self._heap)
+            del self._due[student_id]
+            ret.append(student_id)
+        return ret
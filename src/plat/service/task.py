@@ -1,8 +1,12 @@
 import asyncio
 import logging
+from typing import Callable, Awaitable, Optional
 
+from plat.config import KEEP_ALIVE_CONFIG
 from plat.repository.d_basic import KVRepository
 from plat.service.entity import TaskEntity, Account, AccountStatus
+from plat.service.token import revoked_accounts, revocation_key
+from xtu_ems.ems.ems import SessionExpiredException
 from xtu_ems.ems.handler import Handler
 from xtu_ems.ems.handler.valid_session import SessionValidator
 from xtu_ems.ems.session import Session
@@ -10,13 +14,22 @@ from xtu_ems.ems.session import Session
 logger = logging.getLogger('task.update')
 
 
+Relogin = Callable[[str, str], Awaitable[Optional[Account]]]
+"""重新登陆函数，参数为学号与失效的session，返回重新登陆后的账户"""
+
+Revoke = Callable[[str, int], Awaitable[None]]
+"""吊销token的函数，参数为学号与token的代数"""
+
+
 class UpdateTask:
     session_validator = SessionValidator()
 
     def __init__(self, key: str,
                  handler: Handler,
                  storage: KVRepository[str, TaskEntity],
-                 user_repository: KVRepository[str, Account]):
+                 user_repository: KVRepository[str, Account],
+                 relogin: Relogin = None,
+                 revoke: Revoke = None):
         """
         后台更新的任务
         Args:
@@ -24,11 +37,15 @@ class UpdateTask:
             handler: 更新的具体操作，需要实现async_handler方法
             storage: 存储更新后的结果
             user_repository: 存储用户的仓库，用于设置用户状态
+            relogin: 会话失效时重新登陆的函数，为空时不自动重新登陆
+            revoke: 账户过期时吊销token的函数，为空时只加入本进程的吊销过滤器
         """
         self.key = key
         self.storage = storage
         self.handler = handler
         self.user_repository = user_repository
+        self.relogin = relogin
+        self.revoke = revoke
         logger.info(f"创建了一个更新任务: [{handler.__class__.__name__}]-[{key}]")
 
     async def get_account(self) -> Account:
@@ -56,6 +73,9 @@ class UpdateTask:
             try:
                 result = await self.handler.async_handler(session)
                 return result
+            except SessionExpiredException:
+                # 会话失效时重试没有意义
+                raise
             except Exception as e:
                 retry += 1
                 logger.warning(f"重试第 [{retry} / {retry}] 次")
@@ -63,19 +83,81 @@ class UpdateTask:
                     raise e
                 await asyncio.sleep(.1)
 
+    async def _update_account(self, student_id: str, session_id: str,
+                              update: Callable[[Account], bool]) -> Optional[Account]:
+        """
+        重新读取账户并修改，只有账户仍然使用本任务的session时才保存，
+        避免用任务开始时读到的旧副本覆盖期间完成的登陆、重新登陆或吊销token
+        Args:
+            student_id: 学号
+            session_id: 本任务使用的session
+            update: 修改账户的函数，返回是否需要保存
+
+        Returns:
+            保存后的账户，没有保存时返回None
+        """
+        account: Account = await self.user_repository.async_get_item(student_id)
+        if account is None or account.session != session_id or not update(account):
+            return None
+        await self.user_repository.async_set_item(student_id, account)
+        return account
+
+    async def _report_alive(self, account: Account, session: Session):
+        """将处理器确认的会话有效时间记录到账户中，保活时可以跳过最近确认有效的账户"""
+        if not session.alive_time:
+            return
+
+        def update(current: Account) -> bool:
+            if current.last_alive_time is not None and session.alive_time <= current.last_alive_time:
+                return False
+            current.last_alive_time = session.alive_time
+            return True
+
+        await self._update_account(account.student_id, session.session_id, update)
+
+    async def _revoke(self, account: Account):
+        """吊销过期账户当前代的token，带签名的token不能再直接通过验证"""
+        if self.revoke is not None:
+            await self.revoke(account.student_id, account.token_generation)
+        else:
+            revoked_accounts.add(revocation_key(account.student_id, account.token_generation))
+
+    async def _relogin(self, account: Account) -> Optional[Account]:
+        """会话失效时重新登陆，返回重新登陆后的账户，无法重新登陆时返回None"""
+        if self.relogin is None or not KEEP_ALIVE_CONFIG.AUTO_RELOGIN:
+            return None
+        logger.info(f"{account.student_id} 的SESSION已失效，尝试重新登陆")
+        return await self.relogin(account.student_id, account.session)
+
     async def __call__(self, *args, **kwargs):
         # 获取Session，并且判断Session是否存在
         account = await self.get_account()
         if account:
-            session = account.session
+            session = Session(session_id=account.session)
             try:
-                result = await self._try_handler(Session(session_id=session))
+                try:
+                    result = await self._try_handler(session)
+                except SessionExpiredException:
+                    relogged = await self._relogin(account)
+                    if relogged is None:
+                        raise
+                    account = relogged
+                    session = Session(session_id=account.session)
+                    result = await self._try_handler(session)
             except Exception as e:
                 # 认为Session可能过期了
                 logger.info(f" {account.student_id} 的SESSION可能过期了，需要重新登陆")
                 logging.error("Exception occurred", exc_info=True)
-                account.status = AccountStatus.EXPIRED
+
+                def expire(current: Account) -> bool:
+                    current.status = AccountStatus.EXPIRED
+                    return True
+
+                expired = await self._update_account(account.student_id, session.session_id, expire)
+                if expired:
+                    await self._revoke(expired)
                 return None
+            await self._report_alive(account, session)
             # 更新数据
             former_record: TaskEntity = ((await self.storage.async_get_item(self.key))
                                          or TaskEntity())
@@ -89,7 +171,9 @@ class PersonalUpdateTask(UpdateTask):
     def __init__(self, student_id: str,
                  handler: Handler,
                  storage: KVRepository[str, TaskEntity],
-                 user_repository: KVRepository[str, Account]):
+                 user_repository: KVRepository[str, Account],
+                 relogin: Relogin = None,
+                 revoke: Revoke = None):
         """
         后台更新的任务
         Args:
@@ -97,8 +181,10 @@ class PersonalUpdateTask(UpdateTask):
             handler: 更新的具体操作，需要实现async_handler方法
             storage: 存储更新后的结果
             user_repository: 存储用户的仓库，用于设置用户状态
+            relogin: 会话失效时重新登陆的函数，为空时不自动重新登陆
+            revoke: 账户过期时吊销token的函数，为空时只加入本进程的吊销过滤器
         """
-        super().__init__(student_id, handler, storage, user_repository)
+        super().__init__(student_id, handler, storage, user_repository, relogin, revoke)
 
     async def get_account(self) -> Account:
         """
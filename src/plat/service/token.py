@@ -0,0 +1,146 @@
+"""带签名的用户凭证，验证时只需要计算签名，不需要查询存储库"""
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from typing import Optional
+
+from plat.config import TOKEN_CONFIG
+
+logger = logging.getLogger('service.token')
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def revocation_key(student_id: str, generation: int) -> str:
+    """吊销过滤器中记录的键，吊销的是账户某一代的token"""
+    return f'{student_id}:{generation}'
+
+
+class BloomFilter:
+    """
+    布隆过滤器，用于记录被吊销或者失效的token
+
+    只会误判存在，不会漏判，被误判的token回退到查询存储库验证。
+    过滤器无法删除元素，需要定期调用`start_rebuild`与`finish_rebuild`按照存储库中的状态重建
+    """
+
+    def __init__(self, bits: int = None, hashes: int = None):
+        """
+        Args:
+            bits: 位数
+            hashes: 哈希函数数量
+        """
+        self.bits = bits or TOKEN_CONFIG.TOKEN_REVOCATION_BITS
+        self.hashes = hashes or TOKEN_CONFIG.TOKEN_REVOCATION_HASHES
+        self.array = bytearray((self.bits + 7) // 8)
+        self._recent: Optional[list[str]] = None
+        """重建期间加入的元素，重建完成时保留"""
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=8 * self.hashes).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 8:(i + 1) * 8], 'little') % self.bits
+
+    def add(self, item: str):
+        self._set(self.array, item)
+        if self._recent is not None:
+            self._recent.append(item)
+
+    def _set(self, array: bytearray, item: str):
+        for pos in self._positions(item):
+            array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def clear(self):
+        self.array = bytearray(len(self.array))
+
+    def start_rebuild(self):
+        """开始重建，之后加入的元素在重建完成时会被保留"""
+        self._recent = []
+
+    def cancel_rebuild(self):
+        """放弃重建，保留过滤器原有的内容"""
+        self._recent = None
+
+    def finish_rebuild(self, items: list[str]):
+        """
+        用新的元素替换过滤器中的全部内容
+        Args:
+            items: 读取存储库得到的元素，不包括重建期间通过`add`加入的元素
+        """
+        array = bytearray(len(self.array))
+        for item in items + (self._recent or []):
+            self._set(array, item)
+        self.array = array
+        self._recent = None
+
+
+class TokenSigner:
+    """
+    token签发与验证
+
+    token格式为`学号.签发时间.代数.签名`，学号使用base64编码，签发时间与代数为十六进制，
+    签名为HMAC-SHA256的前16字节。账户吊销token时代数加一，旧代数的token与账户中保存的token不再一致。
+    """
+
+    def __init__(self, secret: bytes | str = None):
+        """
+        Args:
+            secret: 签名密钥，为空时使用配置中的密钥，配置也为空时随机生成
+        """
+        secret = secret or TOKEN_CONFIG.TOKEN_SECRET
+        if not secret:
+            logger.warning('没有配置TOKEN_SECRET，使用随机密钥，重启后之前签发的token全部失效')
+            secret = secrets.token_bytes(32)
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+
+    def _signature(self, payload: str) -> str:
+        return _b64encode(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()[:16])
+
+    def sign(self, student_id: str, generation: int = 0, issue_time: float = None) -> str:
+        """
+        签发token
+        Args:
+            student_id: 学号
+            generation: token的代数
+            issue_time: 签发时间，默认为当前时间
+
+        Returns:
+            token
+        """
+        issued = int(issue_time if issue_time is not None else time.time())
+        payload = f'{_b64encode(student_id.encode())}.{issued:x}.{generation:x}'
+        return f'{payload}.{self._signature(payload)}'
+
+    def verify(self, token: str) -> Optional[tuple[str, int]]:
+        """
+        验证token的签名
+        Args:
+            token: 用户凭证
+
+        Returns:
+            学号与代数，签名无效或者不是签名的token时返回None
+        """
+        payload, _, signature = token.rpartition('.')
+        if payload.count('.') != 2 or not hmac.compare_digest(signature, self._signature(payload)):
+            return None
+        encoded_id, _, generation = payload.split('.')
+        try:
+            return _b64decode(encoded_id).decode(), int(generation, 16)
+        except ValueError:
+            return None
+
+
+revoked_accounts = BloomFilter()
+"""本进程中吊销的token与失效账户的token，这些token需要查询存储库验证"""
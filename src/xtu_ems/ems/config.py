@@ -40,10 +40,104 @@ class RequestConfiguration(BaseSettings):
     XTU_EMS_REQUEST_TIMEOUT: int = 10
     """请求超时时间"""
 
+    XTU_EMS_POOL_LIMIT: int = 100
+    """连接池最大连接数"""
+
+    XTU_EMS_POOL_LIMIT_PER_HOST: int = 50
+    """连接池对单个主机的最大连接数"""
+
+    XTU_EMS_POOL_KEEPALIVE_TIMEOUT: float = 30
+    """空闲连接保活时间（秒）"""
+
+    XTU_EMS_POOL_DNS_CACHE_TTL: int = 300
+    """DNS缓存时间（秒）"""
+
 
 RequestConfig = RequestConfiguration()
 
 
+class CaptchaConfiguration(BaseSettings):
+    """验证码识别配置"""
+
+    XTU_EMS_OCR_WORKERS: int = 2
+    """验证码识别线程数"""
+
+    XTU_EMS_OCR_BATCH_SIZE: int = 1
+    """单批次最多识别的验证码数量，小于等于1时不合批"""
+
+    XTU_EMS_OCR_BATCH_WINDOW: float = 0.01
+    """合批等待时间（秒），等待期间到达的验证码会被合并到同一批次中识别"""
+
+    XTU_EMS_OCR_PREWARM: bool = True
+    """是否在服务启动时预先加载验证码识别模型，关闭后模型会在第一次识别验证码时加载"""
+
+    XTU_EMS_CAPTCHA_LENGTH: int = 4
+    """验证码长度"""
+
+    XTU_EMS_CAPTCHA_CHARSET: str = "abcdefghijklmnopqrstuvwxyz0123456789"
+    """验证码字符集"""
+
+    XTU_EMS_CAPTCHA_MIN_CONFIDENCE: float = 0.5
+    """验证码识别结果的最低置信度，低于该值时不提交登陆，直接重新获取验证码"""
+
+    XTU_EMS_CAPTCHA_MAX_REFETCH: int = 3
+    """识别结果不符合要求时，重新获取验证码图片的最大次数"""
+
+
+CaptchaConfig = CaptchaConfiguration()
+
+
+class ParserConfiguration(BaseSettings):
+    """页面解析配置"""
+
+    XTU_EMS_HTML_PARSER: str = "lxml"
+    """HTML解析器，可选`lxml`、`html.parser`等BeautifulSoup支持的解析器，不可用时回退到`html.parser`"""
+
+    XTU_EMS_HTML_PARSE_WORKERS: int = 2
+    """解析HTML页面的线程数，为0时在事件循环中直接解析"""
+
+    XTU_EMS_PDF_PARSE_WORKERS: int = 1
+    """解析PDF成绩单的进程数，为0时在事件循环中直接解析"""
+
+    XTU_EMS_PDF_FAST_PATH: bool = True
+    """是否先根据线框与单词位置快速提取成绩单表格，提取结果无效时再使用pdfplumber的extract_table"""
+
+    XTU_EMS_TRANSCRIPT_CACHE_SIZE: int = 2048
+    """按内容摘要缓存的成绩单解析结果数量，为0时不缓存"""
+
+    XTU_EMS_TRANSCRIPT_MAX_SIZE: int = 16 * 1024 * 1024
+    """成绩单文件的最大字节数，超过时中止下载"""
+
+    XTU_EMS_TRANSCRIPT_SPOOL_SIZE: int = 1024 * 1024
+    """成绩单下载时在内存中缓冲的最大字节数，超过后转存到临时文件"""
+
+    XTU_EMS_TRANSCRIPT_REJECT_CONTENT_TYPES: list[str] = ["text/plain", "text/css", "text/javascript",
+                                                          "text/xml", "application/xml", "application/json",
+                                                          "application/javascript", "image/*", "audio/*",
+                                                          "video/*"]
+    """成绩单确定不是PDF的响应类型，会直接中止下载；`image/*`表示该大类下的所有类型。
+    其他类型（如`application/x-download`）交给PDF文件头检查，HTML可能是登陆页面，也需要读取内容后判断"""
+
+
+ParserConfig = ParserConfiguration()
+
+
+class LoginConfiguration(BaseSettings):
+    """登陆配置"""
+
+    XTU_EMS_LOGIN_TICKET_POOL_SIZE: int = 4
+    """预取的登陆凭据数量，为0时不预取"""
+
+    XTU_EMS_LOGIN_TICKET_TTL: int = 5 * 60
+    """预取的登陆凭据有效期（秒），需要小于教务系统未登录会话的过期时间"""
+
+    XTU_EMS_LOGIN_TICKET_RETRY_INTERVAL: float = 5
+    """预取失败后的重试间隔（秒）"""
+
+
+LoginConfig = LoginConfiguration()
+
+
 class XTUEMSConfiguration(BaseSettings):
     """湘潭大学教务系统配置"""
 
@@ -94,6 +188,16 @@ class XTUEMSConfiguration(BaseSettings):
 
     XTU_EMS_SESSION_VALIDATOR_TITLE: str = "湘潭大学综合教务管理系统-湘潭大学"
 
+    XTU_EMS_SESSION_VALIDATOR_PROBE: bool = True
+    """验证session时流式读取页面，读到标题后就停止，不解析整个页面"""
+
+    XTU_EMS_SESSION_VALIDATOR_PROBE_BYTES: int = 8 * 1024
+    """查找标题时最多读取的字节数，超过后读取整个页面解析"""
+
+    XTU_EMS_SESSION_VALIDATOR_DRAIN_BYTES: int = 4 * 1024
+    """读到标题后，剩余内容不超过该字节数时读完并丢弃，使连接可以放回连接池复用，否则直接关闭连接；
+    验证页面约20KB，默认值下会关闭连接，只传输标题之前的内容，重新建立连接的开销小于传输整个页面"""
+
     XTU_EMS_UPDATE_PASSWORD_URL: str = "/grsz/grsz_xgmm_beg.do"
 
     @staticmethod
@@ -0,0 +1,101 @@
+"""连接池模块，所有访问教务系统的请求共享同一个TCP连接池"""
+import asyncio
+import logging
+from typing import Optional
+
+from aiohttp import ClientSession, TCPConnector, CookieJar
+
+from xtu_ems.ems.config import RequestConfig
+
+logger = logging.getLogger('xtu-ems.connection')
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/111.0.0.0 Safari/537.36 Edg/111.0.1661.41'
+}
+"""公共请求头"""
+
+
+class ConnectionPool:
+    """
+    教务系统连接池
+
+    - 进程内共享一个`TCPConnector`，复用keep-alive连接并缓存DNS结果，避免每次请求都重新握手
+    - 每次借用都会创建一个独立的`ClientSession`和`CookieJar`，不同学生的会话不会互相泄漏
+    - 连接器与事件循环绑定，如果事件循环发生变化（例如测试中），会关闭旧的连接器并重新创建
+    """
+
+    def __init__(self,
+                 limit: int = None,
+                 limit_per_host: int = None,
+                 keepalive_timeout: float = None,
+                 ttl_dns_cache: int = None):
+        """
+        Args:
+            limit: 最大连接数
+            limit_per_host: 单个主机的最大连接数
+            keepalive_timeout: 空闲连接保活时间
+            ttl_dns_cache: DNS缓存时间
+        """
+        self.limit = limit or RequestConfig.XTU_EMS_POOL_LIMIT
+        self.limit_per_host = limit_per_host or RequestConfig.XTU_EMS_POOL_LIMIT_PER_HOST
+        self.keepalive_timeout = keepalive_timeout or RequestConfig.XTU_EMS_POOL_KEEPALIVE_TIMEOUT
+        self.ttl_dns_cache = ttl_dns_cache or RequestConfig.XTU_EMS_POOL_DNS_CACHE_TTL
+        self._connector: Optional[TCPConnector] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def connector(self) -> TCPConnector:
+        """获取当前事件循环下的连接器，不存在时创建"""
+        loop = asyncio.get_running_loop()
+        if self._connector is None or self._connector.closed or self._loop is not loop:
+            logger.debug('创建新的连接池')
+            if self._connector is not None:
+                self._discard(self._connector, self._loop)
+            self._connector = TCPConnector(limit=self.limit,
+                                           limit_per_host=self.limit_per_host,
+                                           keepalive_timeout=self.keepalive_timeout,
+                                           ttl_dns_cache=self.ttl_dns_cache,
+                                           use_dns_cache=True)
+            self._loop = loop
+        return self._connector
+
+    @staticmethod
+    def _discard(connector: TCPConnector, loop: Optional[asyncio.AbstractEventLoop]):
+        """关闭绑定在其他事件循环上的连接器，该事件循环仍在运行时在其中关闭，否则直接释放连接"""
+        if connector.closed:
+            return
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(connector.close()))
+        else:
+            connector._close()
+
+    def session(self, cookies: dict = None, **kwargs) -> ClientSession:
+        """
+        借用连接池创建一个会话，会话关闭时不会关闭连接池
+        Args:
+            cookies: 会话的初始cookie
+            **kwargs: 透传给`ClientSession`的参数
+
+        Returns:
+            使用共享连接池的会话
+        """
+        sess = ClientSession(connector=self.connector,
+                             connector_owner=False,
+                             cookie_jar=CookieJar(),
+                             cookies=cookies,
+                             **kwargs)
+        for k, v in DEFAULT_HEADERS.items():
+            sess.headers.setdefault(k, v)
+        return sess
+
+    async def close(self):
+        """关闭连接池"""
+        if self._connector is not None and not self._connector.closed:
+            await self._connector.close()
+        self._connector = None
+        self._loop = None
+
+
+connection_pool = ConnectionPool()
+"""全局共享的连接池"""
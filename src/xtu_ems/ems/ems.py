@@ -2,14 +2,16 @@
 import json
 import logging
 from abc import ABC, abstractmethod
+from typing import Optional
 
 import requests
-from aiohttp import ClientSession
 
 from xtu_ems.ems.account import AuthenticationAccount
-from xtu_ems.ems.config import XTUEMSConfig, RequestConfig
+from xtu_ems.ems.config import XTUEMSConfig, RequestConfig, CaptchaConfig
+from xtu_ems.ems.connection import connection_pool
 from xtu_ems.ems.session import Session
-from xtu_ems.util.captcha import ImageDetector
+from xtu_ems.ems.ticket import LoginTicket, LoginTicketPool
+from xtu_ems.util.captcha import ImageDetector, CaptchaResult, CaptchaStatistics
 
 logger = logging.getLogger('xtu-ems.login')
 
@@ -65,6 +67,14 @@ class UninitializedPasswordException(Exception):
         super().__init__(self.message)
 
 
+class SessionExpiredException(Exception):
+    """会话失效异常，教务系统返回了登陆页面"""
+
+    def __init__(self, message="会话已失效，需要重新登陆"):
+        self.message = message
+        super().__init__(self.message)
+
+
 class QZEducationalManageSystem(EducationalManageSystem):
     """
     强智教务系统
@@ -83,9 +93,17 @@ class QZEducationalManageSystem(EducationalManageSystem):
             "RANDOMCODE": random_code
         }
 
-    def __init__(self) -> None:
+    def __init__(self, ticket_pool: LoginTicketPool = None) -> None:
+        """
+        Args:
+            ticket_pool: 登陆凭据池，提供时异步登陆会优先使用预取的凭据
+        """
         super().__init__()
         self.captcha = ImageDetector()
+        self.captcha_stats = CaptchaStatistics()
+        self.ticket_pool = ticket_pool
+        if ticket_pool is not None:
+            ticket_pool.producer = self._async_prepare
 
     def pre_check(self, account: AuthenticationAccount):
         """
@@ -102,6 +120,25 @@ class QZEducationalManageSystem(EducationalManageSystem):
             or account.password is None):
             raise Exception("用户名或密码为空")
 
+    def choose_captcha(self, result: CaptchaResult) -> Optional[str]:
+        """
+        从识别结果中选出符合验证码格式的答案
+        Args:
+            result: 验证码识别结果
+
+        Returns:
+            符合长度与字符集要求且置信度足够的答案（统一为小写），没有则返回None
+        """
+        if result.confidence < CaptchaConfig.XTU_EMS_CAPTCHA_MIN_CONFIDENCE:
+            return None
+        for text in [result.text, *result.candidates]:
+            # 验证码只包含小写字母与数字，识别模型可能输出大写字母，先统一为小写再检查
+            text = text.strip().lower()
+            if (len(text) == CaptchaConfig.XTU_EMS_CAPTCHA_LENGTH
+                    and all(c in CaptchaConfig.XTU_EMS_CAPTCHA_CHARSET for c in text)):
+                return text
+        return None
+
     def login(self, account: AuthenticationAccount, retry_time=3) -> Session:
         """
         登陆教务系统
@@ -131,7 +168,7 @@ class QZEducationalManageSystem(EducationalManageSystem):
                 break
             except InvalidCaptchaException as e:
                 err = e
-                logger.debug(f'正在重试{i}/{retry_time}次登陆失败-验证码错误')
+                logger.debug(f'正在重试{i}/{retry_time}次登陆失败-验证码错误, {self.captcha_stats.snapshot()}')
                 continue
             except UninitializedPasswordException as e:
                 err = e
@@ -158,12 +195,15 @@ class QZEducationalManageSystem(EducationalManageSystem):
         """
         if resp.status != 302:
             content = await resp.text()
-            if "用户名或密码错误,请联系本院教务老师!" in content:
-                raise InvalidAccountException()
             if "验证码错误!!" in content:
+                self.captcha_stats.on_failed()
                 raise InvalidCaptchaException()
+            self.captcha_stats.on_accepted()
+            if "用户名或密码错误,请联系本院教务老师!" in content:
+                raise InvalidAccountException()
             raise Exception("登陆失败")
         else:
+            self.captcha_stats.on_accepted()
             location = resp.headers.get("location")
             if location.endswith(XTUEMSConfig.XTU_EMS_UPDATE_PASSWORD_URL):
                 raise UninitializedPasswordException()
@@ -184,12 +224,15 @@ class QZEducationalManageSystem(EducationalManageSystem):
         """
         if resp.status_code != 302:
             content = resp.text
-            if "用户名或密码错误,请联系本院教务老师!" in content:
-                raise InvalidAccountException()
             if "验证码错误!!" in content:
+                self.captcha_stats.on_failed()
                 raise InvalidCaptchaException()
+            self.captcha_stats.on_accepted()
+            if "用户名或密码错误,请联系本院教务老师!" in content:
+                raise InvalidAccountException()
             raise Exception("登陆失败")
         else:
+            self.captcha_stats.on_accepted()
             location = resp.headers.get("location")
             if location.endswith(XTUEMSConfig.XTU_EMS_UPDATE_PASSWORD_URL):
                 raise UninitializedPasswordException()
@@ -224,7 +267,7 @@ class QZEducationalManageSystem(EducationalManageSystem):
                 break
             except InvalidCaptchaException as e:
                 err = e
-                logger.debug(f'正在重试{i}/{retry_time}次登陆失败-验证码错误')
+                logger.debug(f'正在重试{i}/{retry_time}次登陆失败-验证码错误, {self.captcha_stats.snapshot()}')
                 continue
             except UninitializedPasswordException as e:
                 err = e
@@ -236,11 +279,39 @@ class QZEducationalManageSystem(EducationalManageSystem):
                 continue
         raise err
 
-    async def _async_login(self, account: AuthenticationAccount) -> Session:
+    async def _async_prepare(self) -> LoginTicket:
+        """
+        获取登陆凭据：获取验证码并识别，然后获取登陆签名
+        Returns:
+            登陆凭据
+        """
+        async with connection_pool.session() as ems_session:
+            session_id, captcha = None, None
+            # 识别结果明显错误时只重新获取验证码图片，不浪费一次登陆请求
+            for _ in range(CaptchaConfig.XTU_EMS_CAPTCHA_MAX_REFETCH + 1):
+                resp = await ems_session.get(url=XTUEMSConfig.XTU_EMS_CAPTCHA_URL,
+                                             timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
+                cookie = resp.cookies.get(QZEducationalManageSystem.SESSION_NAME)
+                session_id = cookie.value if cookie else session_id
+                captcha = self.choose_captcha(await self.captcha.async_recognize(await resp.read()))
+                if captcha:
+                    break
+                self.captcha_stats.on_rejected()
+            else:
+                raise InvalidCaptchaException("验证码识别失败")
+            resp = await ems_session.post(url=XTUEMSConfig.XTU_EMS_SIG_URL,
+                                          timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
+            text = await resp.text()
+            signature = json.loads(text).get("data")
+            cookies = {cookie.key: cookie.value for cookie in ems_session.cookie_jar}
+            return LoginTicket(session_id=session_id, cookies=cookies, captcha=captcha, signature=signature)
+
+    async def _async_login(self, account: AuthenticationAccount, ticket: LoginTicket = None) -> Session:
         """
         异步登陆教务系统
         Args:
             account: 账户信息
+            ticket: 登陆凭据，为空时优先从凭据池中获取，凭据池为空时现场获取
         Returns:
             登陆后的session
         Raises:
@@ -248,21 +319,18 @@ class QZEducationalManageSystem(EducationalManageSystem):
             InvalidCaptchaException: 多次验证码错误
             UninitializedPasswordException: 未初始化密码
         """
-        async with ClientSession() as ems_session:
-            resp = await ems_session.get(url=XTUEMSConfig.XTU_EMS_CAPTCHA_URL,
-                                         timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            session_id = resp.cookies.get(QZEducationalManageSystem.SESSION_NAME).value
-            session = Session(session_id=session_id)
-            captcha = self.captcha.verify(await resp.read())
-            resp = await ems_session.post(url=XTUEMSConfig.XTU_EMS_SIG_URL,
-                                          timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            text = await resp.text()
-            signature = json.loads(text).get("data")
-            encoded = self._signature(account.username, account.password, signature)
-            data = self._data(username=account.username,
-                              password=account.password,
-                              encode=encoded,
-                              random_code=captcha)
+        if ticket is None and self.ticket_pool is not None:
+            ticket = self.ticket_pool.get()
+        if ticket is None:
+            ticket = await self._async_prepare()
+        session = Session(session_id=ticket.session_id)
+        encoded = self._signature(account.username, account.password, ticket.signature)
+        data = self._data(username=account.username,
+                          password=account.password,
+                          encode=encoded,
+                          random_code=ticket.captcha)
+        cookies = ticket.cookies or {QZEducationalManageSystem.SESSION_NAME: ticket.session_id}
+        async with connection_pool.session(cookies=cookies) as ems_session:
             async with ems_session.post(url=XTUEMSConfig.XTU_EMS_LOGIN_URL,
                                         data=data,
                                         headers=QZEducationalManageSystem._HEADER,
@@ -285,11 +353,18 @@ class QZEducationalManageSystem(EducationalManageSystem):
             UninitializedPasswordException: 未初始化密码
         """
         with requests.session() as ems_session:
-            resp = ems_session.get(url=XTUEMSConfig.XTU_EMS_CAPTCHA_URL,
-                                   timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            session_id = resp.cookies.get(QZEducationalManageSystem.SESSION_NAME)
+            session_id, captcha = None, None
+            for _ in range(CaptchaConfig.XTU_EMS_CAPTCHA_MAX_REFETCH + 1):
+                resp = ems_session.get(url=XTUEMSConfig.XTU_EMS_CAPTCHA_URL,
+                                       timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
+                session_id = resp.cookies.get(QZEducationalManageSystem.SESSION_NAME) or session_id
+                captcha = self.choose_captcha(self.captcha.recognize(resp.content))
+                if captcha:
+                    break
+                self.captcha_stats.on_rejected()
+            else:
+                raise InvalidCaptchaException("验证码识别失败")
             session = Session(session_id=session_id)
-            captcha = self.captcha.verify(resp.content)
             resp = ems_session.post(url=XTUEMSConfig.XTU_EMS_SIG_URL,
                                     timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
             signature = json.loads(resp.content).get("data")
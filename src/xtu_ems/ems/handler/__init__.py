@@ -1,14 +1,18 @@
+import html
 import logging
+import re
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar
+from functools import cache
+from typing import Generic, TypeVar, Optional
 
 import requests
-from aiohttp import ClientSession
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, FeatureNotFound
 
-from xtu_ems.ems.config import RequestConfig
-from xtu_ems.ems.ems import QZEducationalManageSystem
+from xtu_ems.ems.config import RequestConfig, ParserConfig, XTUEMSConfig
+from xtu_ems.ems.connection import connection_pool, DEFAULT_HEADERS
+from xtu_ems.ems.ems import QZEducationalManageSystem, SessionExpiredException
 from xtu_ems.ems.session import Session
+from xtu_ems.util.executor import html_executor
 
 _R = TypeVar("_R")
 """返回值类型"""
@@ -30,35 +34,100 @@ class Handler(ABC, Generic[_R]):
     def get_session(self, session: Session):
         sess = requests.session()
         sess.cookies.set(QZEducationalManageSystem.SESSION_NAME, session.session_id)
-        sess.headers.setdefault('User-Agent',
-                                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                                'Chrome/111.0.0.0 Safari/537.36 Edg/111.0.1661.41')
+        for k, v in DEFAULT_HEADERS.items():
+            sess.headers.setdefault(k, v)
         return sess
 
     def get_async_session(self, session: Session):
-        sess = ClientSession(cookies={QZEducationalManageSystem.SESSION_NAME: session.session_id})
-        sess.headers.setdefault('User-Agent',
-                                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                                'Chrome/111.0.0.0 Safari/537.36 Edg/111.0.1661.41')
-        return sess
+        """从共享连接池中借用一个只携带当前学生session的异步会话"""
+        return connection_pool.session(cookies={QZEducationalManageSystem.SESSION_NAME: session.session_id})
+
+
+_TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title', re.S | re.I)
+
+
+def is_login_page(text: str) -> bool:
+    """
+    判断页面是否为登陆页面
+
+    教务系统对于失效的会话不会重定向，而是直接返回登陆页面，只需要查找页面开头的标题即可判断
+    """
+    match = _TITLE_PATTERN.search(text, 0, XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_PROBE_BYTES)
+    return match is not None and html.unescape(match.group(1)).strip() == XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_TITLE
+
+
+FALLBACK_PARSER = 'html.parser'
+"""后备解析器，Python内置，总是可用"""
+
+
+@cache
+def available_parser(parser: str) -> str:
+    """
+    检查解析器是否可用
+    Args:
+        parser: 期望使用的解析器
+
+    Returns:
+        可用的解析器，不可用时返回后备解析器
+    """
+    try:
+        BeautifulSoup('', parser)
+        return parser
+    except FeatureNotFound:
+        logger.warning(f'解析器 {parser} 不可用，使用 {FALLBACK_PARSER} 解析')
+        return FALLBACK_PARSER
 
 
 class EMSGetter(Handler[_R]):
+    parser: str = None
+    """HTML解析器，为空时使用配置中的解析器"""
+
     def handler(self, session: Session, *args, **kwargs) -> _R:
         """获取学生信息"""
         with self.get_session(session) as ems_session:
             logger.debug(f'[{self.__class__.__name__}] 正在获取数据-{self.url()}')
             resp = ems_session.get(self.url(), timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            return self._extra_info(soup)
+            return self.extract(self._check_alive(session, resp.text))
 
     async def async_handler(self, session: Session, *args, **kwargs) -> _R:
         """异步获取学生信息"""
-        async with ClientSession(cookies={QZEducationalManageSystem.SESSION_NAME: session.session_id}) as ems_session:
+        async with self.get_async_session(session) as ems_session:
             logger.debug(f'[{self.__class__.__name__}] 正在异步获取数据-{self.url()}')
             resp = await ems_session.get(self.url(), timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            soup = BeautifulSoup(await resp.text(), 'html.parser')
-            return self._extra_info(soup)
+            return await html_executor.run(self.extract, self._check_alive(session, await resp.text()))
+
+    @staticmethod
+    def _check_alive(session: Session, text: str) -> str:
+        """
+        检查会话是否有效：返回的不是登陆页面时，记录到会话中
+
+        Raises:
+            SessionExpiredException: 返回了登陆页面，会话已失效
+        """
+        if is_login_page(text):
+            raise SessionExpiredException()
+        session.mark_alive()
+        return text
+
+    def parse(self, text: str) -> BeautifulSoup:
+        """
+        将页面解析成文档树
+        Args:
+            text: 页面内容
+
+        Returns:
+            文档树，只包含`_parse_only`限定的部分
+        """
+        parser = available_parser(self.parser or ParserConfig.XTU_EMS_HTML_PARSER)
+        return BeautifulSoup(text, parser, parse_only=self._parse_only())
+
+    def extract(self, text: str) -> _R:
+        """解析页面并提取信息，异步处理时会在解析线程池中执行"""
+        return self._extra_info(self.parse(text))
+
+    def _parse_only(self) -> Optional[SoupStrainer]:
+        """只解析页面中需要的部分，减少构建文档树的开销，默认解析整个页面"""
+        return None
 
     @abstractmethod
     def url(self):
@@ -75,8 +144,7 @@ class EMSPoster(EMSGetter[_R]):
         with self.get_session(session) as ems_session:
             logger.debug(f'[{self.__class__.__name__}] 正在获取数据-{self.url()}')
             resp = ems_session.post(url=self.url(), data=self._data(), timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            return self._extra_info(soup)
+            return self.extract(self._check_alive(session, resp.text))
 
     async def async_handler(self, session: Session, *args, **kwargs) -> _R:
         """异步获取学生信息"""
@@ -84,8 +152,7 @@ class EMSPoster(EMSGetter[_R]):
             logger.debug(f'[{self.__class__.__name__}] 正在异步获取数据-{self.url()}')
             resp = await ems_session.post(url=self.url(), data=self._data(),
                                           timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            soup = BeautifulSoup(await resp.text(), 'html.parser')
-            return self._extra_info(soup)
+            return await html_executor.run(self.extract, self._check_alive(session, await resp.text()))
 
     @abstractmethod
     def _data(self):
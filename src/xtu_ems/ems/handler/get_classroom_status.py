@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 from xtu_ems.ems.config import XTUEMSConfig
 from xtu_ems.ems.handler import EMSPoster
@@ -13,6 +13,9 @@ class TodayClassroomStatusGetter(EMSPoster[CategoryClassroomBoard]):
     def _data(self):
         return {'xzlx': "0"}
 
+    def _parse_only(self):
+        return SoupStrainer(id="dataList")
+
     def _extra_info(self, soup: BeautifulSoup):
         classroom = soup.find(id="dataList").find_all('tr')[2:]
         classroom = [self._extra_classroom_info(row) for row in classroom]
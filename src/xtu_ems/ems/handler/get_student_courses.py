@@ -1,4 +1,4 @@
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, Tag, SoupStrainer
 
 from xtu_ems.ems.config import XTUEMSConfig
 from xtu_ems.ems.handler import EMSPoster
@@ -13,6 +13,9 @@ class StudentCourseGetter(EMSPoster[CourseList]):
     def url(self):
         return XTUEMSConfig.XTU_EMS_STUDENT_COURSE_URL
 
+    def _parse_only(self):
+        return SoupStrainer(id="kbtable")
+
     def _extra_info(self, soup: BeautifulSoup):
         class_table = soup.find(id="kbtable")
         return self._extra_student_courses(class_table).to_list()
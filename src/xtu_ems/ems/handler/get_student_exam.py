@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 from xtu_ems.ems.config import XTUEMSConfig
 from xtu_ems.ems.handler import EMSPoster
@@ -15,6 +15,9 @@ class StudentExamGetter(EMSPoster[ExamInfoList]):
             "xnxqid": XTUEMSConfig.get_current_term()
         }
 
+    def _parse_only(self):
+        return SoupStrainer(id="dataList")
+
     def _extra_info(self, soup: BeautifulSoup):
         exam_list = soup.find(id="dataList").find_all('tr')[1:]
         exam_list = [self._extra_exam_info(row) for row in exam_list]
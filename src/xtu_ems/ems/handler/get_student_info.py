@@ -1,4 +1,4 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 from xtu_ems.ems.config import XTUEMSConfig
 from xtu_ems.ems.handler import EMSGetter
@@ -44,6 +44,9 @@ class StudentInfoGetter(EMSGetter[StudentBasicInfo]):
     def url(self):
         return XTUEMSConfig.XTU_EMS_STUDENT_INFO_URL
 
+    def _parse_only(self):
+        return SoupStrainer(id='xjkpTable')
+
     def _extra_info(self, soup: BeautifulSoup):
         """从表格中提取学生的基本信息"""
         return _extra_student_info(soup)
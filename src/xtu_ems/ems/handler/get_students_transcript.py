@@ -1,13 +1,19 @@
+from collections import OrderedDict
 from functools import cache
 from io import BytesIO
+from typing import Optional, Union
 
 from bs4 import BeautifulSoup
 from pdfplumber import PDF
 
-from xtu_ems.ems.config import XTUEMSConfig, RequestConfig
-from xtu_ems.ems.handler import Handler, _R, EMSPoster, logger
+from xtu_ems.ems.config import XTUEMSConfig, RequestConfig, ParserConfig
+from xtu_ems.ems.ems import SessionExpiredException
+from xtu_ems.ems.handler import Handler, _R, EMSPoster, logger, is_login_page
 from xtu_ems.ems.model import ScoreBoard, Score, RankInfo
 from xtu_ems.ems.session import Session
+from xtu_ems.util.executor import pdf_executor
+from xtu_ems.util.pdf_table import extract_table_by_edges
+from xtu_ems.util.spool import SpooledBuffer, ContentTooLargeException
 
 _data = {
     "xs0101id": "",
@@ -17,6 +23,23 @@ _data = {
     "bblx": "all"
 }
 
+CHUNK_SIZE = 64 * 1024
+"""下载成绩单时每次读取的字节数"""
+
+PDF_MAGIC = b'%PDF-'
+"""PDF文件头"""
+
+TRANSCRIPT_HEADER = ['课程名称', '类型', '学分', '成绩', '学期'] * 2
+"""成绩表格的表头，每行左右两栏各一门课程"""
+
+
+class InvalidTranscriptException(Exception):
+    """成绩单不是PDF文件异常，通常是会话失效后被重定向到了登陆页面"""
+
+    def __init__(self, message="成绩单不是PDF文件"):
+        self.message = message
+        super().__init__(self.message)
+
 
 def pre_proc(res: str):
     if not isinstance(res, str):
@@ -35,30 +58,170 @@ def extract_field(text, start_key, end_key=None):
 class StudentTranscriptGetter(Handler[ScoreBoard]):
     """通过教务系统获取成绩单，并且解析成结构化数据"""
 
+    def __init__(self, cache_size: int = None):
+        """
+        Args:
+            cache_size: 按内容摘要缓存的解析结果数量，成绩单内容没有变化时直接复用之前的解析结果
+        """
+        super().__init__()
+        self.cache_size = cache_size if cache_size is not None else ParserConfig.XTU_EMS_TRANSCRIPT_CACHE_SIZE
+        self._parsed: OrderedDict[str, ScoreBoard] = OrderedDict()
+
+    def __getstate__(self):
+        # 在进程池中解析时不需要携带缓存
+        state = self.__dict__.copy()
+        state['_parsed'] = OrderedDict()
+        return state
+
     async def async_handler(self, session: Session, *args, **kwargs) -> _R:
 
         async with self.get_async_session(session) as ems_session:
             logger.debug(f'[{self.__class__.__name__}] 正在异步获取数据-{self.url()}')
-            resp = await ems_session.post(url=self.url(), data=_data, timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            if resp.status == 200:
-                pdf = PDF(BytesIO(await resp.content.read()))
-                return self._extra_info(pdf)
+            async with ems_session.post(url=self.url(), data=_data,
+                                        timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT) as resp:
+                if resp.status != 200:
+                    return None
+                self._check_headers(resp.headers.get('Content-Type'), resp.headers.get('Content-Length'))
+                with self._buffer() as buffer:
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        self._write(buffer, chunk)
+                    self._check_content(buffer)
+                    session.mark_alive()
+                    scoreboard = self._get_parsed(buffer.digest)
+                    if scoreboard is None:
+                        scoreboard = await pdf_executor.run(self.extract, buffer.source())
+                        self._set_parsed(buffer.digest, scoreboard)
+                    return scoreboard
 
     def handler(self, session: Session, *args, **kwargs):
         with self.get_session(session) as ems_session:
             logger.debug(f'[{self.__class__.__name__}] 正在获取数据-{self.url()}')
-            resp = ems_session.post(url=self.url(), data=_data, timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT)
-            if resp.status_code == 200:
-                pdf = PDF(BytesIO(resp.content))
-                return self._extra_info(pdf)
+            with ems_session.post(url=self.url(), data=_data, stream=True,
+                                  timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT) as resp:
+                if resp.status_code != 200:
+                    return None
+                self._check_headers(resp.headers.get('Content-Type'), resp.headers.get('Content-Length'))
+                with self._buffer() as buffer:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        self._write(buffer, chunk)
+                    self._check_content(buffer)
+                    session.mark_alive()
+                    scoreboard = self._get_parsed(buffer.digest)
+                    if scoreboard is None:
+                        scoreboard = self.extract(buffer.source())
+                        self._set_parsed(buffer.digest, scoreboard)
+                    return scoreboard
+
+    @staticmethod
+    def _buffer() -> SpooledBuffer:
+        """创建下载缓冲区，较小的成绩单保存在内存中，较大的转存到临时文件"""
+        return SpooledBuffer(max_memory=ParserConfig.XTU_EMS_TRANSCRIPT_SPOOL_SIZE,
+                             max_size=ParserConfig.XTU_EMS_TRANSCRIPT_MAX_SIZE)
+
+    def _check_headers(self, content_type: Optional[str], content_length: Optional[str]):
+        """
+        在读取响应体之前检查响应头，响应类型确定不是PDF或者声明的大小超过限制时直接中止下载
+        Args:
+            content_type: 响应类型
+            content_length: 响应声明的大小
+        """
+        if content_type:
+            mime = content_type.split(';')[0].strip().lower()
+            rejected = ParserConfig.XTU_EMS_TRANSCRIPT_REJECT_CONTENT_TYPES
+            # 教务系统返回PDF时的响应类型并不统一，只拒绝确定不是PDF的类型，其余交给文件头检查
+            if mime in rejected or f"{mime.split('/')[0]}/*" in rejected:
+                raise InvalidTranscriptException(f"成绩单的响应类型不是PDF: {mime}")
+        max_size = ParserConfig.XTU_EMS_TRANSCRIPT_MAX_SIZE
+        if content_length and content_length.isdigit() and int(content_length) > max_size:
+            raise ContentTooLargeException(f"成绩单大小 {content_length} 字节超过限制")
+
+    def _write(self, buffer: SpooledBuffer, chunk: bytes):
+        """
+        写入一段响应体，第一段内容就不是PDF文件头时立即中止下载
+
+        Raises:
+            SessionExpiredException: 返回了登陆页面，会话已失效
+            InvalidTranscriptException: 返回的不是PDF文件
+        """
+        buffer.write(chunk)
+        if len(buffer.head) >= len(PDF_MAGIC) and not buffer.head.startswith(PDF_MAGIC):
+            if is_login_page(chunk.decode('utf-8', errors='replace')):
+                raise SessionExpiredException()
+            raise InvalidTranscriptException()
+
+    @staticmethod
+    def _check_content(buffer: SpooledBuffer):
+        """下载完成后检查内容是否为PDF文件"""
+        if not buffer.head.startswith(PDF_MAGIC):
+            raise InvalidTranscriptException()
+
+    def _get_parsed(self, digest: str) -> Optional[ScoreBoard]:
+        """获取内容相同的成绩单之前的解析结果，返回副本避免调用方修改缓存"""
+        scoreboard = self._parsed.get(digest)
+        if scoreboard is None:
+            return None
+        self._parsed.move_to_end(digest)
+        logger.debug(f'[{self.__class__.__name__}] 成绩单内容没有变化，复用解析结果')
+        return scoreboard.model_copy(deep=True)
+
+    def _set_parsed(self, digest: str, scoreboard: Optional[ScoreBoard]):
+        """缓存解析结果，超出容量时淘汰最久未使用的结果"""
+        if scoreboard is None or self.cache_size <= 0:
+            return
+        self._parsed[digest] = scoreboard.model_copy(deep=True)
+        self._parsed.move_to_end(digest)
+        while len(self._parsed) > self.cache_size:
+            self._parsed.popitem(last=False)
 
     def url(self):
         return XTUEMSConfig.XTU_EMS_STUDENT_TRANSCRIPT_URL
 
+    def extract(self, content: Union[bytes, str]) -> ScoreBoard:
+        """
+        解析成绩单PDF，异步处理时会在解析进程池中执行，因此只接收可序列化的参数
+        Args:
+            content: PDF的字节内容，或者转存后的临时文件路径
+        """
+        if isinstance(content, str):
+            with PDF.open(content) as pdf:
+                return self._extra_info(pdf)
+        with PDF(BytesIO(content)) as pdf:
+            return self._extra_info(pdf)
+
     def _extra_info(self, pdf):
         page = pdf.pages[0]
         text: str = page.extract_text_lines()[1]['text']
+        if ParserConfig.XTU_EMS_PDF_FAST_PATH:
+            try:
+                table = extract_table_by_edges(page)
+                # 列错位时也能解析出成绩，但每一列都对应错了，只信任与成绩单版式一致的表格
+                if self._is_transcript_table(table):
+                    scoreboard = self._build_scoreboard(text, table)
+                    if scoreboard.scores:
+                        return scoreboard
+                logger.debug(f'[{self.__class__.__name__}] 快速提取的表格与成绩单版式不一致，使用extract_table重新提取')
+            except Exception:
+                logger.debug(f'[{self.__class__.__name__}] 快速提取成绩单失败，使用extract_table重新提取', exc_info=True)
+        return self._build_scoreboard(text, page.extract_table())
+
+    @staticmethod
+    def _is_transcript_table(table: Optional[list[list]]) -> bool:
+        """表格的表头与列数是否与成绩单版式一致"""
+        if not table:
+            return False
+        header = [cell.strip() if isinstance(cell, str) else cell for cell in table[0]]
+        return header == TRANSCRIPT_HEADER and all(len(row) == len(TRANSCRIPT_HEADER) for row in table)
+
+    def _build_scoreboard(self, text: str, table: list[list]) -> ScoreBoard:
+        """
+        从成绩单的表头文字与表格中构建成绩信息
+        Args:
+            text: 包含院系、专业、姓名、学号的表头文字
+            table: 成绩表格
 
+        Returns:
+            成绩信息
+        """
         scoreboard = ScoreBoard()
 
         scoreboard.college = extract_field(text, '院系：', '专业：')
@@ -69,8 +232,6 @@ class StudentTranscriptGetter(Handler[ScoreBoard]):
 
         scoreboard.student_id = extract_field(text, '学号：')
 
-        table = page.extract_table()
-
         for row in table:
 
             if not isinstance(row[0], str) or row[0] == "课程名称":
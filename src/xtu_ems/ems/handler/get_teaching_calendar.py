@@ -1,6 +1,6 @@
 from datetime import date
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 from xtu_ems.ems.config import XTUEMSConfig
 from xtu_ems.ems.handler import EMSPoster
@@ -14,6 +14,9 @@ class TeachingCalendarGetter(EMSPoster[TeachingCalendar]):
     def url(self):
         return XTUEMSConfig.XTU_EMS_TEACHING_WEEKS_URL
 
+    def _parse_only(self):
+        return SoupStrainer(id=['xnxq01id', 'kbtable'])
+
     def _extra_info(self, soup: BeautifulSoup):
         term_id = soup.find(id='xnxq01id').find('option')
         start_year = int(term_id.text.split('-')[0])
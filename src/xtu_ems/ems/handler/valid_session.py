@@ -1,16 +1,155 @@
 """鉴定session是否仍然有效"""
-from bs4 import BeautifulSoup
+import html
+import re
+from typing import Optional
 
-from xtu_ems.ems.config import XTUEMSConfig
-from xtu_ems.ems.handler import EMSGetter
+from bs4 import BeautifulSoup, SoupStrainer
+
+from xtu_ems.ems.config import XTUEMSConfig, RequestConfig
+from xtu_ems.ems.handler import EMSGetter, logger, is_login_page
+from xtu_ems.ems.session import Session
+from xtu_ems.util.executor import html_executor
+
+TITLE_PATTERN = re.compile(rb'<title[^>]*>(.*?)</title', re.S | re.I)
+"""页面标题"""
+
+PROBE_CHUNK_SIZE = 1024
+"""查找标题时每次读取的字节数"""
+
+
+def get_charset(content_type: Optional[str], default: str = 'utf-8') -> str:
+    """从响应类型中获取字符集"""
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"')
+    return default
+
+
+class TitleProbe:
+    """逐段读取页面内容，读到完整的标题就停止"""
+
+    def __init__(self, limit: int, encoding: str = 'utf-8'):
+        """
+        Args:
+            limit: 最多读取的字节数
+            encoding: 页面编码
+        """
+        self.limit = limit
+        self.encoding = encoding
+        self.buffer = bytearray()
+        self.title: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        """已读取的字节数"""
+        return len(self.buffer)
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        读取一段内容
+        Returns:
+            是否可以停止读取：已经找到标题，或者读取的内容超过了限制
+        """
+        # 标题可能跨越两段内容，从上一段末尾附近开始查找
+        start = max(len(self.buffer) - 256, 0)
+        self.buffer += chunk
+        match = TITLE_PATTERN.search(self.buffer, start)
+        if match is not None:
+            self.title = html.unescape(match.group(1).decode(self.encoding, errors='replace')).strip()
+            return True
+        return len(self.buffer) >= self.limit
+
+    def text(self) -> str:
+        """已读取的页面内容"""
+        return self.buffer.decode(self.encoding, errors='replace')
 
 
 class SessionValidator(EMSGetter[bool]):
     """会话有效性验证器，你也可以用这个刷新Session在校务系统的有效期"""
 
+    def __init__(self, probe: bool = None):
+        """
+        Args:
+            probe: 是否只读取页面标题，默认使用配置
+        """
+        super().__init__()
+        self.probe = probe if probe is not None else XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_PROBE
+
+    def handler(self, session: Session, *args, **kwargs) -> bool:
+        if not self.probe:
+            return super().handler(session, *args, **kwargs)
+        with self.get_session(session) as ems_session:
+            logger.debug(f'[{self.__class__.__name__}] 正在获取数据-{self.url()}')
+            with ems_session.get(self.url(), stream=True, timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT) as resp:
+                probe = self._probe(resp.headers.get('Content-Type'))
+                chunks = resp.iter_content(PROBE_CHUNK_SIZE)
+                for chunk in chunks:
+                    if probe.feed(chunk):
+                        break
+                if probe.title is None:
+                    for chunk in chunks:
+                        probe.buffer += chunk
+                    return self.extract(probe.text())
+                if self._can_drain(resp.headers.get('Content-Length'), probe):
+                    for _ in chunks:
+                        pass
+                return self._is_alive(session, probe.title)
+
+    async def async_handler(self, session: Session, *args, **kwargs) -> bool:
+        if not self.probe:
+            return await super().async_handler(session, *args, **kwargs)
+        async with self.get_async_session(session) as ems_session:
+            logger.debug(f'[{self.__class__.__name__}] 正在异步获取数据-{self.url()}')
+            async with ems_session.get(self.url(), timeout=RequestConfig.XTU_EMS_REQUEST_TIMEOUT) as resp:
+                probe = self._probe(resp.headers.get('Content-Type'))
+                async for chunk in resp.content.iter_chunked(PROBE_CHUNK_SIZE):
+                    if probe.feed(chunk):
+                        break
+                if probe.title is None:
+                    probe.buffer += await resp.content.read()
+                    return await html_executor.run(self.extract, probe.text())
+                if self._can_drain(resp.headers.get('Content-Length'), probe):
+                    # 读完剩余内容，连接可以放回连接池；否则退出时直接关闭连接
+                    await resp.content.read()
+                return self._is_alive(session, probe.title)
+
+    @staticmethod
+    def _check_alive(session: Session, text: str) -> str:
+        """验证器本身通过登陆页面判断会话失效，返回登陆页面时不抛出异常"""
+        if not is_login_page(text):
+            session.mark_alive()
+        return text
+
+    @staticmethod
+    def _probe(content_type: Optional[str]) -> TitleProbe:
+        return TitleProbe(limit=XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_PROBE_BYTES,
+                          encoding=get_charset(content_type))
+
+    @staticmethod
+    def _can_drain(content_length: Optional[str], probe: TitleProbe) -> bool:
+        """剩余内容是否足够少，读完比重新建立连接更划算；未知长度时不读取"""
+        if not content_length or not content_length.isdigit():
+            return False
+        return int(content_length) - probe.size <= XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_DRAIN_BYTES
+
+    @staticmethod
+    def _is_valid(title: str) -> bool:
+        return title != XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_TITLE
+
+    def _is_alive(self, session: Session, title: str) -> bool:
+        """根据标题判断会话是否有效，有效时记录到会话中"""
+        valid = self._is_valid(title)
+        if valid:
+            session.mark_alive()
+        return valid
+
     def _extra_info(self, soup: BeautifulSoup):
         """校务系统并不会对于无效的会话并不会重定向，二试直接返回一个登陆页面，我们可以通过返回的页面标题来判断会话是否有效"""
-        return soup.find('title').text.strip() != XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_TITLE
+        return self._is_valid(soup.find('title').text.strip())
+
+    def _parse_only(self):
+        return SoupStrainer('title')
 
     def url(self):
         return XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_URL
@@ -1,7 +1,16 @@
 """链接会话模块，用于存储会话信息"""
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel
 
 
 class Session(BaseModel):
     """会话类，用于存储会话信息"""
     session_id: str
+    alive_time: Optional[datetime] = None
+    """最后一次收到已登陆响应的时间，由处理器在请求成功后设置，可以据此省去额外的会话保活请求"""
+
+    def mark_alive(self):
+        """标记会话在当前时间仍然有效"""
+        self.alive_time = datetime.now()
@@ -0,0 +1,141 @@
+"""登陆凭据预取模块，提前完成验证码识别与签名获取，登陆时只需要提交登陆请求"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Awaitable, Optional
+
+from pydantic import BaseModel, Field
+
+from xtu_ems.ems.config import LoginConfig
+
+logger = logging.getLogger('xtu-ems.ticket')
+
+
+class LoginTicket(BaseModel):
+    """登陆凭据，包含一个未登录的会话、该会话的验证码识别结果以及登陆签名"""
+    session_id: str
+    """会话ID"""
+    cookies: dict[str, str] = Field(default_factory=dict)
+    """会话的全部cookie"""
+    captcha: str
+    """验证码识别结果"""
+    signature: str
+    """登陆签名"""
+    create_time: datetime = Field(default_factory=datetime.now)
+    """创建时间"""
+
+    def is_expired(self, ttl: timedelta) -> bool:
+        """判断凭据是否过期"""
+        return datetime.now() - self.create_time >= ttl
+
+
+class LoginTicketPool:
+    """
+    登陆凭据池
+
+    在后台维持一定数量的预取凭据，凭据被取走或者过期后会自动补充。
+    每个凭据只能使用一次，无论登陆是否成功都不会放回池中。
+    """
+
+    def __init__(self, size: int = None, ttl: int = None, retry_interval: float = None):
+        """
+        Args:
+            size: 凭据池大小，为0时不预取
+            ttl: 凭据有效期（秒）
+            retry_interval: 预取失败后的重试间隔（秒）
+        """
+        self.size = size if size is not None else LoginConfig.XTU_EMS_LOGIN_TICKET_POOL_SIZE
+        self.ttl = timedelta(seconds=ttl or LoginConfig.XTU_EMS_LOGIN_TICKET_TTL)
+        self.retry_interval = retry_interval or LoginConfig.XTU_EMS_LOGIN_TICKET_RETRY_INTERVAL
+        self.producer: Optional[Callable[[], Awaitable[LoginTicket]]] = None
+        """凭据生产者，由教务系统绑定"""
+        self._tickets: deque[LoginTicket] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def _evict(self):
+        """淘汰过期的凭据，最早创建的凭据在队首"""
+        while self._tickets and self._tickets[0].is_expired(self.ttl):
+            self._tickets.popleft()
+
+    def get(self) -> Optional[LoginTicket]:
+        """
+        取出一个未过期的凭据，并通知后台补充
+        Returns:
+            凭据，池为空时返回None
+        """
+        self._evict()
+        # 优先使用最新的凭据，离过期最远
+        ticket = self._tickets.pop() if self._tickets else None
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return ticket
+
+    async def fill(self) -> int:
+        """
+        将凭据池补充满
+        Returns:
+            本次补充的凭据数量
+        """
+        self._evict()
+        missing = self.size - len(self._tickets)
+        if missing <= 0 or self.producer is None:
+            return 0
+        results = await asyncio.gather(*[self.producer() for _ in range(missing)], return_exceptions=True)
+        count = 0
+        for result in results:
+            if isinstance(result, LoginTicket):
+                self._tickets.append(result)
+                count += 1
+            else:
+                logger.warning(f'预取登陆凭据失败: {result!r}')
+        logger.debug(f'预取了 {count}/{missing} 个登陆凭据')
+        return count
+
+    def _next_wait(self) -> float:
+        """计算下一次补充前需要等待的时间"""
+        if len(self._tickets) < self.size:
+            # 没有补充满（预取部分失败），稍后重试
+            return self.retry_interval
+        if not self._tickets:
+            return self.ttl.total_seconds()
+        expire_at = self._tickets[0].create_time + self.ttl
+        return max((expire_at - datetime.now()).total_seconds(), 0)
+
+    async def run(self):
+        """后台补充凭据，直到被取消"""
+        while True:
+            # 先清除通知，补充期间被取走凭据时不会丢失通知
+            self._wakeup.clear()
+            try:
+                await self.fill()
+            except Exception:
+                logger.error('预取登陆凭据时异常', exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._next_wait())
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """启动后台预取任务"""
+        if self.size <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+        logger.info(f'启动登陆凭据预取，凭据池大小: {self.size}')
+
+    async def stop(self):
+        """停止后台预取任务，并清空凭据"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._wakeup = None
+        self._tickets.clear()
@@ -1,7 +1,61 @@
 """验证码模块辅助通过工具"""
+import asyncio
+import logging
+import threading
 from abc import abstractmethod, ABC
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-import ddddocr
+from pydantic import BaseModel, Field
+
+from xtu_ems.ems.config import CaptchaConfig
+
+logger = logging.getLogger('xtu-ems.captcha')
+
+
+class CaptchaResult(BaseModel):
+    """验证码识别结果"""
+    text: str
+    """识别结果"""
+    confidence: float = 1.
+    """置信度，为每个字符概率的乘积"""
+    candidates: list[str] = Field(default_factory=list)
+    """候选结果，将置信度最低的字符替换为次优字符得到，按概率从高到低排列"""
+
+
+class CaptchaStatistics:
+    """验证码识别统计，用于观察有多少请求浪费在错误的识别结果上"""
+
+    def __init__(self):
+        self.rejected = 0
+        """识别结果不符合格式或置信度过低，未提交登陆就丢弃的次数"""
+        self.accepted = 0
+        """提交后被教务系统接受的次数"""
+        self.failed = 0
+        """提交后被教务系统判定为验证码错误的次数"""
+
+    def on_rejected(self):
+        self.rejected += 1
+
+    def on_accepted(self):
+        self.accepted += 1
+
+    def on_failed(self):
+        self.failed += 1
+
+    @property
+    def success_rate(self) -> float:
+        """提交的验证码中被接受的比例"""
+        submitted = self.accepted + self.failed
+        return self.accepted / submitted if submitted else 1.
+
+    def snapshot(self) -> dict:
+        return {
+            'rejected': self.rejected,
+            'accepted': self.accepted,
+            'failed': self.failed,
+            'success_rate': self.success_rate
+        }
 
 
 class Captcha(ABC):
@@ -12,12 +66,201 @@ class Captcha(ABC):
         """验证码校验"""
         pass
 
+    async def async_verify(self, target, *args, **kwargs) -> str:
+        """异步验证码校验，默认在事件循环的默认线程池中执行`verify`"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.verify, target, *args, **kwargs))
+
+    def recognize(self, target, *args, **kwargs) -> CaptchaResult:
+        """识别验证码并返回置信度与候选结果，默认不提供置信度"""
+        return CaptchaResult(text=self.verify(target, *args, **kwargs))
+
+    async def async_recognize(self, target, *args, **kwargs) -> CaptchaResult:
+        """异步识别验证码并返回置信度与候选结果"""
+        return CaptchaResult(text=await self.async_verify(target, *args, **kwargs))
+
+
+_ocr = None
+_ocr_lock = threading.Lock()
+
+
+def load_model():
+    """
+    加载验证码识别模型
+
+    ddddocr会在导入时加载onnxruntime，创建实例时会加载模型，因此推迟到第一次识别验证码时才加载，
+    避免导入教务系统模块时的启动开销。该函数是线程安全的，并且只会加载一次。
+    """
+    global _ocr
+    if _ocr is None:
+        with _ocr_lock:
+            if _ocr is None:
+                logger.info('正在加载验证码识别模型')
+                import ddddocr
+                _ocr = ddddocr.DdddOcr(show_ad=False)
+    return _ocr
+
+
+def _recognize(img: bytes, candidate_count: int = 3) -> CaptchaResult:
+    """
+    识别单张验证码
 
-_ocr = ddddocr.DdddOcr(show_ad=False)
+    使用模型输出的逐帧概率进行贪心CTC解码（与ddddocr的解码结果一致），同时计算置信度，
+    并将置信度最低的字符替换为该帧上的次优字符作为候选结果。
+    """
+    import numpy as np
+    output = load_model().classification(img=img, probability=True)
+    charsets = output['charsets']
+    probability = np.atleast_2d(np.asarray(output['probability']))
+    best = probability.argmax(axis=1)
+    chars, steps = [], []
+    last = 0
+    for t, i in enumerate(best):
+        if i != last and i != 0:
+            chars.append(charsets[i])
+            steps.append(t)
+        last = i
+    confidences = [float(probability[t, best[t]]) for t in steps]
+    candidates = []
+    if steps:
+        weakest = min(range(len(steps)), key=lambda k: confidences[k])
+        frame = probability[steps[weakest]]
+        for i in np.argsort(frame)[::-1]:
+            if len(candidates) >= candidate_count:
+                break
+            if i == 0 or i == best[steps[weakest]]:
+                continue
+            candidates.append(''.join(chars[:weakest] + [charsets[i]] + chars[weakest + 1:]))
+    return CaptchaResult(text=''.join(chars),
+                         confidence=float(np.prod(confidences)) if confidences else 0.,
+                         candidates=candidates)
+
+
+def _classify(img: bytes) -> str:
+    """识别单张验证码"""
+    return load_model().classification(img=img)
+
+
+def _recognize_batch(images: list[bytes]) -> list:
+    """在同一个工作线程中识别一批验证码，单张识别失败不影响其他验证码，失败的位置返回异常对象"""
+    ret = []
+    for img in images:
+        try:
+            ret.append(_recognize(img))
+        except Exception as e:
+            ret.append(e)
+    return ret
+
+
+class OcrExecutor:
+    """
+    验证码识别执行器
+
+    - 识别在独立的线程池中执行，不会阻塞事件循环（onnxruntime推理时会释放GIL）
+    - 当`batch_size`大于1时，会将`batch_window`时间内并发到达的验证码合并成一批，交给一个工作线程识别，
+      减少线程切换与任务调度的开销
+    """
+
+    def __init__(self, max_workers: int = None, batch_size: int = None, batch_window: float = None):
+        """
+        Args:
+            max_workers: 识别线程数
+            batch_size: 单批次最多识别的验证码数量
+            batch_window: 合批等待时间（秒）
+        """
+        self.max_workers = max_workers or CaptchaConfig.XTU_EMS_OCR_WORKERS
+        self.batch_size = batch_size or CaptchaConfig.XTU_EMS_OCR_BATCH_SIZE
+        self.batch_window = batch_window if batch_window is not None else CaptchaConfig.XTU_EMS_OCR_BATCH_WINDOW
+        self._executor = None
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._flush_handle = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='xtu-ems-ocr')
+        return self._executor
+
+    async def recognize(self, img: bytes) -> CaptchaResult:
+        """
+        异步识别验证码
+        Args:
+            img: 验证码图片
+
+        Returns:
+            识别结果
+        """
+        loop = asyncio.get_running_loop()
+        if self.batch_size <= 1:
+            return await loop.run_in_executor(self.executor, _recognize, img)
+        future = loop.create_future()
+        self._pending.append((img, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        """将等待中的验证码作为一个批次提交给线程池"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        logger.debug(f'提交了一批验证码识别任务，共 {len(batch)} 张')
+        job = asyncio.get_running_loop().run_in_executor(self.executor, _recognize_batch, [img for img, _ in batch])
+        job.add_done_callback(partial(self._dispatch, batch))
+
+    @staticmethod
+    def _dispatch(batch: list[tuple[bytes, asyncio.Future]], job: asyncio.Future):
+        """将批次的识别结果分发给各个等待者"""
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if job.cancelled():
+                future.cancel()
+            elif job.exception() is not None:
+                future.set_exception(job.exception())
+            elif isinstance(job.result()[i], Exception):
+                future.set_exception(job.result()[i])
+            else:
+                future.set_result(job.result()[i])
+
+    async def warm_up(self):
+        """在线程池中预先加载验证码识别模型，不阻塞事件循环"""
+        await asyncio.get_running_loop().run_in_executor(self.executor, load_model)
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+ocr_executor = OcrExecutor()
+"""全局共享的验证码识别执行器"""
 
 
 class ImageDetector(Captcha):
     """图形识别验证码校验器"""
 
+    def __init__(self, executor: OcrExecutor = None):
+        """
+        Args:
+            executor: 异步识别使用的执行器，默认使用全局共享的执行器
+        """
+        self.executor = executor or ocr_executor
+
     def verify(self, target, *args, **kwargs) -> str:
-        return _ocr.classification(img=target)
+        return _classify(target)
+
+    async def async_verify(self, target, *args, **kwargs) -> str:
+        return (await self.async_recognize(target)).text
+
+    def recognize(self, target, *args, **kwargs) -> CaptchaResult:
+        return _recognize(target)
+
+    async def async_recognize(self, target, *args, **kwargs) -> CaptchaResult:
+        return await self.executor.recognize(target)
@@ -0,0 +1,76 @@
+"""解析执行器，将CPU密集的页面解析任务放到事件循环之外执行"""
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from functools import partial
+from typing import Callable, TypeVar, Optional
+
+from xtu_ems.ems.config import ParserConfig
+
+_T = TypeVar('_T')
+
+logger = logging.getLogger('xtu-ems.executor')
+
+
+class ParseExecutor:
+    """
+    解析执行器
+
+    - 使用线程池时，解析函数与参数不需要可序列化，适合解析HTML这类轻量任务
+    - 使用进程池时，解析函数与参数需要可以被pickle，适合解析PDF这类重量任务，不受GIL限制
+    - 当`max_workers`为0时，直接在当前线程中执行
+    """
+
+    def __init__(self, max_workers: int, use_process: bool = False, name: str = 'xtu-ems-parser'):
+        """
+        Args:
+            max_workers: 工作线程（进程）数
+            use_process: 是否使用进程池
+            name: 线程名前缀
+        """
+        self.max_workers = max_workers
+        self.use_process = use_process
+        self.name = name
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_process:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, func: Callable[..., _T], *args) -> _T:
+        """
+        执行解析函数
+        Args:
+            func: 解析函数
+            *args: 解析函数的参数
+
+        Returns:
+            解析结果
+        """
+        if self.max_workers <= 0:
+            return func(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args))
+        except BrokenExecutor:
+            # 工作进程意外退出后进程池无法继续使用，丢弃后下次重新创建
+            logger.error(f'[{self.name}] 执行器已损坏，将重新创建', exc_info=True)
+            self._executor = None
+            raise
+
+    def shutdown(self):
+        """关闭执行器"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+html_executor = ParseExecutor(ParserConfig.XTU_EMS_HTML_PARSE_WORKERS, name='xtu-ems-html')
+"""解析HTML页面的线程池"""
+
+pdf_executor = ParseExecutor(ParserConfig.XTU_EMS_PDF_PARSE_WORKERS, use_process=True, name='xtu-ems-pdf')
+"""解析PDF成绩单的进程池"""
@@ -0,0 +1,80 @@
+"""PDF表格快速提取工具
+
+pdfplumber的`extract_table`需要计算所有线段的交点、合并单元格并逐个裁剪单元格提取文字，开销很大。
+教务系统导出的成绩单是由线框绘制的固定版式表格，可以直接用线框的位置确定行列，
+再按照单词的位置把单词放进对应的单元格中，输出与`extract_table`相同结构的结果。
+"""
+from bisect import bisect_right
+from typing import Optional
+
+from pdfplumber.page import Page
+
+
+def _cluster(values: list[float], tolerance: float) -> list[float]:
+    """将相近的坐标合并为一个"""
+    ret = []
+    for v in sorted(values):
+        if not ret or v - ret[-1] > tolerance:
+            ret.append(v)
+    return ret
+
+
+def _cell_text(words: list[dict], tolerance: float) -> str:
+    """将单元格中的单词按行拼接，行内以空格分隔，行间以换行分隔"""
+    lines: list[list[dict]] = []
+    for word in sorted(words, key=lambda w: (w['top'], w['x0'])):
+        if lines and abs(word['top'] - lines[-1][0]['top']) <= tolerance:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return '\n'.join(' '.join(w['text'] for w in sorted(line, key=lambda w: w['x0'])) for line in lines)
+
+
+def extract_table_by_edges(page: Page, tolerance: float = 3) -> Optional[list[list[Optional[str]]]]:
+    """
+    根据线框与单词位置提取页面中的表格
+    Args:
+        page: PDF页面
+        tolerance: 坐标合并的容差
+
+    Returns:
+        与`extract_table`结构相同的表格：空单元格为''，被合并的单元格为None；页面中没有线框时返回None
+    """
+    v_edges = page.vertical_edges
+    if not v_edges:
+        return None
+    # 以竖线覆盖的范围作为表格区域，避免表格外的横线（如下划线）产生多余的行
+    top = min(e['top'] for e in v_edges)
+    bottom = max(e['bottom'] for e in v_edges)
+    rows = _cluster([e['top'] for e in page.horizontal_edges if top - tolerance <= e['top'] <= bottom + tolerance],
+                    tolerance)
+    cols = _cluster([e['x0'] for e in v_edges], tolerance)
+    if len(rows) < 2 or len(cols) < 2:
+        return None
+
+    cells: list[list[list[dict]]] = [[[] for _ in cols[1:]] for _ in rows[1:]]
+    for word in page.extract_words():
+        x = (word['x0'] + word['x1']) / 2
+        y = (word['top'] + word['bottom']) / 2
+        if not (cols[0] < x < cols[-1] and rows[0] < y < rows[-1]):
+            continue
+        cells[bisect_right(rows, y) - 1][bisect_right(cols, x) - 1].append(word)
+
+    table = []
+    for r, row in enumerate(cells):
+        middle = (rows[r] + rows[r + 1]) / 2
+        # 当前行中真实存在的列分隔线，不存在分隔线的相邻单元格被合并
+        borders = {c for c, x in enumerate(cols)
+                   if any(abs(e['x0'] - x) <= tolerance and e['top'] <= middle <= e['bottom'] for e in v_edges)}
+        line: list[Optional[str]] = []
+        merged: list[dict] = []
+        start = 0
+        for c in range(len(cols) - 1):
+            merged += row[c]
+            if c + 1 in borders or c + 1 == len(cols) - 1:
+                line.append(_cell_text(merged, tolerance))
+                line += [None] * (c - start)
+                merged = []
+                start = c + 1
+        table.append(line)
+    return table
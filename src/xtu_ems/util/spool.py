@@ -0,0 +1,88 @@
+"""下载缓冲工具，先缓冲在内存中，超过阈值后转存到临时文件，并限制下载的总大小"""
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from typing import Union
+
+
+class ContentTooLargeException(Exception):
+    """下载内容过大异常"""
+
+    def __init__(self, message="下载内容超过大小限制"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class SpooledBuffer:
+    """
+    下载缓冲区
+
+    - 写入的内容不超过`max_memory`时保存在内存中，超过后转存到临时文件
+    - 写入的内容超过`max_size`时抛出`ContentTooLargeException`
+    - 写入的同时计算内容摘要，不需要再次读取全部内容
+    """
+
+    def __init__(self, max_memory: int, max_size: int):
+        """
+        Args:
+            max_memory: 内存中缓冲的最大字节数
+            max_size: 允许写入的最大字节数
+        """
+        self.max_memory = max_memory
+        self.max_size = max_size
+        self.size = 0
+        self.head = b''
+        """内容的前几个字节，用于判断文件类型"""
+        self._memory = BytesIO()
+        self._file = None
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, chunk: bytes):
+        """写入一段内容"""
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise ContentTooLargeException(f"下载内容超过 {self.max_size} 字节")
+        if len(self.head) < 8:
+            self.head = (self.head + chunk)[:8]
+        self._hash.update(chunk)
+        if self._file is None and self.size > self.max_memory:
+            self._file = tempfile.NamedTemporaryFile(prefix='xtu-ems-', delete=False)
+            self._file.write(self._memory.getvalue())
+            self._memory = None
+        (self._file or self._memory).write(chunk)
+
+    @property
+    def digest(self) -> str:
+        """已写入内容的摘要"""
+        return self._hash.hexdigest()
+
+    @property
+    def spilled(self) -> bool:
+        """内容是否已经转存到临时文件"""
+        return self._file is not None
+
+    def source(self) -> Union[bytes, str]:
+        """
+        获取内容，可以直接发送给其他进程
+        Returns:
+            内容保存在内存中时返回字节内容，否则返回临时文件路径
+        """
+        if self._file is not None:
+            self._file.flush()
+            return self._file.name
+        return self._memory.getvalue()
+
+    def close(self):
+        """释放缓冲区，删除临时文件"""
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._file.name)
+            self._file = None
+        self._memory = None
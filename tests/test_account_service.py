@@ -1,8 +1,16 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
 from unittest.async_case import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
+from plat.config import KEEP_ALIVE_CONFIG
 from plat.repository.d_basic import SimpleKVRepository
 from plat.service.acc_service import AccountService, ExpiredAccountException
+from plat.service.entity import Account, AccountStatus
+from plat.service.limiter import TokenBucket
+from plat.service.token import TokenSigner, BloomFilter
+from xtu_ems.ems.ems import InvalidAccountException
 from xtu_ems.ems.session import Session
 
 
@@ -28,9 +36,200 @@ class TestAccountService(IsolatedAsyncioTestCase):
         self.assertIsNotNone(token_account)
         self.assertEqual(account, token_account)
 
+    async def test_token_index(self):
+        """测试token索引只保存学号，未知的token验证失败"""
+        account = await self.service.login('TestUsername', 'TestPassword')
+        self.assertEqual('TestUsername', await self.service.token_repository.async_get_item(account.token))
+        self.assertIsNone(await self.service.auth_with_token('unknown'))
+
+    async def test_revoke_tokens(self):
+        """测试批量吊销token后旧token失效，重新登陆获得新的token"""
+        tokens = [(await self.service.login(f'{i}', 'TestPassword')).token for i in range(3)]
+        self.assertEqual(2, await self.service.revoke_tokens(['0', '1', 'missing']))
+        self.assertIsNone(await self.service.auth_with_token(tokens[0]))
+        self.assertIsNone(await self.service.auth_with_token(tokens[1]))
+        self.assertIsNotNone(await self.service.auth_with_token(tokens[2]))
+        self.assertEqual(3, len(self.service.token_repository))
+        account = await self.service.login('0', 'TestPassword')
+        self.assertNotEqual(tokens[0], account.token)
+        self.assertEqual(account, await self.service.auth_with_token(account.token))
+
+    async def test_relogin(self):
+        """测试并发重新登陆时只登陆一次，并且保留原来的token"""
+        account = await self.service.login('TestUsername', 'TestPassword')
+        token = account.token
+        AccountService.ems.async_login = AsyncMock(return_value=Session(session_id='new_session_id'))
+        results = await asyncio.gather(*[self.service.relogin('TestUsername', 'session_id') for _ in range(5)])
+        AccountService.ems.async_login.assert_awaited_once()
+        self.assertTrue(all(r.session == 'new_session_id' for r in results))
+        self.assertEqual(token, results[0].token)
+        self.assertEqual(results[0], await self.service.auth_with_token(token))
+        # session已经被更新过，不需要再次登陆
+        await self.service.relogin('TestUsername', 'session_id')
+        AccountService.ems.async_login.assert_awaited_once()
+
+    async def test_relogin_with_invalid_password(self):
+        """测试密码失效时无法重新登陆，并标记过期"""
+        account = await self.service.login('TestUsername', 'TestPassword')
+        AccountService.ems.async_login = AsyncMock(side_effect=InvalidAccountException())
+        self.assertIsNone(await self.service.relogin('TestUsername', 'session_id'))
+        with self.assertRaises(ExpiredAccountException):
+            await self.service.auth_with_token(account.token)
+
     async def test_expire_account(self):
         account = await self.service.login('TestUsername', 'TestPassword')
         self.assertIsNotNone(account)
         await self.service.expire_account(account.student_id)
         with self.assertRaises(ExpiredAccountException):
             await self.service.auth_with_token(account.token)
+
+
+class TestSignedToken(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.service = AccountService(account_repository=SimpleKVRepository(),
+                                      token_repository=SimpleKVRepository(),
+                                      signer=TokenSigner(b'secret'),
+                                      revoked=BloomFilter(bits=1024))
+        AccountService.ems.async_login = AsyncMock(return_value=Session(session_id='session_id'))
+
+    async def test_auth_without_lookup(self):
+        """测试带签名的token验证时不查询存储库"""
+        account = await self.service.login('TestUsername', 'TestPassword')
+        self.assertEqual(0, len(self.service.token_repository))
+        self.assertEqual(account, await self.service.auth_with_token(account.token))
+        with patch.object(self.service.account_repository, 'async_get_item') as get_item:
+            self.assertEqual('TestUsername', await self.service.auth_student_id(account.token))
+            get_item.assert_not_called()
+
+    async def test_revoked(self):
+        """测试吊销与过期的账户回退到查询存储库验证"""
+        account = await self.service.login('TestUsername', 'TestPassword')
+        token = account.token
+        await self.service.revoke_tokens(['TestUsername'])
+        self.assertIsNone(await self.service.auth_student_id(token))
+        account = await self.service.login('TestUsername', 'TestPassword')
+        self.assertEqual('TestUsername', await self.service.auth_student_id(account.token))
+        await self.service.expire_account('TestUsername')
+        with self.assertRaises(ExpiredAccountException):
+            await self.service.auth_student_id(account.token)
+
+    async def test_rebuild_revoked(self):
+        """测试同步调度时重建吊销过滤器，重新登陆的账户恢复快速验证，吊销的旧token仍然无效"""
+        account = await self.service.login('TestUsername', 'TestPassword')
+        old_token = account.token
+        await self.service.revoke_tokens(['TestUsername'])
+        await self.service.expire_account('TestUsername')
+        account = await self.service.login('TestUsername', 'TestPassword')
+        await self.service.sync_schedule()
+        with patch.object(self.service.account_repository, 'async_get_item') as get_item:
+            self.assertEqual('TestUsername', await self.service.auth_student_id(account.token))
+            get_item.assert_not_called()
+        self.assertIsNone(await self.service.auth_student_id(old_token))
+
+    async def test_sync_revocations(self):
+        """测试其他进程过期的账户在同步吊销记录后不能再直接通过验证，重新登陆后删除吊销记录"""
+        other = AccountService(account_repository=self.service.account_repository,
+                               token_repository=self.service.token_repository,
+                               signer=TokenSigner(b'secret'),
+                               revoked=BloomFilter(bits=1024),
+                               revocation_repository=self.service.revocation_repository)
+        account = await self.service.login('TestUsername', 'TestPassword')
+        await other.expire_account('TestUsername')
+        self.assertEqual('TestUsername', await self.service.auth_student_id(account.token))
+        self.assertEqual(1, await self.service.sync_revocations())
+        with self.assertRaises(ExpiredAccountException):
+            await self.service.auth_student_id(account.token)
+        await other.login('TestUsername', 'TestPassword')
+        self.assertEqual(0, len(self.service.revocation_repository))
+        self.assertEqual('TestUsername', await self.service.auth_student_id(account.token))
+
+    async def test_stale_revocations(self):
+        """测试超过保留时间的吊销记录被删除，不再加入过滤器"""
+        await self.service.revocation_repository.async_set_item('TestUsername:0', datetime.now() - timedelta(days=1))
+        self.assertEqual(0, await self.service.sync_revocations())
+        self.assertEqual(0, len(self.service.revocation_repository))
+        self.assertNotIn('TestUsername:0', self.service.revoked)
+
+
+class TestRefreshTask(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.repository = SimpleKVRepository()
+        for i in range(20):
+            await self.repository.async_set_item(str(i), Account(student_id=str(i), password='', session=str(i),
+                                                                 status=AccountStatus.NORMAL))
+        self.repository.data['0'].status = AccountStatus.EXPIRED
+        self.service = AccountService(account_repository=self.repository,
+                                      token_repository=SimpleKVRepository(),
+                                      concurrency=4,
+                                      rate_limiter=TokenBucket(rate=0, capacity=1))
+
+    async def test_concurrent_refresh(self):
+        """测试并发保活与统计信息"""
+        running, peak = 0, 0
+
+        async def validate(session):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(.01)
+            running -= 1
+            return session.session_id != '1'
+
+        with patch.object(self.service.session_validator, 'async_handler', side_effect=validate):
+            stats = await self.service.refresh_task()
+        self.assertEqual(4, peak)
+        self.assertEqual({'total': 20, 'skipped': 1, 'recently_alive': 0, 'refreshed': 18, 'expired': 1,
+                          'failed': 0},
+                         {k: v for k, v in stats.snapshot().items() if k != 'elapsed'})
+        self.assertEqual(AccountStatus.EXPIRED, self.repository.data['1'].status)
+
+    async def test_single_pass(self):
+        """测试同一时间只进行一轮保活"""
+
+        async def validate(session):
+            await asyncio.sleep(.01)
+            return True
+
+        with patch.object(self.service.session_validator, 'async_handler', side_effect=validate) as handler:
+            first, second = await asyncio.gather(self.service.refresh_task(), self.service.refresh_task())
+        self.assertIsNotNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(19, handler.call_count)
+
+    async def test_network_error(self):
+        """测试保活请求异常时退避重试，重试后仍然异常的账户不标记过期，稍后重新调度"""
+        attempts = {}
+
+        async def validate(session):
+            attempts[session.session_id] = attempts.get(session.session_id, 0) + 1
+            if session.session_id == '1' and attempts['1'] == 1:
+                raise asyncio.TimeoutError()
+            if session.session_id == '2':
+                raise ConnectionError()
+            return True
+
+        start = datetime.now()
+        with patch.object(KEEP_ALIVE_CONFIG, 'KEEP_ALIVE_RETRY_BACKOFF', 0), \
+                patch.object(self.service.session_validator, 'async_handler', side_effect=validate):
+            stats = await self.service.refresh_task(['1', '2'])
+        self.assertEqual(1, stats.refreshed)
+        self.assertEqual(1, stats.failed)
+        self.assertEqual(0, stats.expired)
+        self.assertEqual(KEEP_ALIVE_CONFIG.KEEP_ALIVE_MAX_RETRY + 1, attempts['2'])
+        self.assertEqual(AccountStatus.NORMAL, self.repository.data['2'].status)
+        due = self.service.scheduler._due['2']
+        self.assertGreaterEqual(due, start)
+        self.assertLessEqual(due, datetime.now() + KEEP_ALIVE_CONFIG.KEEP_ALIVE_RETRY_DELAY)
+
+
+class TestTokenBucket(IsolatedAsyncioTestCase):
+
+    async def test_rate(self):
+        """测试令牌桶限制请求速率"""
+        bucket = TokenBucket(rate=100, capacity=5)
+        start = time.monotonic()
+        await asyncio.gather(*[bucket.acquire() for _ in range(15)])
+        # 前5个令牌为突发，剩余10个按每秒100个发放
+        self.assertGreaterEqual(time.monotonic() - start, .09)
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from unittest import TestCase
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from starlette.requests import Request
+
+from plat import api
+from plat.service.entity import TaskEntity
+from xtu_ems.ems.model import ExamInfoList
+
+
+def _request(**headers) -> Request:
+    return Request({'type': 'http', 'headers': [(k.replace('_', '-').encode(), v.encode()) for k, v in headers.items()]})
+
+
+class TestIsNotModified(TestCase):
+
+    def test_if_none_match(self):
+        self.assertTrue(api.is_not_modified(_request(if_none_match='"a", W/"b"'), '"b"', None))
+        self.assertFalse(api.is_not_modified(_request(if_none_match='"a"'), '"b"', datetime.now()))
+        self.assertTrue(api.is_not_modified(_request(if_none_match='*'), '"b"', None))
+
+    def test_if_modified_since(self):
+        update_time = datetime.now() - timedelta(hours=1)
+        since = formatdate(update_time.timestamp(), usegmt=True)
+        self.assertTrue(api.is_not_modified(_request(if_modified_since=since), '"b"', update_time))
+        self.assertFalse(api.is_not_modified(_request(if_modified_since=since), '"b"', datetime.now()))
+        self.assertFalse(api.is_not_modified(_request(if_modified_since='invalid'), '"b"', update_time))
+        self.assertFalse(api.is_not_modified(_request(), '"b"', update_time))
+
+
+class TestCachedGets(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.record = TaskEntity()
+        self.record.update('data', {'name': 'course'})
+        patcher = patch.object(api.account_service, 'auth_student_id', AsyncMock(return_value='202105001'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_not_modified(self):
+        """测试数据没有更新时返回304，更新后返回新的ETag"""
+        with patch.object(api.course_service, 'get_record', AsyncMock(return_value=self.record)):
+            response = await api.do_cached_gets(api.course_service, 'token', _request())
+            self.assertEqual(200, response.status_code)
+            etag = response.headers['etag']
+            self.assertIn(b'course', response.body)
+            self.assertIn('last-modified', response.headers)
+
+            response = await api.do_cached_gets(api.course_service, 'token', _request(if_none_match=etag))
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(b'', response.body)
+
+            self.record.update('data', {'name': 'new course'})
+            self.record.update_time += timedelta(seconds=1)
+            response = await api.do_cached_gets(api.course_service, 'token', _request(if_none_match=etag))
+            self.assertEqual(200, response.status_code)
+            self.assertNotEqual(etag, response.headers['etag'])
+
+    async def test_etag_per_service(self):
+        """测试不同数据的ETag不同"""
+        with patch.object(api.course_service, 'get_record', AsyncMock(return_value=self.record)), \
+                patch.object(api.exam_service, 'get_record', AsyncMock(return_value=self.record)):
+            course = await api.do_cached_gets(api.course_service, 'token', _request())
+            exam = await api.do_cached_gets(api.exam_service, 'token', _request())
+            self.assertNotEqual(course.headers['etag'], exam.headers['etag'])
+
+    async def test_banned(self):
+        """测试被封禁的账户返回失败信息"""
+        with patch.object(api.account_service, 'auth_student_id',
+                          AsyncMock(side_effect=api.BannedAccountException('202105001'))):
+            response = await api.do_cached_gets(api.course_service, 'token', _request())
+        self.assertEqual(0, response.code)
+        self.assertIn('封禁', response.message)
+
+    async def test_no_data(self):
+        """测试还没有数据时不返回缓存校验信息"""
+        with patch.object(api.course_service, 'get_record', AsyncMock(return_value=None)):
+            response = await api.do_cached_gets(api.course_service, 'token', _request())
+            self.assertIsNone(response.data)
+
+
+class TestCachedIcs(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.record = TaskEntity()
+        self.record.update('data', ExamInfoList())
+        patcher = patch.object(api.account_service, 'auth_student_id', AsyncMock(return_value='202105001'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        api.ics_cache.data.clear()
+
+    async def test_render_once(self):
+        """测试数据没有更新时只渲染一次ics，并支持304"""
+        with patch.object(api.exam_service, 'get_record', AsyncMock(return_value=self.record)), \
+                patch.object(api, 'render_exams_ics', wraps=api.render_exams_ics) as render:
+            first = await api.get_exams_ics(_request(), 'token')
+            second = await api.get_exams_ics(_request(), 'token')
+            self.assertEqual(1, render.call_count)
+            self.assertEqual(first.body, second.body)
+            self.assertIn(b'BEGIN:VCALENDAR', first.body)
+            self.assertEqual('text/calendar', first.media_type)
+
+            response = await api.get_exams_ics(_request(if_none_match=first.headers['etag']), 'token')
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(1, render.call_count)
+
+            self.record.update('data', ExamInfoList())
+            self.record.update_time += timedelta(seconds=1)
+            response = await api.get_exams_ics(_request(if_none_match=first.headers['etag']), 'token')
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(2, render.call_count)
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from plat.repository.d_basic import BoundedKVRepository, _serialized_size
+from plat.service.entity import TaskEntity
+
+
+class TestBoundedKVRepository(IsolatedAsyncioTestCase):
+
+    async def test_lru_eviction(self):
+        """测试超出数量上限时淘汰最近最少使用的数据"""
+        repo = BoundedKVRepository(max_entries=2)
+        await repo.async_set_item('a', 1)
+        await repo.async_set_item('b', 2)
+        self.assertEqual(1, await repo.async_get_item('a'))
+        await repo.async_set_item('c', 3)
+        self.assertEqual(2, len(repo))
+        self.assertIsNone(await repo.async_get_item('b'))
+        self.assertEqual(['a', 'c'], [k async for k in repo])
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 1, 'expirations': 0}, repo.statistics.snapshot())
+
+    async def test_size_limit(self):
+        """测试按照数据大小淘汰，单个超出上限的数据仍然保留"""
+        repo = BoundedKVRepository(max_bytes=100, sizer=len)
+        await repo.async_set_item('a', 'x' * 40)
+        await repo.async_set_item('b', 'x' * 40)
+        self.assertEqual(80, repo.size)
+        await repo.async_set_item('a', 'x' * 10)
+        self.assertEqual(50, repo.size)
+        await repo.async_set_item('c', 'x' * 60)
+        self.assertEqual(['a', 'c'], [k async for k in repo])
+        await repo.async_set_item('d', 'x' * 200)
+        self.assertEqual(['d'], [k async for k in repo])
+        self.assertEqual(200, repo.size)
+        await repo.async_del_item('d')
+        self.assertEqual(0, repo.size)
+
+    async def test_estimate_entity_once(self):
+        """测试实体的数据只在更新后估算一次大小，只修改提交时间的写入不会重新序列化数据"""
+        repo = BoundedKVRepository(max_bytes=1 << 20)
+        entity = TaskEntity()
+        entity.update(key='data', value=['x' * 100] * 10)
+        with patch('plat.repository.d_basic._serialized_size', wraps=_serialized_size) as sizer:
+            await repo.async_set_item('a', entity)
+            size = repo.size
+            entity.on_submit_task()
+            await repo.async_set_item('a', entity)
+            self.assertEqual(1, sizer.call_count)
+            self.assertEqual(size, repo.size)
+            entity.update(key='data', value=['x'])
+            await repo.async_set_item('a', entity)
+            self.assertEqual(2, sizer.call_count)
+        self.assertLess(repo.size, size)
+
+    async def test_ttl(self):
+        """测试过期的数据读取时被清除，重新写入后重新计算过期时间"""
+        repo = BoundedKVRepository(ttl=timedelta(seconds=10))
+        with patch('plat.repository.d_basic.time.monotonic', return_value=100):
+            await repo.async_set_item('a', 1)
+            await repo.async_set_item('b', 2)
+        with patch('plat.repository.d_basic.time.monotonic', return_value=105):
+            await repo.async_set_item('b', 3)
+        with patch('plat.repository.d_basic.time.monotonic', return_value=111):
+            self.assertEqual(['b'], [k async for k in repo])
+            self.assertIsNone(await repo.async_get_item('a'))
+            self.assertEqual(3, await repo.async_get_item('b'))
+        self.assertEqual(1, len(repo))
+        self.assertEqual(1, repo.statistics.expirations)
@@ -1,6 +1,8 @@
-from unittest import TestCase
+import asyncio
+from unittest import TestCase, IsolatedAsyncioTestCase
 
-from xtu_ems.util.captcha import ImageDetector
+from xtu_ems.ems.ems import QZEducationalManageSystem
+from xtu_ems.util.captcha import ImageDetector, OcrExecutor, CaptchaResult, CaptchaStatistics
 
 
 class TestImageDetector(TestCase):
@@ -10,3 +12,66 @@ class TestImageDetector(TestCase):
             img = f.read()
         res = ImageDetector().verify(img)
         self.assertEqual('cnbz', res)
+
+    def test_recognize(self):
+        """测试验证码识别置信度与候选结果"""
+        with open('verifycode.jpeg', 'rb') as f:
+            img = f.read()
+        res = ImageDetector().recognize(img)
+        self.assertEqual('cnbz', res.text)
+        self.assertGreater(res.confidence, 0.5)
+        self.assertLessEqual(res.confidence, 1)
+        self.assertTrue(all(len(c) == 4 and c != 'cnbz' for c in res.candidates))
+
+
+class TestChooseCaptcha(TestCase):
+    def test_choose_captcha(self):
+        """测试按验证码格式与置信度选择答案"""
+        ems = QZEducationalManageSystem()
+        self.assertEqual('cnbz', ems.choose_captcha(CaptchaResult(text='cnbz', confidence=.9)))
+        # 置信度过低
+        self.assertIsNone(ems.choose_captcha(CaptchaResult(text='cnbz', confidence=.1)))
+        # 长度错误
+        self.assertIsNone(ems.choose_captcha(CaptchaResult(text='cnbzz', confidence=.9)))
+        # 字符集错误时使用候选结果
+        self.assertEqual('cnbz', ems.choose_captcha(CaptchaResult(text='cnbЗ', confidence=.9,
+                                                                  candidates=['cnb字', 'cnbz'])))
+        # 大写字母统一为小写后提交
+        self.assertEqual('cnbz', ems.choose_captcha(CaptchaResult(text='CnBZ', confidence=.9)))
+
+    def test_statistics(self):
+        """测试验证码识别统计"""
+        stats = CaptchaStatistics()
+        self.assertEqual(1., stats.success_rate)
+        stats.on_accepted()
+        stats.on_accepted()
+        stats.on_accepted()
+        stats.on_failed()
+        stats.on_rejected()
+        self.assertEqual(.75, stats.success_rate)
+        self.assertEqual(1, stats.snapshot()['rejected'])
+
+
+class TestAsyncImageDetector(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        with open('verifycode.jpeg', 'rb') as f:
+            self.img = f.read()
+
+    async def test_async_verify(self):
+        """测试异步验证码识别"""
+        executor = OcrExecutor(max_workers=1)
+        res = await ImageDetector(executor).async_verify(self.img)
+        executor.shutdown()
+        self.assertEqual('cnbz', res)
+
+    async def test_async_verify_with_batch(self):
+        """测试合批识别验证码"""
+        executor = OcrExecutor(max_workers=1, batch_size=4, batch_window=0.05)
+        detector = ImageDetector(executor)
+        res = await asyncio.gather(*[detector.async_verify(self.img) for _ in range(3)])
+        self.assertEqual(['cnbz'] * 3, res)
+        res = await asyncio.gather(detector.async_verify(self.img), detector.async_verify(b'invalid'),
+                                   return_exceptions=True)
+        executor.shutdown()
+        self.assertEqual('cnbz', res[0])
+        self.assertIsInstance(res[1], Exception)
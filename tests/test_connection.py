@@ -0,0 +1,53 @@
+import asyncio
+from unittest import TestCase
+from unittest.async_case import IsolatedAsyncioTestCase
+
+from xtu_ems.ems.connection import ConnectionPool
+
+
+class TestConnectionPool(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.pool = ConnectionPool()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+
+    async def test_share_connector(self):
+        """测试多个会话共享同一个连接器"""
+        async with self.pool.session() as s1, self.pool.session() as s2:
+            self.assertIs(s1.connector, s2.connector)
+        # 会话关闭后连接池仍然可用
+        self.assertFalse(self.pool.connector.closed)
+
+    async def test_isolated_cookies(self):
+        """测试不同会话之间的cookie相互隔离"""
+        async with self.pool.session(cookies={'JSESSIONID': 'A'}) as s1, \
+                self.pool.session(cookies={'JSESSIONID': 'B'}) as s2:
+            self.assertIsNot(s1.cookie_jar, s2.cookie_jar)
+            self.assertEqual(['A'], [c.value for c in s1.cookie_jar])
+            self.assertEqual(['B'], [c.value for c in s2.cookie_jar])
+
+    async def test_close(self):
+        """测试关闭连接池后会重新创建连接器"""
+        connector = self.pool.connector
+        await self.pool.close()
+        self.assertTrue(connector.closed)
+        self.assertIsNot(connector, self.pool.connector)
+
+
+class TestConnectorLoop(TestCase):
+
+    def test_close_on_new_loop(self):
+        """测试事件循环变化时关闭旧的连接器，不会泄漏连接"""
+        pool = ConnectionPool()
+
+        async def connector():
+            return pool.connector
+
+        first = asyncio.run(connector())
+        second = asyncio.run(connector())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        asyncio.run(pool.close())
+        self.assertTrue(second.closed)
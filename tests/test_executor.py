@@ -0,0 +1,43 @@
+import os
+import threading
+from unittest.async_case import IsolatedAsyncioTestCase
+
+from xtu_ems.ems.handler.get_student_exam import StudentExamGetter
+from xtu_ems.util.executor import ParseExecutor
+
+
+def _worker_identity():
+    return os.getpid(), threading.get_ident()
+
+
+class TestParseExecutor(IsolatedAsyncioTestCase):
+
+    async def test_inline(self):
+        """测试不使用执行器时直接在当前线程中执行"""
+        executor = ParseExecutor(max_workers=0)
+        self.assertEqual((os.getpid(), threading.get_ident()), await executor.run(_worker_identity))
+
+    async def test_thread_pool(self):
+        """测试在线程池中执行"""
+        executor = ParseExecutor(max_workers=1)
+        pid, tid = await executor.run(_worker_identity)
+        executor.shutdown()
+        self.assertEqual(os.getpid(), pid)
+        self.assertNotEqual(threading.get_ident(), tid)
+
+    async def test_process_pool(self):
+        """测试在进程池中执行"""
+        executor = ParseExecutor(max_workers=1, use_process=True)
+        pid, _ = await executor.run(_worker_identity)
+        executor.shutdown()
+        self.assertNotEqual(os.getpid(), pid)
+
+    async def test_extract_in_executor(self):
+        """测试在执行器中解析页面"""
+        with open(os.path.join('pages', 'student_exam.html'), encoding='utf-8') as f:
+            text = f.read()
+        handler = StudentExamGetter()
+        executor = ParseExecutor(max_workers=1)
+        res = await executor.run(handler.extract, text)
+        executor.shutdown()
+        self.assertEqual(handler.extract(text), res)
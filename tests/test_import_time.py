@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+_SCRIPT = """
+import sys
+import xtu_ems.ems.ems
+import xtu_ems.ems.handler.get_student_courses
+print(int('ddddocr' in sys.modules), int('onnxruntime' in sys.modules))
+"""
+
+
+class TestImportTime(TestCase):
+    def test_lazy_ocr_model(self):
+        """测试导入教务系统模块时不会加载验证码识别模型；导入耗时见benchmarks/import_time.py"""
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        out = subprocess.run([sys.executable, '-c', _SCRIPT], capture_output=True, text=True, env=env, check=True)
+        self.assertEqual('0 0', out.stdout.strip())
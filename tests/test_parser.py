@@ -0,0 +1,89 @@
+import os
+from unittest import TestCase
+
+from bs4 import BeautifulSoup
+
+from xtu_ems.ems.ems import SessionExpiredException
+from xtu_ems.ems.handler import available_parser, FALLBACK_PARSER, is_login_page, EMSGetter
+from xtu_ems.ems.handler.get_classroom_status import TodayClassroomStatusGetter
+from xtu_ems.ems.handler.get_student_courses import StudentCourseGetter
+from xtu_ems.ems.handler.get_student_exam import StudentExamGetter
+from xtu_ems.ems.handler.get_student_info import StudentInfoGetter
+from xtu_ems.ems.handler.get_students_transcript import StudentRankGetter
+from xtu_ems.ems.handler.get_teaching_calendar import TeachingCalendarGetter
+from xtu_ems.ems.handler.valid_session import SessionValidator
+from xtu_ems.ems.session import Session
+
+
+def _page(name):
+    with open(os.path.join('pages', name), encoding='utf-8') as f:
+        return f.read()
+
+
+class TestParserParity(TestCase):
+    """测试快速解析与原始html.parser全量解析的结果一致"""
+
+    def assertParity(self, handler, page):
+        text = _page(page)
+        expected = handler._extra_info(BeautifulSoup(text, 'html.parser'))
+        handler.parser = 'lxml'
+        actual = handler._extra_info(handler.parse(text))
+        if hasattr(expected, 'model_dump'):
+            expected, actual = expected.model_dump(), actual.model_dump()
+        self.assertEqual(expected, actual)
+        return actual
+
+    def test_student_courses(self):
+        res = self.assertParity(StudentCourseGetter(), 'student_courses.html')
+        self.assertEqual(5, len(res['courses']))
+        durations = {c['name']: c['duration'] for c in res['courses']}
+        self.assertEqual(3, durations['程序设计实践'])
+        self.assertEqual(2, durations['线性代数'])
+
+    def test_student_exam(self):
+        res = self.assertParity(StudentExamGetter(), 'student_exam.html')
+        self.assertEqual(2, len(res['exams']))
+
+    def test_classroom_status(self):
+        res = self.assertParity(TodayClassroomStatusGetter(), 'classroom_status.html')
+        self.assertEqual(['北山阶梯', '尚美楼', '兴教楼A', '其他'], list(res['classrooms'].keys()))
+
+    def test_student_info(self):
+        res = self.assertParity(StudentInfoGetter(), 'student_info.html')
+        self.assertEqual('202105550000', res['student_id'])
+        self.assertEqual('张三', res['name'])
+
+    def test_teaching_calendar(self):
+        res = self.assertParity(TeachingCalendarGetter(), 'teaching_calendar.html')
+        self.assertEqual('2024-2025-1', res['term_id'])
+        self.assertEqual(3, res['weeks'])
+
+    def test_student_rank(self):
+        res = self.assertParity(StudentRankGetter(), 'student_rank.html')
+        self.assertEqual(23, res['major_rank'])
+
+    def test_session_validator(self):
+        self.assertTrue(self.assertParity(SessionValidator(), 'session_valid.html'))
+        self.assertFalse(self.assertParity(SessionValidator(), 'session_invalid.html'))
+
+    def test_fallback_parser(self):
+        """测试解析器不可用时回退"""
+        self.assertEqual(FALLBACK_PARSER, available_parser('not-a-parser'))
+
+
+class TestLoginPage(TestCase):
+
+    def test_is_login_page(self):
+        """测试通过标题识别登陆页面"""
+        self.assertTrue(is_login_page(_page('session_invalid.html')))
+        self.assertFalse(is_login_page(_page('session_valid.html')))
+        self.assertFalse(is_login_page(_page('student_courses.html')))
+
+    def test_mark_alive(self):
+        """测试返回的不是登陆页面时记录会话有效"""
+        session = Session(session_id='session')
+        with self.assertRaises(SessionExpiredException):
+            EMSGetter._check_alive(session, _page('session_invalid.html'))
+        self.assertIsNone(session.alive_time)
+        EMSGetter._check_alive(session, _page('student_courses.html'))
+        self.assertIsNotNone(session.alive_time)
@@ -0,0 +1,126 @@
+import asyncio
+import pickle
+from datetime import timedelta
+from unittest import skipIf
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+try:
+    from fakeredis import FakeAsyncRedis
+except ImportError:
+    FakeAsyncRedis = None
+
+from plat.repository.serializer import SerializationError
+from plat.service.acc_service import AccountService
+from plat.service.entity import Account, AccountStatus
+from xtu_ems.ems.session import Session
+
+
+@skipIf(FakeAsyncRedis is None, '需要安装fakeredis')
+class TestRedisKVRepository(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        from plat.repository.d_redis import RedisKVRepository
+        self.client = FakeAsyncRedis()
+        self.repo = RedisKVRepository(self.client, 'account', prefix='test')
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_get_set_del(self):
+        """测试读写与删除"""
+        account = Account(student_id='1', password='p', session='s', status=AccountStatus.NORMAL)
+        await self.repo.async_set_item('1', account)
+        self.assertEqual(1, len(self.repo))
+        self.assertEqual(account, await self.repo.async_get_item('1'))
+        self.assertEqual(['1'], [k async for k in self.repo])
+        await self.repo.async_del_item('1')
+        self.assertEqual(0, len(self.repo))
+        self.assertIsNone(await self.repo.async_get_item('1'))
+
+    async def test_shared_between_workers(self):
+        """测试不同进程的存储库（使用同一个Redis）可以读到彼此写入的数据"""
+        from plat.repository.d_redis import RedisKVRepository
+        other = RedisKVRepository(self.client, 'account', prefix='test')
+        await self.repo.async_set_item('1', 'value')
+        self.assertEqual('value', await other.async_get_item('1'))
+        self.assertEqual(1, await other.async_len())
+        self.assertEqual(1, len(other))
+
+    async def test_get_items(self):
+        """测试批量读取，缺失的键返回None"""
+        await asyncio.gather(*[self.repo.async_set_item(str(i), i) for i in range(10)])
+        self.assertEqual([0, None, 9], await self.repo.async_get_items(['0', 'x', '9']))
+        self.assertEqual(10, await self.repo.async_len())
+        self.assertEqual([], await self.repo.async_get_items([]))
+        await self.repo.async_del_items(['0', '1'])
+        self.assertEqual(8, len(self.repo))
+
+    async def test_ttl(self):
+        """测试设置了过期时间的存储库，过期的键在遍历时被清理"""
+        from plat.repository.d_redis import RedisKVRepository
+        repo = RedisKVRepository(self.client, 'score', ttl=timedelta(days=2), prefix='test')
+        await repo.async_set_item('1', 'data')
+        await self.repo.async_set_item('1', 'account')
+        self.assertGreater(await self.client.ttl('test:score:1'), 0)
+        self.assertEqual(-1, await self.client.ttl('test:account:1'))
+        await self.client.delete('test:score:1')
+        self.assertEqual([], [k async for k in repo])
+        self.assertEqual(0, await repo.async_len())
+
+    async def test_reject_pickle(self):
+        """测试不会反序列化其他客户端写入的pickle数据"""
+        await self.client.set('test:account:1', b'\x00' + pickle.dumps(Account(student_id='1', password='p')))
+        with self.assertRaises(SerializationError):
+            await self.repo.async_get_item('1')
+
+
+@skipIf(FakeAsyncRedis is None, '需要安装fakeredis')
+class TestRedisLease(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        from plat.repository.d_redis import RedisLease
+        self.client = FakeAsyncRedis()
+        self.leases = [RedisLease(self.client, prefix='test') for _ in range(2)]
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_exclusive(self):
+        """测试同一时间只有一个进程持有租约，持有者可以续约，释放后其他进程可以获得"""
+        first, second = self.leases
+        self.assertTrue(await first.acquire('keep-alive', timedelta(seconds=10)))
+        self.assertFalse(await second.acquire('keep-alive', timedelta(seconds=10)))
+        self.assertTrue(await first.acquire('keep-alive', timedelta(seconds=30)))
+        self.assertGreater(await self.client.pttl('test:lease:keep-alive'), 10000)
+        await second.release('keep-alive')
+        self.assertFalse(await second.acquire('keep-alive', timedelta(seconds=10)))
+        await first.release('keep-alive')
+        self.assertTrue(await second.acquire('keep-alive', timedelta(seconds=10)))
+
+    async def test_expire(self):
+        """测试持有者没有续约时租约过期，其他进程接替"""
+        first, second = self.leases
+        self.assertTrue(await first.acquire('keep-alive', timedelta(milliseconds=50)))
+        await asyncio.sleep(.1)
+        self.assertTrue(await second.acquire('keep-alive', timedelta(seconds=10)))
+        self.assertFalse(await first.acquire('keep-alive', timedelta(seconds=10)))
+
+    async def test_relogin_across_workers(self):
+        """测试共享存储的多个进程同时发现会话失效时，只有一个进程重新登陆"""
+        from plat.repository.d_redis import RedisKVRepository
+        services = [AccountService(account_repository=RedisKVRepository(self.client, 'account', prefix='test'),
+                                   token_repository=RedisKVRepository(self.client, 'token', prefix='test'),
+                                   lease=lease)
+                    for lease in self.leases]
+        await services[0].account_repository.async_set_item(
+            '1', Account(student_id='1', password='p', session='expired', status=AccountStatus.NORMAL))
+
+        async def login(account):
+            await asyncio.sleep(.05)
+            return Session(session_id='new')
+
+        with patch.object(AccountService.ems, 'async_login', AsyncMock(side_effect=login)) as async_login:
+            accounts = await asyncio.gather(*[service.relogin('1', 'expired') for service in services])
+        async_login.assert_called_once()
+        self.assertEqual(['new', 'new'], [account.session for account in accounts])
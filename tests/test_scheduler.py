@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest import TestCase
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from plat.repository.d_basic import SimpleKVRepository
+from plat.service.acc_service import AccountService
+from plat.service.entity import Account, AccountStatus
+from plat.service.lease import Lease
+from plat.service.limiter import TokenBucket
+from plat.service.scheduler import SessionScheduler
+from xtu_ems.ems.session import Session
+
+
+class TestSessionScheduler(TestCase):
+
+    def test_pop_due(self):
+        """测试只取出到达保活时间的账户，并按保活时间排序"""
+        scheduler = SessionScheduler(expire=timedelta(minutes=30), ahead=timedelta(minutes=10))
+        now = datetime.now()
+        scheduler.schedule('a', now - timedelta(minutes=25))
+        scheduler.schedule('b', now - timedelta(minutes=21))
+        scheduler.schedule('c', now)
+        self.assertEqual(now - timedelta(minutes=5), scheduler.next_due())
+        self.assertEqual(['a', 'b'], scheduler.pop_due(now))
+        self.assertEqual([], scheduler.pop_due(now))
+        self.assertEqual(1, len(scheduler))
+
+    def test_reschedule_and_remove(self):
+        """测试重新调度与取消调度后旧记录被丢弃"""
+        scheduler = SessionScheduler(expire=timedelta(minutes=30), ahead=timedelta(minutes=10))
+        now = datetime.now()
+        scheduler.schedule('a', now - timedelta(minutes=25))
+        scheduler.schedule('b', now - timedelta(minutes=25))
+        scheduler.schedule('a', now)
+        scheduler.remove('b')
+        self.assertEqual([], scheduler.pop_due(now))
+        self.assertEqual(['a'], scheduler.pop_due(now + timedelta(minutes=20)))
+        self.assertIsNone(scheduler.next_due())
+
+
+class TestScheduledRefresh(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.repository = SimpleKVRepository()
+        self.service = AccountService(account_repository=self.repository,
+                                      token_repository=SimpleKVRepository(),
+                                      rate_limiter=TokenBucket(rate=0, capacity=1))
+
+    async def test_login_schedules_account(self):
+        """测试登陆后加入调度，保活成功后按新的时间重新调度"""
+        with patch.object(AccountService.ems, 'async_login', AsyncMock(return_value=Session(session_id='s'))):
+            account = await self.service.login('TestUsername', 'TestPassword')
+        due = self.service.scheduler.next_due()
+        self.assertEqual(account.last_alive_time + timedelta(minutes=20), due)
+        self.assertEqual([], self.service.scheduler.pop_due())
+
+        # 到达保活时间前没有其他请求确认会话有效
+        account.last_alive_time -= timedelta(minutes=20)
+        with patch.object(self.service.session_validator, 'async_handler', AsyncMock(return_value=True)) as handler:
+            await self.service.refresh_task(self.service.scheduler.pop_due(due))
+        handler.assert_called_once()
+        self.assertGreater(self.service.scheduler.next_due(), due)
+
+    async def test_skip_recently_alive(self):
+        """测试跳过最近已被数据请求确认有效的会话"""
+        alive_time = datetime.now() - timedelta(minutes=5)
+        await self.repository.async_set_item('a', Account(student_id='a', password='', status=AccountStatus.NORMAL,
+                                                          last_alive_time=alive_time))
+        with patch.object(self.service.session_validator, 'async_handler', AsyncMock(return_value=True)) as handler:
+            stats = await self.service.refresh_task(['a'])
+        handler.assert_not_called()
+        self.assertEqual(1, stats.recently_alive)
+        self.assertEqual(alive_time + timedelta(minutes=20), self.service.scheduler.next_due())
+
+    async def test_sync_schedule(self):
+        """测试同步存储库中未调度的有效账户"""
+        await self.repository.async_set_item('a', Account(student_id='a', password='', status=AccountStatus.NORMAL))
+        await self.repository.async_set_item('b', Account(student_id='b', password='', status=AccountStatus.EXPIRED))
+        self.assertEqual(1, await self.service.sync_schedule())
+        self.assertEqual(0, await self.service.sync_schedule())
+        self.assertIn('a', self.service.scheduler)
+        await self.service.expire_account('a')
+        self.assertNotIn('a', self.service.scheduler)
+
+    async def test_sync_schedule_jitter(self):
+        """测试恢复的账户从当前时间开始调度，并随机打散保活时间"""
+        for i in range(20):
+            await self.repository.async_set_item(str(i), Account(student_id=str(i), password='',
+                                                                 status=AccountStatus.NORMAL))
+        start = datetime.now()
+        await self.service.sync_schedule()
+        dues = sorted(self.service.scheduler._due.values())
+        self.assertGreaterEqual(dues[0], start + timedelta(minutes=20))
+        self.assertLessEqual(dues[-1], datetime.now() + timedelta(minutes=25))
+        self.assertGreater(len(set(dues)), 1)
+
+    async def test_reschedule_on_error(self):
+        """测试保活异常时取出的账户重新加入调度"""
+        self.service.scheduler.schedule_at('a', datetime.now() - timedelta(seconds=1))
+        with patch.object(self.service, 'sync_schedule', AsyncMock(return_value=0)), \
+                patch.object(self.service, 'refresh_task', AsyncMock(side_effect=RuntimeError())), \
+                patch('plat.service.acc_service.asyncio.sleep', AsyncMock(side_effect=asyncio.CancelledError())):
+            with self.assertRaises(asyncio.CancelledError):
+                await self.service.refresh_session(60)
+        self.assertIn('a', self.service.scheduler)
+
+    async def test_follower_skips_refresh(self):
+        """测试没有获得保活租约的进程只同步调度，不发起保活请求"""
+        self.service.lease = Lease()
+        self.service.scheduler.schedule_at('a', datetime.now() - timedelta(seconds=1))
+        with patch.object(self.service.lease, 'acquire', AsyncMock(return_value=False)), \
+                patch.object(self.service, 'sync_schedule', AsyncMock(return_value=0)) as sync_schedule, \
+                patch.object(self.service, 'refresh_task', AsyncMock()) as refresh_task, \
+                patch('plat.service.acc_service.asyncio.sleep', AsyncMock(side_effect=asyncio.CancelledError())):
+            with self.assertRaises(asyncio.CancelledError):
+                await self.service.refresh_session(60)
+        sync_schedule.assert_called_once()
+        refresh_task.assert_not_called()
+        self.assertIn('a', self.service.scheduler)
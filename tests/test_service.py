@@ -24,7 +24,7 @@ class TestPersonalInfoService(IsolatedAsyncioTestCase):
                 handler = StudentCourseGetter()
                 service = PersonalInfoService(handler=handler, update_expire=timedelta(days=1),
                                               submit_expire=timedelta(seconds=10),
-                                              account_repository=session_repository)
+                                              account_repository=session_repository, first_wait=0)
                 result = await service.get_info(acc.student_id)
                 self.assertIsNone(result)
                 # 如果数据没有更新，需要等待
@@ -42,7 +42,7 @@ class TestPersonalInfoService(IsolatedAsyncioTestCase):
                 handler = StudentCourseGetter()
                 service = PersonalInfoService(handler=handler, update_expire=timedelta(microseconds=1),
                                               submit_expire=timedelta(microseconds=1),
-                                              account_repository=session_repository)
+                                              account_repository=session_repository, first_wait=0)
                 result = await service.get_info(acc.student_id)
                 self.assertIsNone(result)
                 # 如果数据没有更新，需要等待
@@ -54,6 +54,24 @@ class TestPersonalInfoService(IsolatedAsyncioTestCase):
                 self.assertEqual(2, handler.async_handler.call_count)
 
 
+class TestGetRecord(IsolatedAsyncioTestCase):
+    async def test_get_record(self):
+        """测试获取缓存记录，包含数据、更新时间与更新状态"""
+        with patch.object(StudentCourseGetter, 'async_handler', return_value="Mocked Data"):
+            with patch.object(SessionValidator, 'async_handler', return_value=True):
+                service = PersonalInfoService(handler=StudentCourseGetter(), update_expire=timedelta(days=1),
+                                              submit_expire=timedelta(seconds=10),
+                                              account_repository=session_repository, first_wait=0)
+                record = await service.get_record(acc.student_id)
+                self.assertIsNone(record.update_time)
+                self.assertTrue(service.is_updating(acc.student_id))
+                await asyncio.sleep(.1)
+                record = await service.get_record(acc.student_id)
+                self.assertEqual('Mocked Data', record.data)
+                self.assertIsNotNone(record.update_time)
+                self.assertFalse(service.is_updating(acc.student_id))
+
+
 class TestPublicInfoService(IsolatedAsyncioTestCase):
     async def test_get_info(self):
         """获取公共信息"""
@@ -62,7 +80,7 @@ class TestPublicInfoService(IsolatedAsyncioTestCase):
                 handler = TeachingCalendarGetter()
                 service = PublicInfoService(name='calendar', handler=handler, update_expire=timedelta(days=1),
                                             submit_expire=timedelta(seconds=10),
-                                            account_repository=session_repository)
+                                            account_repository=session_repository, first_wait=0)
                 result = await service.get_info('calendar')
                 self.assertIsNone(result)
                 # 如果数据没有更新，需要等待
@@ -80,7 +98,7 @@ class TestPublicInfoService(IsolatedAsyncioTestCase):
                 handler = TeachingCalendarGetter()
                 service = PublicInfoService(name='calendar', handler=handler, update_expire=timedelta(microseconds=1),
                                             submit_expire=timedelta(microseconds=1),
-                                            account_repository=session_repository)
+                                            account_repository=session_repository, first_wait=0)
                 result = await service.get_info('calendar')
                 self.assertIsNone(result)
                 # 如果数据没有更新，需要等待
@@ -90,3 +108,84 @@ class TestPublicInfoService(IsolatedAsyncioTestCase):
                 await asyncio.sleep(.1)
                 # assert handler 的被调此书为2
                 self.assertEqual(2, handler.async_handler.call_count)
+
+
+class TestSingleFlight(IsolatedAsyncioTestCase):
+    async def test_coalesce(self):
+        """测试并发请求同一份数据时只发起一次更新"""
+
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(.1)
+            return "Mocked Data"
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=slow) as handler:
+            # 提交间隔很短，只靠提交时间无法阻止重复更新
+            service = PersonalInfoService(handler=StudentCourseGetter(), update_expire=timedelta(days=1),
+                                          submit_expire=timedelta(microseconds=1),
+                                          account_repository=session_repository, first_wait=0)
+            for _ in range(5):
+                await service.get_info(acc.student_id)
+                await asyncio.sleep(.001)
+            self.assertEqual(1, len(service.inflight))
+            await asyncio.sleep(.15)
+            self.assertEqual(1, handler.call_count)
+            self.assertEqual(0, len(service.inflight))
+
+    async def test_wait_fresh(self):
+        """测试等待正在进行的更新"""
+
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(.05)
+            return "Mocked Data"
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=slow):
+            service = PersonalInfoService(handler=StudentCourseGetter(), update_expire=timedelta(days=1),
+                                          submit_expire=timedelta(seconds=10),
+                                          account_repository=session_repository, first_wait=0)
+            # 等待时间不足时返回当前数据
+            self.assertIsNone(await service.get_info(acc.student_id, wait=1))
+            self.assertEqual("Mocked Data", await service.get_info(acc.student_id, wait=1000))
+
+
+class TestFirstResultWait(IsolatedAsyncioTestCase):
+    async def test_wait_first_result(self):
+        """测试第一次请求等待更新完成，之后的请求直接返回缓存"""
+
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(.05)
+            return "Mocked Data"
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=slow) as handler:
+            service = PersonalInfoService(handler=StudentCourseGetter(), update_expire=timedelta(microseconds=1),
+                                          submit_expire=timedelta(microseconds=1),
+                                          account_repository=session_repository, first_wait=1000)
+            self.assertEqual("Mocked Data", await service.get_info(acc.student_id))
+            # 数据已经过期，后台更新的同时直接返回旧数据
+            handler.side_effect = lambda *args, **kwargs: "New Data"
+            start = asyncio.get_running_loop().time()
+            self.assertEqual("Mocked Data", await service.get_info(acc.student_id))
+            self.assertLess(asyncio.get_running_loop().time() - start, .05)
+
+    async def test_first_wait_timeout(self):
+        """测试等待超时后返回空数据"""
+
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(.1)
+            return "Mocked Data"
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=slow):
+            service = PersonalInfoService(handler=StudentCourseGetter(), update_expire=timedelta(days=1),
+                                          submit_expire=timedelta(seconds=10),
+                                          account_repository=session_repository, first_wait=10)
+            self.assertIsNone(await service.get_info(acc.student_id))
+
+    async def test_without_stale_while_revalidate(self):
+        """测试关闭stale-while-revalidate时等待更新完成"""
+        with patch.object(StudentCourseGetter, 'async_handler', return_value="Mocked Data") as handler:
+            service = PersonalInfoService(handler=StudentCourseGetter(), update_expire=timedelta(microseconds=1),
+                                          submit_expire=timedelta(microseconds=1),
+                                          account_repository=session_repository, first_wait=1000,
+                                          stale_while_revalidate=False)
+            self.assertEqual("Mocked Data", await service.get_info(acc.student_id))
+            handler.return_value = "New Data"
+            self.assertEqual("New Data", await service.get_info(acc.student_id))
@@ -0,0 +1,99 @@
+import os
+from unittest import TestCase
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from aiohttp import web
+
+from xtu_ems.ems.config import XTUEMSConfig
+from xtu_ems.ems.connection import connection_pool
+from xtu_ems.ems.handler.valid_session import SessionValidator, TitleProbe, get_charset, PROBE_CHUNK_SIZE
+from xtu_ems.ems.session import Session
+
+
+def _page(name, padding=0):
+    with open(os.path.join('pages', name), 'rb') as f:
+        content = f.read()
+    # 模拟真实页面中标题之后的大量内容
+    rows = b'<tr><td>\xe9\x80\x9a\xe7\x9f\xa5</td><td>2024-09-01</td></tr>' * padding
+    return content.replace(b'</table>', rows + b'</table>')
+
+
+def _chunks(content):
+    return [content[i:i + PROBE_CHUNK_SIZE] for i in range(0, len(content), PROBE_CHUNK_SIZE)]
+
+
+class TestTitleProbe(TestCase):
+
+    def test_title_across_chunks(self):
+        """测试标题被分成多段时仍然可以读取"""
+        probe = TitleProbe(limit=1024)
+        content = _page('session_invalid.html')
+        for i in range(0, len(content), 7):
+            if probe.feed(content[i:i + 7]):
+                break
+        self.assertEqual(XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_TITLE, probe.title)
+        self.assertLess(probe.size, len(content))
+
+    def test_limit(self):
+        """测试超过读取限制时停止查找"""
+        probe = TitleProbe(limit=16)
+        self.assertTrue(probe.feed(b'<html><head><meta charset="utf-8">'))
+        self.assertIsNone(probe.title)
+
+    def test_charset(self):
+        self.assertEqual('gbk', get_charset('text/html; charset=GBK'.lower()))
+        self.assertEqual('utf-8', get_charset('text/html'))
+        self.assertEqual('utf-8', get_charset(None))
+
+    def test_probe_reads_head(self):
+        """测试只读取标题时读取的字节数远少于整个页面，并且验证结果与完整解析一致"""
+        content = _page('session_valid.html', padding=500)
+        validator = SessionValidator()
+        probe = TitleProbe(limit=XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_PROBE_BYTES)
+        for chunk in _chunks(content):
+            if probe.feed(chunk):
+                break
+        self.assertEqual(validator.extract(content.decode('utf-8')), validator._is_valid(probe.title))
+        self.assertLess(probe.size, len(content) // 10)
+
+    def test_drain(self):
+        """测试剩余内容较少时读完以复用连接，验证页面剩余的大量内容不再读取"""
+        probe = TitleProbe(limit=XTUEMSConfig.XTU_EMS_SESSION_VALIDATOR_PROBE_BYTES)
+        probe.feed(_page('session_valid.html')[:PROBE_CHUNK_SIZE])
+        self.assertFalse(SessionValidator._can_drain(str(len(_page('session_valid.html', padding=500))), probe))
+        self.assertTrue(SessionValidator._can_drain(str(probe.size + 1024), probe))
+        self.assertFalse(SessionValidator._can_drain(None, probe))
+
+
+class TestSessionProbe(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        pages = {'/valid': _page('session_valid.html', padding=500),
+                 '/invalid': _page('session_invalid.html'),
+                 '/untitled': b'<html><body>' + b' ' * 20000 + b'<title>x</title></body></html>'}
+
+        async def handle(request):
+            return web.Response(body=pages[request.path], content_type='text/html', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/{name}', handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.base = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+
+    async def asyncTearDown(self):
+        await connection_pool.close()
+        await self.runner.cleanup()
+
+    async def _validate(self, path, probe=True):
+        with patch.object(SessionValidator, 'url', return_value=self.base + path):
+            return await SessionValidator(probe=probe).async_handler(Session(session_id='session'))
+
+    async def test_probe(self):
+        """测试只读取标题的验证结果与完整解析一致"""
+        for path, expected in [('/valid', True), ('/invalid', False), ('/untitled', True)]:
+            self.assertEqual(expected, await self._validate(path))
+            self.assertEqual(expected, await self._validate(path, probe=False))
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import pickle
+from datetime import datetime
+import tempfile
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from plat.repository.d_sqlite import SQLiteDatabase, SQLiteKVRepository
+from plat.repository.serializer import dumps, loads, SerializationError
+from plat.service.entity import Account, AccountStatus, TaskEntity
+from xtu_ems.ems.model import CourseList, CourseInfo, ScoreBoard, Score, ExamInfoList, ExamInfo
+
+
+def _course(name):
+    return CourseInfo(name=name, teacher='老师', classroom='教室', weeks='1-16', start_time=1, duration=2,
+                      day='Monday')
+
+
+class TestSQLiteKVRepository(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.db')
+        self.database = SQLiteDatabase(self.path, batch_size=100, flush_interval=10)
+
+    async def asyncTearDown(self):
+        await self.database.close()
+        self.dir.cleanup()
+
+    async def test_get_set_del(self):
+        """测试读写与删除，提交前可以读到待写入的数据"""
+        repo = SQLiteKVRepository(self.database, 'account')
+        account = Account(student_id='1', password='p', session='s', status=AccountStatus.NORMAL)
+        token = account.token
+        await repo.async_set_item('1', account)
+        self.assertEqual(1, len(repo))
+        self.assertEqual(token, (await repo.async_get_item('1')).token)
+        await self.database.flush()
+        self.assertEqual(account, await repo.async_get_item('1'))
+        self.assertEqual(['1'], [k async for k in repo])
+        await repo.async_del_item('1')
+        self.assertIsNone(await repo.async_get_item('1'))
+        self.assertEqual(0, len(repo))
+
+    async def test_persistence(self):
+        """测试重新打开数据库后数据仍然存在"""
+        repo = SQLiteKVRepository(self.database, 'course')
+        entity = TaskEntity()
+        entity.update('data', CourseList(courses=[_course('数学')]))
+        await repo.async_set_item('1', entity)
+        await self.database.close()
+
+        self.database = SQLiteDatabase(self.path)
+        repo = SQLiteKVRepository(self.database, 'course')
+        self.assertEqual(1, len(repo))
+        loaded = await repo.async_get_item('1')
+        self.assertEqual(entity.data, loaded.data)
+        self.assertEqual(entity.update_time, loaded.update_time)
+
+    async def test_batched_commit(self):
+        """测试写入凑满一批后不再等待，在一个事务中提交，同一个键只提交最后一次写入"""
+        repo = SQLiteKVRepository(self.database, 'token')
+        with patch.object(self.database, '_write', wraps=self.database._write) as write:
+            for i in range(250):
+                await repo.async_set_item(str(i % 200), i)
+            # 不需要等待flush_interval
+            await asyncio.sleep(.01)
+            await asyncio.gather(*self.database._flush_tasks)
+        self.assertEqual([200], [len(c.args[0]) for c in write.call_args_list])
+        self.assertEqual(249, await repo.async_get_item('49'))
+
+
+class TestSerializer(IsolatedAsyncioTestCase):
+
+    async def test_compress(self):
+        """测试较大的值会被压缩"""
+        value = CourseList(courses=[_course(f'课程{i}') for i in range(100)])
+        data = dumps(value)
+        self.assertEqual(b'\x03', data[:1])
+        self.assertEqual(value, loads(data))
+        self.assertEqual(b'\x02', dumps(1)[:1])
+
+    async def test_round_trip(self):
+        """测试账户（包括token）、任务实体与其中的数据完整还原"""
+        account = Account(student_id='1', password='p', session='s', status=AccountStatus.NORMAL)
+        token = account.token
+        restored = loads(dumps(account))
+        self.assertEqual(account, restored)
+        self.assertEqual(token, restored.token)
+        board = ScoreBoard(scores=[Score(name='课程', score='90', credit='2', type='必修', term=1)])
+        exams = ExamInfoList(exams=[ExamInfo(name='考试', start_time=datetime(2024, 1, 1, 8))])
+        for data in (board, exams, {'a': (1, 2)}):
+            task = TaskEntity()
+            task.update('data', data)
+            task.on_submit_task()
+            restored = loads(dumps(task))
+            self.assertEqual(task.__dict__, restored.__dict__)
+        self.assertIsInstance(loads(dumps(exams)).exams[0].start_time, datetime)
+
+    async def test_new_field_default(self):
+        """测试读取缺少新增字段的旧数据时使用默认值"""
+        data = json.loads(dumps(Account(student_id='1', password='p'))[1:])
+        del data['fields']['token_generation']
+        account = loads(b'\x02' + json.dumps(data).encode())
+        self.assertEqual(0, account.token_generation)
+
+    async def test_reject_unknown_type(self):
+        """测试拒绝还原白名单以外的类型，也不再接受pickle数据"""
+        with self.assertRaises(SerializationError):
+            loads(b'\x02' + json.dumps({'__model__': 'os:system', 'fields': {}}).encode())
+        with self.assertRaises(SerializationError):
+            loads(b'\x00' + pickle.dumps(1))
@@ -4,6 +4,7 @@ from unittest.mock import patch, Mock, AsyncMock
 from plat.repository.d_basic import SimpleKVRepository
 from plat.service.entity import Account, AccountStatus, TaskEntity
 from plat.service.task import UpdateTask
+from xtu_ems.ems.ems import SessionExpiredException
 from xtu_ems.ems.handler.get_student_courses import StudentCourseGetter
 
 
@@ -37,3 +38,74 @@ class TestUpdateTask(IsolatedAsyncioTestCase):
 
             result: TaskEntity = await self.storage.async_get_item('TestKey')
             self.assertEqual(result.data, "Mocked Data")
+
+    async def test_report_alive(self):
+        """
+        测试处理器确认会话有效后记录到账户中
+        """
+
+        async def handle(session):
+            session.mark_alive()
+            return "Mocked Data"
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=handle):
+            task = UpdateTask(key='TestKey', handler=StudentCourseGetter(), storage=self.storage,
+                              user_repository=self.user_repository)
+            await task()
+        account = await self.user_repository.async_get_item('test_id2')
+        self.assertIsNotNone(account.last_alive_time)
+
+    async def test_relogin(self):
+        """
+        测试会话失效时重新登陆并重试
+        """
+        relogged = Account(student_id='test_id2', password='test_password2', session='new_session',
+                           status=AccountStatus.NORMAL)
+        relogin = AsyncMock(return_value=relogged)
+
+        async def handle(session):
+            if session.session_id != 'new_session':
+                raise SessionExpiredException()
+            return "Mocked Data"
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=handle) as handler:
+            task = UpdateTask(key='TestKey', handler=StudentCourseGetter(), storage=self.storage,
+                              user_repository=self.user_repository, relogin=relogin)
+            self.assertEqual("Mocked Data", await task())
+        relogin.assert_awaited_once_with('test_id2', 'test_session2')
+        self.assertEqual(2, handler.call_count)
+
+    async def test_relogin_failed(self):
+        """
+        测试无法重新登陆时标记账户过期，并吊销账户的token
+        """
+        revoke = AsyncMock()
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=SessionExpiredException()) as handler:
+            task = UpdateTask(key='TestKey', handler=StudentCourseGetter(), storage=self.storage,
+                              user_repository=self.user_repository, relogin=AsyncMock(return_value=None),
+                              revoke=revoke)
+            self.assertIsNone(await task())
+        # 会话失效时不重试
+        self.assertEqual(1, handler.call_count)
+        self.assertEqual(AccountStatus.EXPIRED, self.user_repository.data['test_id2'].status)
+        revoke.assert_awaited_once_with('test_id2', 0)
+
+    async def test_not_overwrite_login(self):
+        """
+        测试更新期间账户重新登陆后，失败的任务不会用旧副本覆盖新的登陆
+        """
+        relogged = Account(student_id='test_id2', password='test_password2', session='new_session',
+                           status=AccountStatus.NORMAL, token_generation=1)
+
+        async def handle(session):
+            self.user_repository.data['test_id2'] = relogged
+            raise SessionExpiredException()
+
+        with patch.object(StudentCourseGetter, 'async_handler', side_effect=handle):
+            task = UpdateTask(key='TestKey', handler=StudentCourseGetter(), storage=self.storage,
+                              user_repository=self.user_repository)
+            self.assertIsNone(await task())
+        account = self.user_repository.data['test_id2']
+        self.assertIs(relogged, account)
+        self.assertEqual(AccountStatus.NORMAL, account.status)
+        self.assertEqual('new_session', account.session)
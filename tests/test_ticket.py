@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.async_case import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock
+
+from xtu_ems.ems.ticket import LoginTicketPool, LoginTicket
+
+
+def _ticket(create_time=None):
+    return LoginTicket(session_id='session_id', captcha='abcd', signature='sig',
+                       create_time=create_time or datetime.now())
+
+
+class TestLoginTicketPool(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.pool = LoginTicketPool(size=2, ttl=60, retry_interval=.01)
+        self.pool.producer = AsyncMock(side_effect=lambda: _ticket())
+
+    async def asyncTearDown(self):
+        await self.pool.stop()
+
+    async def test_fill_and_get(self):
+        """测试补充凭据与取出凭据"""
+        self.assertIsNone(self.pool.get())
+        self.assertEqual(2, await self.pool.fill())
+        self.assertEqual(0, await self.pool.fill())
+        self.assertIsNotNone(self.pool.get())
+        self.assertEqual(1, len(self.pool))
+
+    async def test_evict_expired(self):
+        """测试过期凭据会被淘汰"""
+        self.pool._tickets.append(_ticket(datetime.now() - timedelta(minutes=2)))
+        self.assertIsNone(self.pool.get())
+
+    async def test_refill_in_background(self):
+        """测试凭据被取出后后台会自动补充"""
+        self.pool.start()
+        await asyncio.sleep(.05)
+        self.assertEqual(2, len(self.pool))
+        self.pool.get()
+        await asyncio.sleep(.05)
+        self.assertEqual(2, len(self.pool))
+        self.assertEqual(3, self.pool.producer.call_count)
+
+    async def test_producer_failure(self):
+        """测试预取失败时不会放入凭据"""
+        self.pool.producer = AsyncMock(side_effect=TimeoutError())
+        self.assertEqual(0, await self.pool.fill())
+        self.assertIsNone(self.pool.get())
+
+    async def test_partial_fill_retry(self):
+        """测试部分预取失败时按照重试间隔重试，而不是等到凭据过期"""
+        self.pool._tickets.append(_ticket())
+        self.assertEqual(.01, self.pool._next_wait())
+        self.pool._tickets.append(_ticket())
+        self.assertGreater(self.pool._next_wait(), 50)
+
+    async def test_get_during_fill(self):
+        """测试补充期间取走凭据时，补充完成后会再次补充"""
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def produce():
+            started.set()
+            await release.wait()
+            return _ticket()
+
+        self.pool.producer = AsyncMock(side_effect=produce)
+        self.pool.retry_interval = 60
+        self.pool._tickets.append(_ticket())
+        self.pool.start()
+        await started.wait()
+        # 补充期间取走已有的凭据
+        self.assertIsNotNone(self.pool.get())
+        release.set()
+        await asyncio.sleep(.05)
+        self.assertEqual(2, len(self.pool))
@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+from plat.service.token import TokenSigner, BloomFilter
+
+
+class TestTokenSigner(TestCase):
+
+    def setUp(self):
+        self.signer = TokenSigner(b'secret')
+
+    def test_sign_verify(self):
+        token = self.signer.sign('202105001', 3, issue_time=1700000000)
+        self.assertEqual(('202105001', 3), self.signer.verify(token))
+
+    def test_reject(self):
+        """测试篡改、其他密钥签发以及非签名格式的token验证失败"""
+        token = self.signer.sign('202105001')
+        payload, _, signature = token.rpartition('.')
+        forged = self.signer.sign('202105002').split('.')[0] + token[token.index('.'):]
+        self.assertIsNone(self.signer.verify(forged))
+        self.assertIsNone(TokenSigner(b'other').verify(token))
+        self.assertIsNone(self.signer.verify('1b4e28ba-2fa1-11d2-883f-0016d3cca427'))
+        self.assertIsNone(self.signer.verify(payload + '.'))
+
+
+class TestBloomFilter(TestCase):
+
+    def test_contains(self):
+        bloom = BloomFilter(bits=1 << 12, hashes=3)
+        for i in range(100):
+            bloom.add(str(i))
+        self.assertTrue(all(str(i) in bloom for i in range(100)))
+        self.assertLess(sum(str(i) in bloom for i in range(100, 1100)), 50)
+        bloom.clear()
+        self.assertNotIn('1', bloom)
@@ -0,0 +1,169 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from pdfplumber import PDF
+
+from xtu_ems.ems.ems import SessionExpiredException
+from xtu_ems.ems.handler.get_students_transcript import StudentTranscriptGetter, InvalidTranscriptException
+from xtu_ems.ems.session import Session
+from xtu_ems.util.pdf_table import extract_table_by_edges
+from xtu_ems.util.spool import SpooledBuffer, ContentTooLargeException
+
+
+def _transcript():
+    with open(os.path.join('pages', 'transcript.pdf'), 'rb') as f:
+        return f.read()
+
+
+class _FakeResponse:
+    """模拟教务系统返回成绩单PDF的流式响应"""
+
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.headers = {'Content-Type': 'application/pdf', 'Content-Length': str(len(content))}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def post(self, *args, **kwargs):
+        return _FakeResponse(self.content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class TestTranscriptExtract(TestCase):
+
+    def test_table_parity(self):
+        """测试快速提取的表格与extract_table一致"""
+        with open(os.path.join('pages', 'transcript.pdf'), 'rb') as f, PDF(f) as pdf:
+            page = pdf.pages[0]
+            self.assertEqual(page.extract_table(), extract_table_by_edges(page))
+
+    def test_extract(self):
+        """测试解析成绩单"""
+        res = StudentTranscriptGetter().extract(_transcript())
+        self.assertEqual('202105550000', res.student_id)
+        self.assertEqual(13, len(res.scores))
+        self.assertEqual('3.72', res.gpa)
+        self.assertEqual(('160', '45.5'), res.total_credit)
+
+    def test_fallback(self):
+        """测试快速提取失败时回退到extract_table"""
+        expected = StudentTranscriptGetter().extract(_transcript())
+        with patch('xtu_ems.ems.handler.get_students_transcript.extract_table_by_edges', return_value=None):
+            self.assertEqual(expected, StudentTranscriptGetter().extract(_transcript()))
+        with patch('xtu_ems.ems.handler.get_students_transcript.extract_table_by_edges', return_value=[]):
+            self.assertEqual(expected, StudentTranscriptGetter().extract(_transcript()))
+
+    def test_fallback_on_shifted_table(self):
+        """测试快速提取的表格列错位或表头不一致时回退到extract_table"""
+        expected = StudentTranscriptGetter().extract(_transcript())
+        with open(os.path.join('pages', 'transcript.pdf'), 'rb') as f, PDF(f) as pdf:
+            table = pdf.pages[0].extract_table()
+        shifted = [[None] + row for row in table]
+        dropped = [row[:1] + row[2:] for row in table]
+        renamed = [['课程', *table[0][1:]]] + table[1:]
+        for broken in (shifted, dropped, renamed):
+            self.assertFalse(StudentTranscriptGetter._is_transcript_table(broken))
+            with patch('xtu_ems.ems.handler.get_students_transcript.extract_table_by_edges', return_value=broken):
+                self.assertEqual(expected, StudentTranscriptGetter().extract(_transcript()))
+        self.assertTrue(StudentTranscriptGetter._is_transcript_table(table))
+
+
+class TestTranscriptDeduplication(TestCase):
+
+    def test_reuse_parsed(self):
+        """测试内容相同的成绩单只解析一次，复用解析结果"""
+        handler = StudentTranscriptGetter(cache_size=1)
+        content = _transcript()
+        with patch.object(StudentTranscriptGetter, 'get_session', return_value=_FakeSession(content)), \
+                patch.object(StudentTranscriptGetter, 'extract', autospec=True,
+                             side_effect=StudentTranscriptGetter.extract) as extract:
+            first = handler.handler(Session(session_id='session'))
+            second = handler.handler(Session(session_id='session'))
+        self.assertEqual(1, extract.call_count)
+        self.assertEqual('202105550000', first.student_id)
+        self.assertEqual(first, second)
+        # 返回副本，修改不影响缓存
+        second.scores.clear()
+        self.assertEqual(first, handler._get_parsed(next(iter(handler._parsed))))
+
+    def test_evict_parsed(self):
+        """测试超出容量时淘汰最久未使用的解析结果"""
+        handler = StudentTranscriptGetter(cache_size=1)
+        scoreboard = handler.extract(_transcript())
+        handler._set_parsed('digest', scoreboard)
+        handler._set_parsed('other', scoreboard)
+        self.assertIsNone(handler._get_parsed('digest'))
+        self.assertEqual(scoreboard, handler._get_parsed('other'))
+
+    def test_pickle_without_cache(self):
+        """测试发送到进程池时不携带缓存"""
+        import pickle
+        handler = StudentTranscriptGetter()
+        handler._set_parsed('digest', StudentTranscriptGetter().extract(_transcript()))
+        self.assertEqual(0, len(pickle.loads(pickle.dumps(handler))._parsed))
+        self.assertEqual(1, len(handler._parsed))
+
+
+class TestTranscriptDownload(TestCase):
+
+    def test_spool_to_file(self):
+        """测试超过内存阈值后转存到临时文件，并且解析结果不变"""
+        content = _transcript()
+        with SpooledBuffer(max_memory=1024, max_size=len(content)) as buffer:
+            for i in range(0, len(content), 1000):
+                buffer.write(content[i:i + 1000])
+            self.assertTrue(buffer.spilled)
+            path = buffer.source()
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(StudentTranscriptGetter().extract(content), StudentTranscriptGetter().extract(path))
+        self.assertFalse(os.path.exists(path))
+
+    def test_size_limit(self):
+        """测试超过大小限制时中止下载"""
+        with SpooledBuffer(max_memory=4, max_size=8) as buffer:
+            buffer.write(b'%PDF-')
+            with self.assertRaises(ContentTooLargeException):
+                buffer.write(b'1234')
+        with self.assertRaises(ContentTooLargeException):
+            StudentTranscriptGetter()._check_headers('application/pdf', str(1 << 40))
+
+    def test_reject_non_pdf(self):
+        """测试响应不是PDF时直接中止"""
+        handler = StudentTranscriptGetter()
+        for content_type in ('application/pdf;charset=UTF-8', 'application/x-download',
+                             'binary/octet-stream', 'text/html;charset=UTF-8'):
+            handler._check_headers(content_type, '1024')
+        for content_type in ('text/plain;charset=UTF-8', 'application/json', 'image/png'):
+            with self.assertRaises(InvalidTranscriptException):
+                handler._check_headers(content_type, None)
+        with SpooledBuffer(max_memory=64, max_size=64) as buffer, self.assertRaises(InvalidTranscriptException):
+            handler._write(buffer, b'<html><head><title>')
+
+    def test_login_page(self):
+        """测试返回登陆页面时识别为会话失效"""
+        handler = StudentTranscriptGetter()
+        handler._check_headers('text/html;charset=UTF-8', None)
+        with open(os.path.join('pages', 'session_invalid.html'), 'rb') as f, SpooledBuffer(4096, 4096) as buffer, \
+                self.assertRaises(SessionExpiredException):
+            handler._write(buffer, f.read())